@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from code_matcher import contains_any_code
+
+# Base directory with one folder per patient (named by cpr)
+HOSPITAL_DATA = 'HospitalData'
+
+# The pato T-codes of the bladder cohort (urinary bladder, ureteral orifices and urethra)
+BLADDER_T_CODES = [
+    "T74940",  # Urinblære, prostata og vesicula seminalis
+    "T74000",  # Urinblære
+    "T74950",  # Urinblære, vagina, uterus og adnexa
+    "T74010",  # Urinblæreslimhinde
+    "T74030",  # Urinblære, detrusor
+    "T7432A",  # Ureterostium, højre
+    "T7432B",  # Ureterostium, venstre
+    "T75000",  # Urethra
+    "T75050",  # Urethra, mand
+    "T75060",  # Urethra, kvinde
+    "T75010",  # Urethraslimhinde Urethrabiopsi
+    "T75110",  # Urethra pars prostatica
+]
+
+
+def patient_directories(cprs=None, base_directory=HOSPITAL_DATA):
+    """
+    List the patient folders of the base directory, optionally only those of a cohort.
+
+    Parameters:
+    cprs (iterable): The cprs to keep, e.g. the result of find_bladder_cohort. None keeps every patient.
+    base_directory (str): The directory with one folder per patient.
+
+    Returns:
+    list: The folder names (cprs), in the order of os.listdir.
+    """
+    patient_dirs = [dir_name for dir_name in os.listdir(base_directory) if
+                    os.path.isdir(os.path.join(base_directory, dir_name))]
+    if cprs is None:
+        return patient_dirs
+
+    # Only the cohort patients are opened at all
+    cohort = set(cprs)
+    return [dir_name for dir_name in patient_dirs if dir_name in cohort]
+
+
+def column_filter(columns):
+    """
+    Build a usecols callable for pd.read_excel that keeps only the given columns.
+
+    Unlike a list of names, the callable does not fail on files that lack one of the columns, and the other
+    columns are skipped while the sheet is parsed.
+
+    Parameters:
+    columns (iterable): The column names to keep, e.g. the keys of a rename mapping. None keeps every column.
+
+    Returns:
+    callable or None: The usecols argument.
+    """
+    if columns is None:
+        return None
+    names = frozenset(columns)
+    return names.__contains__
+
+
+def find_bladder_cohort(pato_bank, codes=BLADDER_T_CODES):
+    """
+    Find the patients with a pato record that has one of the T-codes in its 'Diagnoser' text.
+
+    Parameters:
+    pato_bank (pd.DataFrame): The pato records of all patients, with 'cpr' and 'Diagnoser' columns.
+    codes (list): The T-codes of the cohort.
+
+    Returns:
+    list: The cprs of the cohort, sorted.
+    """
+    has_code = contains_any_code(pato_bank['Diagnoser'], codes)
+    return sorted(pato_bank.loc[has_code, 'cpr'].unique())
+
+
+def _read_excel_frame(file, cprs=None, usecols=None, base_directory=HOSPITAL_DATA):
+    """
+    Read one Excel file per patient into a DataFrame with a 'cpr' column, like read_excel_data_into_dataframe of
+    the scripts. Used by the benchmark.
+    """
+    data_frames = []
+    for cpr in patient_directories(cprs, base_directory):
+        filepath = os.path.join(base_directory, cpr, file)
+        if os.path.isfile(filepath):
+            df = pd.read_excel(filepath, header=0, usecols=usecols)
+            df.insert(0, 'cpr', cpr)
+            data_frames.append(df)
+    return pd.concat(data_frames, ignore_index=True)
+
+
+def _synthetic_tree(base_directory, patients, cohort_share=0.05, seed=0):
+    """
+    Write a patient tree with pato_bank.xlsx, miba.xlsx and medicin.xlsx files shaped like the hospital exports
+    for the benchmark. About cohort_share of the patients have a bladder T-code.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2015-01-01', '2020-12-31').strftime('%d.%m.%Y').to_numpy()
+    for patient in range(patients):
+        cpr = f'{patient:010d}'
+        patient_directory = os.path.join(base_directory, cpr)
+        os.makedirs(patient_directory)
+
+        code = rng.choice(BLADDER_T_CODES) if rng.random() < cohort_share else 'T56000'
+        pato = pd.DataFrame({'Modtaget': rng.choice(days, size=3), 'Serviceyder': 'Patologi',
+                             'Diagnoser': [f'[1]\n{code} Organ\nM81203 urotelialt', '[1]\nT56000 Lever', ''],
+                             'Konklusion': 'Tekst ' * 40})
+        pato.to_excel(os.path.join(patient_directory, 'pato_bank.xlsx'), index=False)
+
+        size = 60
+        miba = pd.DataFrame({'Prøvens art': rng.choice(['Blod', 'Urin', 'Sputum'], size=size),
+                             'Taget d.': rng.choice(days, size=size), 'Kvantitet': '10^5',
+                             'Analyser': 'Dyrkning ' * 10, 'Resistens': 'Resistent ' * 10,
+                             'Mikroskopi': 'Mikroskopi ' * 10})
+        miba.to_excel(os.path.join(patient_directory, 'miba.xlsx'), index=False)
+
+        medicin = pd.DataFrame({'Medication': rng.choice(['Pivmecillinam', 'Paracetamol'], size=size),
+                                'Start-Date': rng.choice(days, size=size), 'End-Date': rng.choice(days, size=size),
+                                'Dosis': '1 g ' * 10, 'Note': 'Note ' * 20})
+        medicin.to_excel(os.path.join(patient_directory, 'medicin.xlsx'), index=False)
+
+
+if __name__ == '__main__':
+    # Benchmark reading every patient against reading the cohort only, on a synthetic tree with a 5% cohort
+    base_directory = tempfile.mkdtemp()
+    try:
+        _synthetic_tree(base_directory, 400)
+        miba_columns = ['Prøvens art', 'Taget d.', 'Kvantitet']
+        medicin_columns = ['Medication', 'Start-Date', 'End-Date']
+
+        start_time = time.perf_counter()
+        pato_bank = _read_excel_frame('pato_bank.xlsx', base_directory=base_directory)
+        cohort = find_bladder_cohort(pato_bank)
+        pato_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        miba = _read_excel_frame('miba.xlsx', base_directory=base_directory)
+        medicin = _read_excel_frame('medicin.xlsx', base_directory=base_directory)
+        full_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        cohort_miba = _read_excel_frame('miba.xlsx', cohort, column_filter(miba_columns), base_directory)
+        cohort_medicin = _read_excel_frame('medicin.xlsx', cohort, column_filter(medicin_columns), base_directory)
+        cohort_seconds = time.perf_counter() - start_time
+
+        expected_miba = miba.loc[miba['cpr'].isin(cohort), ['cpr'] + miba_columns].reset_index(drop=True)
+        expected_medicin = medicin.loc[medicin['cpr'].isin(cohort), ['cpr'] + medicin_columns].reset_index(drop=True)
+        pd.testing.assert_frame_equal(cohort_miba, expected_miba)
+        pd.testing.assert_frame_equal(cohort_medicin, expected_medicin)
+        print(f"{len(cohort)} of {pato_bank['cpr'].nunique()} patients in the cohort (pato read: {pato_seconds:.2f} s)")
+        print(f"miba + medicin, every patient:  {full_seconds:.2f} s")
+        print(f"miba + medicin, cohort columns: {cohort_seconds:.2f} s ({full_seconds / cohort_seconds:.0f}x)")
+    finally:
+        shutil.rmtree(base_directory)
@@ -1,26 +1,7 @@
 import os
 import pandas as pd
 
-
-def format_dataframe(dataframe, keyword):
-    formatted_text = ""
-    for index, row in dataframe.iterrows():
-        for column in dataframe.columns:
-            cell_value = str(row[column])
-            formatted_text += f"{column}: "
-            start = 0
-            while True:
-                start = cell_value.lower().find(keyword.lower(), start)
-                if start == -1:
-                    break
-                end = start + len(keyword)
-                formatted_text += cell_value[:start]
-                formatted_text += f"[[[{cell_value[start:end]}]]]"
-                cell_value = cell_value[end:]
-                start = end - len(keyword)
-            formatted_text += cell_value + "\t"
-        formatted_text += "\n----------------------\n"  # Add a separator between rows
-    return formatted_text
+from keyword_search import filter_rows, match_rows, render_matches
 
 
 def read_all_excel_data():
@@ -45,7 +26,7 @@ def search_keyword_all(data_all, keyword):
     results = []
 
     for filename, df in data_all.items():
-        rows_with_keyword = df[df.apply(lambda row: row.astype(str).str.contains(keyword, regex=False).any(), axis=1)]
+        rows_with_keyword = filter_rows(df, keyword)
         if not rows_with_keyword.empty:
             cpr_number = filename.split('_')[0]  # Extracting CPR number from filename
             cpr_list.append(cpr_number)  # Storing CPR number
@@ -53,16 +34,7 @@ def search_keyword_all(data_all, keyword):
             result = f"-----------------------------------------\n"
             result += f"Results found in {filename}:\n"
             result += f"-----------------------------------------\n"
-            formatted_rows = format_dataframe(rows_with_keyword, keyword)
-            start = 0
-            while True:
-                start = formatted_rows.find("[[[", start)
-                if start == -1:
-                    break
-                result += formatted_rows[:start]
-                result += formatted_rows[start + 3:start + 3 + len(keyword)]
-                formatted_rows = formatted_rows[start + 3 + len(keyword):]
-                start = 0
+            formatted_rows, _ = render_matches(rows_with_keyword, keyword)
             result += formatted_rows + "\n\n"
             results.append(result)
 
@@ -94,14 +66,16 @@ def search_keyword_in_data(data, keyword):
     results = {}  # Key: CPR number, Value: data
 
     for filename, df in data.items():
-        rows_with_keyword = df[df.apply(lambda row: row.astype(str).str.contains(keyword, regex=False).any(), axis=1)]
+        # The matcher also returns the first matching column of each row
+        mask, keyword_columns = match_rows(df, keyword)
+        rows_with_keyword = df[mask]
         if not rows_with_keyword.empty:
             cpr_number = filename.split('_')[0]  # Extracting CPR number from filename
             if cpr_number not in results:
                 results[cpr_number] = {}
             for index, row in rows_with_keyword.iterrows():
                 date = row['Modtaget']
-                keyword_cell = row[row.astype(str).str.contains(keyword, na=False)].index[0]
+                keyword_cell = keyword_columns[index]
                 results[cpr_number][date] = row[keyword_cell]
 
     return results
@@ -1,6 +1,10 @@
 import os
+import numpy as np
 import pandas as pd
 
+from bladder_cohort import column_filter, patient_directories
+from code_matcher import contains_any_code, code_indicator_matrix
+
 def filter_records_by_codes(data_frame):
     """
     Filter out rows that don't contain any of the specified codes in the 'diagnosis_category' column.
@@ -42,18 +46,17 @@ def filter_records_by_codes(data_frame):
         "M69760",
     ]
 
-    # Filter rows that contain any of the codes as substring
-    code_filters = [data_frame['diagnosis_category'].str.contains(code, na=False) for code in codes]
-    combined_filter = pd.concat(code_filters, axis=1).any(axis=1)
+    # Filter rows that contain any of the codes as substring (one scan over the column)
+    combined_filter = contains_any_code(data_frame['diagnosis_category'], codes)
 
     # Return the DataFrame with the filtered rows
     return data_frame[combined_filter]
 
 
-def read_excel_data_from_folders(file=None):
+def read_excel_data_from_folders(file=None, cprs=None, usecols=None):
     data = {}
-    patient_dirs = [dir_name for dir_name in os.listdir('HospitalData') if
-                    os.path.isdir(os.path.join('HospitalData', dir_name))]
+    # Only the folders of the cohort, if given (see bladder_cohort.patient_directories)
+    patient_dirs = patient_directories(cprs)
 
     for patient_id in patient_dirs:
         patient_directory = os.path.join('HospitalData', patient_id)
@@ -61,7 +64,7 @@ def read_excel_data_from_folders(file=None):
         # Read specific file
         filepath = os.path.join(patient_directory, file)
         if os.path.isfile(filepath):
-            df = pd.read_excel(filepath, header=0)
+            df = pd.read_excel(filepath, header=0, usecols=usecols)
             data[f"{patient_id}_{file}"] = df
 
     return data
@@ -71,19 +74,20 @@ import os
 import pandas as pd
 
 
-def read_excel_data_into_dataframe(file=None):
+def read_excel_data_into_dataframe(file=None, cprs=None, usecols=None):
     """
     Read Excel files from patient folders into a DataFrame.
 
     :param file: Name of the Excel file to read.
+    :param cprs: The cprs to read (e.g. the bladder cohort); None reads every patient.
+    :param usecols: Columns to parse, passed to pd.read_excel (see bladder_cohort.column_filter); None parses all.
     :return: DataFrame containing data from Excel files with additional columns for cpr.
     """
     # List to store individual DataFrames
     data_frames = []
 
     # Patient directories
-    patient_dirs = [dir_name for dir_name in os.listdir('HospitalData') if
-                    os.path.isdir(os.path.join('HospitalData', dir_name))]
+    patient_dirs = patient_directories(cprs)
 
     # Iterate through patient directories
     for cpr in patient_dirs:
@@ -93,7 +97,7 @@ def read_excel_data_into_dataframe(file=None):
         filepath = os.path.join(patient_directory, file)
         if os.path.isfile(filepath):
             # Read Excel file into DataFrame
-            df = pd.read_excel(filepath, header=0)
+            df = pd.read_excel(filepath, header=0, usecols=usecols)
 
             # Add cpr column
             df.insert(0, 'cpr', cpr)
@@ -109,99 +113,25 @@ def read_excel_data_into_dataframe(file=None):
 import re
 
 
-import pandas as pd
-import re
-from collections import defaultdict
-
-
-def transform_vitale_data(original_data):
-    # Dictionary to store the tidy data
-    # Keys are tuples of (cpr, date), values are dictionaries of the measurements
-    tidy_data_dict = defaultdict(dict)
-
-    # Regular expression pattern to extract date
-    date_pattern = re.compile(r'\d{2}-\d{2}-\d{4}')
-
-    # Regular expression pattern to extract date and time
-    date_time_pattern = re.compile(r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}')
-
-    # Mapping from measurement type to column name
-    measurement_to_column = {
-        'Blodtryk': 'vitale_blodtryk',
-        'Puls': 'vitale_puls',
-        'Resp.frekv.': 'vitale_respfrekv',
-        'Temperatur': 'vitale_temperatur',
-        'Temp.kilde': 'vitale_tempkilde',
-        'Saturation': 'vitale_saturation',
-        'Hovedomfang (cm)': 'vitale_hovedomfang',
-        'Vægt': 'vitale_vaegt',
-        'Højde': 'vitale_hoejde',
-        'Body Mass Index': 'vitale_bodymassindex'
-    }
-
-    # Loop through each row in the original data
-    for index, row in original_data.iterrows():
-        # Extract the cpr
-        cpr = row['cpr']
-
-        # Extract the measurement type
-        measurement_type = str(row['værdier']).replace(':', '').strip()
-
-        # Check if the measurement type is in the mapping
-        if measurement_type in measurement_to_column:
-            # Loop through each column except 'værdier'
-            for column in original_data.columns[2:]:
-                raw_value = str(row[column]).replace('\xa0', ' ').replace('_x000D_', '').strip()
-
-                # Extract date from column name
-                match = date_time_pattern.search(column)
-                column_date = match.group() if match else None
-
-                # If date is extracted from column name, use it, otherwise, extract from raw value
-                measurement_date = column_date
-                if not measurement_date:
-                    match = date_pattern.search(raw_value)
-                    measurement_date = match.group() if match else None
+from renal_cancer_porject.utils.analyte_parser import BLADDER_ANALYTES, parse_analytes
+from pato_miba_records import MIBA_COLUMNS, collect_diagnose_codes_in_columns, filter_dataframes
+from vitale_transform import transform_vitale_data
 
-                    # Remove date from raw_value if measurement_date exists
-                    if measurement_date:
-                        raw_value_no_date = date_pattern.sub('', raw_value)
-                    else:
-                        raw_value_no_date = raw_value
-
-                    # Split the string into an array
-                    raw_value_array = raw_value_no_date.split()
-
-                    if 'pr.' in raw_value_array:
-                        raw_value_array.remove('pr.')
-
-                    # Check if raw_value_array[1] is not a date and concatenate
-                    if len(raw_value_array) > 1 and not date_pattern.match(raw_value_array[1]):
-                        raw_value_no_date = raw_value_array[0] + ' ' + raw_value_array[1]
-                    else:
-                        raw_value_no_date = raw_value_array[0] if raw_value_array else ''
-                else:
-                    raw_value_no_date = raw_value
-
-                # Extract the measurement value
-                if raw_value_no_date not in ('nan', ''):
-                    # Add data to the tidy data dict
-                    key = (cpr, measurement_date)
-                    tidy_data_dict[key][measurement_to_column[measurement_type]] = raw_value_no_date
 
-    # Convert the nested dictionaries to a list of dictionaries
-    tidy_data_list = [{'cpr': cpr, 'vitale_measurement_date': date, **measurements}
-                      for (cpr, date), measurements in tidy_data_dict.items()]
+# Loading mode: with COHORT_FIRST the cohort (patients with a T-code in pato_bank.xlsx, see samples below) is found
+# first, and miba, blood tests, medicin, diagnoses and vitale are read for the cohort patients only, limited to the
+# columns used below. Every later step keeps the cohort patients only, except the outer merge of the blood tests,
+# which then has no rows for the patients outside the cohort; off by default, so that the output is unchanged.
+COHORT_FIRST = False
 
-    # Convert the list of dictionaries to a DataFrame
-    tidy_data = pd.DataFrame(tidy_data_list)
 
-    # Return the tidy data
-    return tidy_data
+def column_projection(columns):
+    # Only the columns used later are parsed in the cohort-first mode
+    return column_filter(columns) if COHORT_FIRST else None
 
 
 # Read data
-pato_excels = read_excel_data_from_folders('pato_bank.xlsx')
+pato_excels = read_excel_data_from_folders('pato_bank.xlsx', usecols=column_projection(['Modtaget', 'Diagnoser']))
 
 
 # def sample_dates_and_diagnoser(data):
@@ -256,13 +186,15 @@ def sample_dates_and_diagnoser(data):
     samples = []
 
     for key, df in data.items():
+        # Find all codes of every row in one scan over the column
+        code_indicators = code_indicator_matrix(df['Diagnoser'], codes_to_look_for)
         for code in codes_to_look_for:
-            # Filter rows that contain the code as substring
-            filtered_rows = df[df['Diagnoser'].str.contains(code, na=False)]
+            # Rows that contain the code as substring
+            filtered_rows = code_indicators[code].to_numpy().nonzero()[0]
 
             # If any rows contain the code, get the first one and add it to samples
-            if not filtered_rows.empty:
-                first_occurrence = filtered_rows.iloc[0]
+            if len(filtered_rows) > 0:
+                first_occurrence = df.iloc[filtered_rows[0]]
                 samples.append({
                     "cpr": f"{key.split('_')[0]}",
                     "first_pato_date": first_occurrence["Modtaget"],
@@ -279,6 +211,9 @@ samples = sample_dates_and_diagnoser(pato_excels)
 # Remove duplication
 samples = samples.drop_duplicates()
 
+# The cohort: the patients with a T-code sample
+cohort = sorted(samples['cpr'].unique()) if COHORT_FIRST else None
+
 samples
 
 # Custom function to split text by '['
@@ -340,9 +275,8 @@ def keep_earliest_records(data_frame):
         "T75010", "T75110"
     ]
 
-    # Filter rows that contain any of the codes as substring
-    code_filters = [df_copy['diagnoser'].str.contains(code, na=False) for code in codes_to_look_for]
-    combined_filter = pd.concat(code_filters, axis=1).any(axis=1)
+    # Filter rows that contain any of the codes as substring (one scan over the column)
+    combined_filter = contains_any_code(df_copy['diagnoser'], codes_to_look_for)
     df_copy = df_copy[combined_filter]
 
     # Group by cpr, then get index of min date
@@ -364,83 +298,6 @@ print(earliest_records_df)
 
 
 # 01
-def collect_diagnose_codes_in_columns(patients_data):
-    """
-    Process the patients' data and collect specified diagnose codes into multiple columns.
-
-    :param patients_data: DataFrame containing patients' data with 'cpr', 'date', and 'diagnoser' columns.
-    :return: DataFrame with collected diagnose codes in multiple columns.
-    """
-    # List of columns
-    columns = [
-        "cpr",
-        "first_pato_date",
-        "ÆYY111 lav malignitetsgrad",
-        "ÆYY113 høj malignitetsgrad",
-        "P30611 ekscisionsbiopsi",
-        "P30615 endoskopisk biopsi",
-        "P30619 randombiopsi",
-        "P30625 spånresektat",
-        "P306x0 ektomipræparat",
-        "P306x4 tumorektomi",
-        "ÆYYY0R nested inkl. large nested type",
-        "ÆYYY0S mikrocystisk type",
-        "ÆYYY0U plasmacytoid/signetringscelle/diffus type",
-        "ÆYYY0X lipidrig type",
-        "M80133 storcellet neuroendokrint karcinom",
-        "M80203 udifferentieret karcinom",
-        "M80403 småcellet karcinom",
-        "M80702 planocellulært karcinom in situ",
-        "M80703 planocellulært karcinom",
-        "M80823 lymfoepitelialt karcinom",
-        # "M09450 ingen tegn på malignitet", # TODO: this code was not exist -> do we need it or just stick with the list in document
-        "M81200 urotelialt papillom",
-        "M81202 urotelialt karcinom in situ",
-        "M81203 urotelialt",
-        "M81300 inverteret urotelialt papillom",
-        "M81233 sarkomatoidt urotelialt karcinom",
-        "M81313 mikropapillært urotelialt karcinom",
-        "M81301 papillær urotelial tumor med minimalt malignitetspotentiale",
-        "M81302 ikkeinvasiv papillær urotelial tumor",
-        "M81403 adenokarcinom",
-        "M81402 adenokarcinom in situ",
-        "M81303 urotelial tumor",
-        "M80703 planocellulært karcinom",
-        "M81403 adenokarcinom",
-        "M69760 malignitetssuspekte celler"
-    ]
-
-    # Create an empty DataFrame with specified columns
-    data_frame = pd.DataFrame(columns=columns)
-
-    # Iterating through each row of the DataFrame
-    for index, row in patients_data.iterrows():
-        cpr = row['cpr']
-        first_pato_date = row['first_pato_date']
-        diagnoser = row['diagnoser']
-
-        lines = diagnoser.split('\n')
-        record_dict = {'cpr': cpr, 'first_pato_date': first_pato_date}
-
-        # Skip if there are not enough lines
-        if len(lines) < 3:
-            continue
-
-        # Column name is in the second line
-        column_name = lines[1].strip()
-
-        # The rest of the lines are the data for the column
-        column_data = '\n'.join(lines[2:]).strip()
-
-        if column_name in columns:
-            record_dict[column_name] = column_data
-
-            # Append the structured record to the DataFrame
-            data_frame.loc[len(data_frame)] = record_dict
-
-    return data_frame
-
-
 # Call the function with the sample data
 diagnose_codes_in_columns_data = collect_diagnose_codes_in_columns(samples)
 diagnose_codes_in_columns_data # TODO: Here you can compare second method with this table because you can see the blue color which represents not empty column
@@ -452,46 +309,7 @@ diagnose_codes_in_columns_data # TODO: Here you can compare second method with t
 
 
 # Read miba data
-miba_excels = read_excel_data_from_folders('miba.xlsx')
-
-from datetime import datetime
-
-
-def filter_dataframes(miba_excels, earliest_records_df):
-    # Start with an empty DataFrame
-    filtered_data = pd.DataFrame(columns=['cpr', 'Prøvens art', 'Taget d.', 'Kvantitet'])
-
-    for _, row in earliest_records_df.iterrows():
-        cpr_number = row['cpr']
-        min_date = row['first_pato_date']  # Get the minimum date from the row
-        min_date_obj = datetime.strptime(min_date, '%d.%m.%Y')  # Convert min_date to datetime object
-
-        for filename, df in miba_excels.items():
-            if filename.startswith(cpr_number):
-                # Convert the 'Taget d.' column to datetime objects with errors='coerce'
-                df['Taget d.'] = pd.to_datetime(df['Taget d.'], format='%d.%m.%Y')
-
-                # Filter rows based on date and 'Prøvens art' starting with 'Blod' or 'Urin'
-                filtered_rows = df[(df['Taget d.'] < min_date_obj) &
-                                   (df['Prøvens art'].str.startswith('Blod') |
-                                    df['Prøvens art'].str.startswith('Urin'))][['Prøvens art', 'Taget d.', 'Kvantitet']]
-                filtered_rows['cpr'] = cpr_number  # Adding the cpr column to the filtered rows
-
-                # Fill empty 'Kvantitet' cells with 'Negative'
-                filtered_rows['Kvantitet'].fillna('Negative', inplace=True)
-
-                if not filtered_rows.empty:
-                    # Concatenate the filtered rows to the final DataFrame
-                    filtered_data = pd.concat([filtered_data, filtered_rows], ignore_index=True)
-
-    # Convert date back to string in the desired format
-    filtered_data['Taget d.'] = filtered_data['Taget d.'].dt.strftime('%d.%m.%Y')
-
-    # Rename the column
-    filtered_data = filtered_data.rename(columns={'Taget d.': 'miba_date'})
-
-    return filtered_data
-
+miba_excels = read_excel_data_from_folders('miba.xlsx', cohort, column_projection(MIBA_COLUMNS[1:]))
 
 # Usage example:
 miba_filtered_data = filter_dataframes(miba_excels, diagnose_codes_in_columns_data)
@@ -519,13 +337,12 @@ import openpyxl
 import re
 
 
-def read_blood_test_excel_data():
+def read_blood_test_excel_data(cprs=None):
     # Base directory
     base_directory = 'HospitalData'
 
-    # List subdirectories within the base directory
-    patient_dirs = [dir_name for dir_name in os.listdir(base_directory) if
-                    os.path.isdir(os.path.join(base_directory, dir_name))]
+    # List subdirectories within the base directory (only those of the cohort, if given)
+    patient_dirs = patient_directories(cprs, base_directory)
 
     # Define the default file name here
     file_name = 'blood_test.xlsx'
@@ -565,7 +382,7 @@ def read_blood_test_excel_data():
 
 
 # Example usage:
-blood_test_data = read_blood_test_excel_data()
+blood_test_data = read_blood_test_excel_data(cohort)
 # print(blood_test_data)
 
 
@@ -589,30 +406,21 @@ def filter_blood_test_data(blood_test_data, keep_values):
     return filtered_blood_test_data
 
 
-def filter_blood_test_data(blood_test_data):
-    # Define the terms you want to keep (case insensitive)
-    keep_values = [
-        'hæmoglobin',
-        'leukocytter',
-        'neutrophilocytter',
-        'crp',
-        'kreatinin',
-        'natrium',
-        'kalium',
-        'trombocytter',
-        'ldh'
-    ]
+def filter_blood_test_data(blood_test_data, keep_values=BLADDER_ANALYTES):
+    """
+    Keep the blood tests of the analytes in keep_values (case insensitive, anywhere in the content) and parse them.
 
-    # Define a function that checks if any of the terms in keep_values are in the content
-    def contains_keep_value(content):
-        content_lower = str(content).lower()
-        return any(keep_value in content_lower for keep_value in keep_values)
+    :param blood_test_data: DataFrame with blood test data.
+    :param keep_values: The analytes to keep, see renal_cancer_porject.utils.analyte_parser.
+    :return: The kept rows with the parsed columns of parse_analytes ('name', 'value_text', 'analyte', 'comparator'
+             and 'value').
+    """
+    # Parse the whole column at once; float64 values, so that e.g. 7.9 is exported as 7.9
+    analytes = parse_analytes(blood_test_data['content'], keep_values, value_dtype=np.float64)
 
     # Filter the DataFrame
-    mask = blood_test_data['content'].apply(contains_keep_value)
-    filtered_blood_test_data = blood_test_data[mask]
-
-    return filtered_blood_test_data
+    mask = analytes['analyte'].notna().to_numpy()
+    return pd.concat([blood_test_data[mask], analytes[mask]], axis=1)
 
 
 # Usage:
@@ -622,17 +430,11 @@ filtered_blood_test_data = filter_blood_test_data(blood_test_data)
 # print(blood_test_data[blood_test_data['content'].str.contains('Hæmoglobin', case=False, na=False)])
 
 # ---
-# Split the 'content' column into 'content_name' and 'content_value'
-filtered_blood_test_data[['content_name', 'content_value']] = filtered_blood_test_data['content'].str.split(';', n=1, expand=True)
-
-# Function to extract numerical values using regex
-def extract_numerical_value(value):
-    # This regex captures numerical values and includes cases like <2,9
-    match = re.search(r'([<>]?\s?[\d,\.]+)', value)
-    return match.group(1) if match else None
-
-# Apply the function to extract numerical values
-filtered_blood_test_data['numerical_value'] = filtered_blood_test_data['content_value'].apply(extract_numerical_value)
+# The 'content' column split into 'content_name' and 'content_value', and the number of the value (a float, with
+# a '<' or '>' comparator in 'numerical_comparator'), as parsed by parse_analytes
+filtered_blood_test_data = filtered_blood_test_data.rename(
+    columns={'name': 'content_name', 'value_text': 'content_value', 'value': 'numerical_value',
+             'comparator': 'numerical_comparator'})
 # ---
 
 
@@ -645,21 +447,36 @@ new_filtered_blood_test_data = filtered_blood_test_data.copy()
 # Drop the 'content' column
 new_filtered_blood_test_data.drop(columns=['content', 'content_value'], inplace=True)
 
+# Keep 'blood_date', 'content_name' and 'numerical_value' as the last columns (see move_columns below)
+new_filtered_blood_test_data = new_filtered_blood_test_data[
+    ['cpr', 'analyte', 'numerical_comparator', 'blood_date', 'content_name', 'numerical_value']]
+
 # Display the new DataFrame
 
 def transform_blood_test_data(blood_test_data):
     """
     Transforms the blood_test_data DataFrame from long format to wide format.
 
-    :param blood_test_data: DataFrame with columns 'cpr', 'blood_date', 'content_name', 'numerical_value'
-    :return: Reshaped DataFrame with content names as columns
+    :param blood_test_data: DataFrame with columns 'cpr', 'blood_date', 'content_name', 'numerical_value' and
+                            'numerical_comparator'
+    :return: Reshaped DataFrame with content names as columns, followed by a '<content name> comparator' column
+             ('<' or '>') for every content name with a censored value
     """
+    # The first row with a value of every (cpr, blood_date, content_name), like pivot_table(aggfunc='first'), so
+    # that the value and the comparator come from the same row
+    rows = blood_test_data[blood_test_data['numerical_value'].notna()]
+    rows = rows.drop_duplicates(['cpr', 'blood_date', 'content_name'])
+    rows = rows.assign(numerical_comparator=rows['numerical_comparator'].astype(object))
+
     # Using pivot_table to handle duplicate entries
-    reshaped_data = blood_test_data.pivot_table(index=['cpr', 'blood_date'], columns='content_name',
-                                                values='numerical_value', aggfunc='first')
+    reshaped_data = rows.pivot_table(index=['cpr', 'blood_date'], columns='content_name',
+                                     values='numerical_value', aggfunc='first')
+    comparators = rows.pivot_table(index=['cpr', 'blood_date'], columns='content_name',
+                                   values='numerical_comparator', aggfunc='first')
+    comparators = comparators.reindex(reshaped_data.index).add_suffix(' comparator')
 
     # Reset the index for the final DataFrame
-    reshaped_data = reshaped_data.reset_index()
+    reshaped_data = pd.concat([reshaped_data, comparators], axis=1).reset_index()
 
     # Return the reshaped DataFrame
     return reshaped_data
@@ -704,7 +521,8 @@ def move_columns(dataframe, insert_index, number_of_columns):
 
 
 # Read Medications data
-medicin_excels = read_excel_data_into_dataframe('medicin.xlsx')
+medicin_excels = read_excel_data_into_dataframe('medicin.xlsx', cohort,
+                                                column_projection(['Medication', 'Start-Date', 'End-Date']))
 
 
 def filter_medicin_by_keywords(dataframe):
@@ -749,13 +567,14 @@ pato_miba_blood_medicine_combined_data = pd.merge(pato_miba_blood_combined_data,
 
 
 # Read Diagnoses data
-diagnose_list_data = read_excel_data_into_dataframe('diagnose_list.xlsx')
+diagnose_list_data = read_excel_data_into_dataframe('diagnose_list.xlsx', cohort, column_projection(['note', 'date']))
 diagnose_list_data = diagnose_list_data.rename(columns={'note': 'diagnose_note', 'date': 'diagnose_date'})
 
 pato_miba_blood_medicine_diagnoses_combined_data = pd.merge(pato_miba_blood_medicine_combined_data, diagnose_list_data, on='cpr', how='left')
 
 # Read diagnoses data
-vitale_data = read_excel_data_into_dataframe('vitale.xlsx')
+# Every column is a measurement date, so vitale is not projected
+vitale_data = read_excel_data_into_dataframe('vitale.xlsx', cohort)
 vitale_data = transform_vitale_data(vitale_data)
 
 pato_miba_blood_medicine_diagnoses_vitale_combined_data = pd.merge(pato_miba_blood_medicine_diagnoses_combined_data, vitale_data, on='cpr', how='left')
@@ -844,9 +663,8 @@ def keep_earliest_records(data_frame):
         "T75010", "T75110"
     ]
 
-    # Filter rows that contain any of the codes as substring
-    code_filters = [df_copy['diagnoser'].str.contains(code, na=False) for code in codes_to_look_for]
-    combined_filter = pd.concat(code_filters, axis=1).any(axis=1)
+    # Filter rows that contain any of the codes as substring (one scan over the column)
+    combined_filter = contains_any_code(df_copy['diagnoser'], codes_to_look_for)
     df_copy = df_copy[combined_filter]
 
     # Convert date back to string in the desired format
@@ -1,9 +1,20 @@
+import os
 import pandas as pd
 import ast
 import numpy as np
+from itertools import chain, compress
 
-# Read the data
-df = pd.read_excel('combine_all_data.xlsx')
+from code_matcher import code_indicator_matrix, contains_any_code
+from combined_data_io import COMBINED_DATA_PARQUET, read_combined_data
+from date_parsing import date_parsing_report, parse_dates
+from event_store import concat_list_columns, explode_events, implode_events
+from list_cell_parser import parse_list_cell
+
+# Read the data; the typed export of combine_data.py has native lists, so its cells need no parsing
+if os.path.isfile(COMBINED_DATA_PARQUET):
+    df = read_combined_data(COMBINED_DATA_PARQUET)
+else:
+    df = pd.read_excel('combine_all_data.xlsx')
 
 # ------------------- Convert string cells to list in selected columns ----------
 # Select columns that start with "pato" or "cpr"
@@ -13,58 +24,11 @@ cpr_pato_columns = [col for col in df.columns if col.startswith(('cpr', 'pato'))
 cpr_pato_df = df[cpr_pato_columns]
 
 
-def validate_and_clean_item(item):
-    """
-    Validates and cleans individual list items.
-    """
-    cleaned_item = item.strip().strip("'\"")
-    try:
-        ast.literal_eval(f"'{cleaned_item}'")
-    except SyntaxError:
-        print(f"validate_and_clean_item(): Error on: {cleaned_item}.")
-        cleaned_item = cleaned_item.replace("'", r"\'")
-    return cleaned_item
-
-def check_individual_items(string_list_repr):
-    """
-    Processes a string representing a list, attempting to validate and clean each item.
-    """
-    items = string_list_repr.strip('[]').split(',')
-    return [validate_and_clean_item(item) for item in items]
-
-def handle_malformed_string(s):
-    """
-    Fixes common malformed patterns in the string.
-    """
-    # Remove trailing , ']'
-    if s.endswith(', \']'):
-        s = s[:-3] + ']'
-    # Remove trailing comma before ']'
-    if s.endswith(',]'):
-        s = s[:-2] + ']'
-    return s
-
-def safe_literal_eval(s):
-    """
-    Attempts to convert a string representation of lists to an actual list.
-    """
-    if pd.isna(s):
-        return []
-
-    s = str(s).strip("'\"")  # Remove surrounding single or double quotes
-
-    s = handle_malformed_string(s)
-
-    try:
-        return ast.literal_eval(s)
-    except SyntaxError:
-        return check_individual_items(s)
-
 def parse(x, col):
     try:
         x = x.replace('nan', 'None')  # Replace 'nan' with 'None'
         # return ast.literal_eval(x)
-        return safe_literal_eval(x)
+        return parse_list_cell(x)
     except Exception as e:
         print(f"Failed to parse column: {col}")
         return np.nan
@@ -82,7 +46,8 @@ def convert_string_to_list(df):
     df_copy = df.copy()  # Create a copy of the DataFrame
     for col in df.columns:
         if col != 'cpr':
-            df_copy[col] = df[col].apply(lambda x: parse(x, col) if pd.notnull(x) else x)
+            # Cells read from the typed export are lists already
+            df_copy[col] = df[col].apply(lambda x: x if isinstance(x, list) else parse(x, col) if pd.notnull(x) else x)
     return df_copy
 
 # Usage
@@ -96,64 +61,61 @@ cpr_pato_df_list = convert_string_to_list(cpr_pato_df)
 # Get only the relevant columns
 pato_cols = [col for col in df.columns if col.startswith('pato')]
 
-# Define a function to filter all lists in a row based on 'pato_diagnoses' list
-def filter_row_based_on_pato_diagnoses(row):
+# One event per pato record (list position) of every cpr
+pato_events = explode_events(cpr_pato_df_list, pato_cols, key_col='pato_diagnoses')
+
+
+# Define a function to filter the pato records based on 'pato_diagnoses'
+def filter_row_based_on_pato_diagnoses(events):
+    """
+    Keep the pato events whose diagnoses contain one of the T codes.
+
+    Parameters:
+    events (pd.DataFrame): The pato events (see event_store.explode_events).
+
+    Returns:
+    pd.DataFrame: The kept events.
+    """
     # Define the codes you want to keep
     codes_to_keep_01 = ['T74940', 'T74000', 'T74950', 'T74010', 'T74030', 'T7432A', 'T7432B', 'T75000', 'T75050', 'T75060',
                         'T75010', 'T75110']
 
-    # Get the 'pato_diagnoses' list
-    diagnoses = row['pato_diagnoses']
-    # Check if 'diagnoses' is a list
-    if isinstance(diagnoses, list):
-        # Iterate over each item and its index in the 'pato_diagnoses' list
-        for i in reversed(range(len(diagnoses))):
-            # If the item doesn't contain any code in 'codes_to_keep_01' or 'codes_to_keep_02', remove it and the
-            # corresponding item in all lists
-            if not any(code in diagnoses[i] for code in codes_to_keep_01): #\ 
-                    # and not any(code in diagnoses[i] for code in codes_to_keep_02):
-                for col in pato_cols:
-                    del row[col][i]
-    return row
-
-
-# Copy the 'cpr_pato_df_list' to 'cpr_pato_df_list_contain_TCodes'
-cpr_pato_df_list_contain_TCodes = cpr_pato_df_list.copy()
-
-# Apply the function to each row
-cpr_pato_df_list_contain_TCodes = cpr_pato_df_list_contain_TCodes.apply(filter_row_based_on_pato_diagnoses, axis=1)  # ----------------------------------------------------
-# cpr_pato_df_list_contain_TCodes.to_excel('cpr_pato_TCodes_oldestDate_new_method.xlsx', index=False)
-# cpr_pato_df_list_contain_TCodes.to_excel('cpr_pato_TCodes_oldestDate_old_method.xlsx', index=False)
-# ------ Retrieve the earliest date from the data ------
+    # Keep the records that contain any code in 'codes_to_keep_01' (one scan per diagnosis)
+    return events[contains_any_code(events['pato_diagnoses'], codes_to_keep_01)]
 
-from datetime import datetime
 
-def keep_oldest_record_in_pato(row):
-    dates = row['pato_received_date']
+# Apply the function to the pato events
+pato_events_contain_TCodes = filter_row_based_on_pato_diagnoses(pato_events)
+# ------ Retrieve the earliest date from the data ------
+
 
-    # Check if 'dates' is a list and not empty
-    if isinstance(dates, list) and len(dates) > 0:
-        # Find the oldest date in the 'pato_received_date' list
-        oldest_date = min(dates, key=lambda x: datetime.strptime(x, '%d.%m.%Y'))
+def keep_oldest_record_in_pato(events):
+    """
+    Keep the pato events of the oldest received date of every cpr (all records of that date).
 
-        # Find the indices of all occurrences of the oldest date
-        oldest_index = [i for i, date in enumerate(dates) if date == oldest_date]
+    Parameters:
+    events (pd.DataFrame): The pato events (see event_store.explode_events).
 
-        # Keep only the elements at the corresponding indices in each column
-        for col in pato_cols:
-            row[col] = [row[col][i] for i in oldest_index]
+    Returns:
+    pd.DataFrame: The kept events.
+    """
+    dates = events['pato_received_date']
 
-        # Update the 'pato_received_date' column with the oldest date repeated for the same number of occurrences
-        row['pato_received_date'] = [oldest_date] * len(oldest_index)
+    # Find the first record with the oldest date of every row
+    parsed_dates = parse_dates(dates).dropna()  # Records without a date are never the oldest
+    oldest_event = parsed_dates.groupby(events.loc[parsed_dates.index, 'row']).idxmin()
+    oldest_date = pd.Series(dates.loc[oldest_event].to_numpy(), index=oldest_event.index)
 
-    return row
+    # Keep all records with the oldest date
+    return events[(dates == events['row'].map(oldest_date)).to_numpy(dtype=bool)]
 
 
-# Create a copy of 'cpr_pato_df_list_contain_codes' dataframe to preserve the original data
-cpr_pato_TCodes_oldestDate = cpr_pato_df_list_contain_TCodes.copy()
+# Apply the 'keep_oldest_record_in_pato' function to the pato events
+pato_events_TCodes_oldestDate = keep_oldest_record_in_pato(pato_events_contain_TCodes)
 
-# Apply the 'keep_oldest_record_in_pato' function to each row
-cpr_pato_TCodes_oldestDate = cpr_pato_TCodes_oldestDate.apply(keep_oldest_record_in_pato, axis=1)
+# Back to one row per cpr with list cells
+cpr_pato_TCodes_oldestDate = implode_events(pato_events_TCodes_oldestDate, cpr_pato_df_list, pato_cols,
+                                            key_col='pato_diagnoses')
 
 
 # ------------------------------------
@@ -230,19 +192,15 @@ def collect_diagnose_codes_in_columns(data):
     for code in diagnose_codes:
         new_data[code] = 'No'
 
-    # Iterate through each row of the DataFrame
-    for idx, row in new_data.iterrows():
-        diagnoses = row['pato_diagnoses']
+    # Join the diagnoses of each row into one text (the separator never occurs in a code), skipping NaN rows
+    diagnoses_text = new_data['pato_diagnoses'].map(
+        lambda diagnoses: '\x00'.join(map(str, diagnoses)) if isinstance(diagnoses, list)
+        else diagnoses if isinstance(diagnoses, str) else None)
 
-        # Skip the row if the 'pato_diagnoses' value is NaN
-        if pd.isnull(diagnoses):
-            continue
-
-        # Check for the presence of each code in 'diagnoser' and update the corresponding column with 'Yes' if found
-        for code in diagnose_codes:
-            for diagnose in diagnoses:
-                if code in diagnose:
-                    new_data.at[idx, code] = 'Yes'
+    # Check for the presence of every code in one scan per row and set the columns of the codes found to 'Yes'
+    code_indicators = code_indicator_matrix(diagnoses_text, diagnose_codes)
+    for code in code_indicators.columns:
+        new_data.loc[code_indicators[code], code] = 'Yes'
 
     return new_data
 
@@ -277,91 +235,62 @@ miba_cols = [col for col in df.columns if col.startswith(('miba'))]
 # ⦁	Urin … (Urin, Urin – midtstråle, etc)
 
 
-def filter_df_based_on_codes(df, codes_to_keep, cols_to_filter, filter_by_col_list):
+def filter_df_based_on_codes(events, codes_to_keep, filter_by_col):
     """
-    Function to filter DataFrame rows based on specific codes.
+    Function to filter events based on specific codes.
 
-    This function filters the DataFrame 'df' such that for each row, if a list
-    item in the column 'list_col' does not contain any of the 'codes_to_keep',
-    it removes that list item and corresponding list items from the other columns
-    specified in 'cols_to_filter'.
+    This function keeps the events whose item in the column 'filter_by_col' contains any of the 'codes_to_keep';
+    the other events are removed with all their columns.
 
     Parameters:
-    df (pd.DataFrame): The DataFrame to filter.
-    codes_to_keep (list): The list of codes to check for in each list item of 'list_col'.
-    cols_to_filter (list): The list of column names whose corresponding list items should be removed.
-    filter_by_col_list (str): The column name that contains the lists to be checked against 'codes_to_keep'.
+    events (pd.DataFrame): The events to filter (see event_store.explode_events).
+    codes_to_keep (list): The list of codes to check for in each item of 'filter_by_col'.
+    filter_by_col (str): The column name that contains the items to be checked against 'codes_to_keep'.
 
     Returns:
-    df_copy (pd.DataFrame): A copy of the original DataFrame after filtering.
+    pd.DataFrame: The kept events.
     """
-    # Make a copy of the DataFrame to prevent modifications on the original
-    df_copy = df.copy()
-
-    # Iterate over DataFrame rows
-    for index, row in df_copy.iterrows():
-        # Get the list from the specified column
-        list_data = row[filter_by_col_list]
-
-        # If the data is a list, proceed with filtering
-        if isinstance(list_data, list):
-            # Iterate over each item and its index in the list
-            for i in reversed(range(len(list_data))):
-                # If the list item doesn't contain any code in 'codes_to_keep'
-                # remove it and corresponding items from all columns in 'cols_to_filter'
-                if not any(code in list_data[i] for code in codes_to_keep):
-                    for col in cols_to_filter:
-                        # Check if the column exists in the DataFrame
-                        if col in df_copy.columns:
-                            del df_copy.at[index, col][i]
-
-    # Return the filtered DataFrame
-    return df_copy
+    return events[contains_any_code(events[filter_by_col], codes_to_keep)]
 
 
 miba_sample_type_keywords_to_keep = ['Blod', 'Urin']
 
+# One event per miba sample of every cpr
+miba_list_cols = [col for col in miba_cols if col in cpr_miba_df_list.columns]
+miba_events = explode_events(cpr_miba_df_list, miba_list_cols, key_col='miba_sample_type')
 
-
-cpr_miba_filterByKeywords = filter_df_based_on_codes(cpr_miba_df_list, miba_sample_type_keywords_to_keep, miba_cols, 'miba_sample_type')
+miba_events_filterByKeywords = filter_df_based_on_codes(miba_events, miba_sample_type_keywords_to_keep, 'miba_sample_type')
 
 # ---------------------------------
 
 # If “Kvantitet” is empty = Negative
 
-def replace_none_in_list(df, keyword):
+def replace_none_in_list(events, keyword, cols):
     """
-    Function to replace 'None' values in lists within all DataFrame columns.
-
-    This function goes through each row of the DataFrame 'df' and each column,
-    checks the list in the column and replaces 'None' values with the provided 'keyword'.
+    Function to replace 'None' values in the columns of the events.
 
     Parameters:
-    df (pd.DataFrame): The DataFrame to manipulate.
+    events (pd.DataFrame): The events to manipulate.
     keyword (str): The string to replace 'None' values with.
+    cols (list): The columns in which to replace the 'None' values.
 
     Returns:
-    df_copy (pd.DataFrame): A copy of the original DataFrame after replacement.
+    pd.DataFrame: A copy of the events after replacement.
     """
-    # Make a copy of the DataFrame to prevent modifications on the original
-    df_copy = df.copy()
-
-    # Iterate over DataFrame rows
-    for index, row in df_copy.iterrows():
-        # Iterate over each column
-        for column_name in df_copy.columns:
-            # Get the list from the current column
-            list_data = row[column_name]
-
-            # If the data is a list, proceed with replacement
-            if isinstance(list_data, list):
-                # Replace 'None' with 'keyword' in the list
-                df_copy.at[index, column_name] = [item if item is not None else keyword for item in list_data]
-
-    # Return the DataFrame with replaced values
-    return df_copy
-
-cpr_miba_filterByKeywords_NoneToNegative = replace_none_in_list(cpr_miba_filterByKeywords, 'Negative')
+    events = events.copy()
+    for col in cols:
+        values = events[col].to_numpy(dtype=object, copy=True)
+        values[np.equal(values, None)] = keyword
+        events[col] = pd.Series(values, index=events.index, dtype=object)
+    return events
+
+miba_events_filterByKeywords_NoneToNegative = replace_none_in_list(miba_events_filterByKeywords, 'Negative',
+                                                                    miba_list_cols)
+
+# Back to one row per cpr with list cells
+cpr_miba_filterByKeywords_NoneToNegative = implode_events(miba_events_filterByKeywords_NoneToNegative,
+                                                          cpr_miba_df_list, miba_list_cols,
+                                                          key_col='miba_sample_type')
 # ----------------------------------------
 # Filter the miba DataFrame based on the miba_collection_date column so that only records that occurred before the pato_received_date in the pato DataFrame are kept.
 def parse_string(x):
@@ -372,26 +301,70 @@ def parse_string(x):
         print(f"Failed to parse: {x}")
         return None
 
-def convert_dates(date_list):
-    # Check if date_list is not iterable (float, None etc.)
-    if isinstance(date_list, str):
-        date_list = parse_string(date_list)
+def flatten_list_column(column):
+    """
+    Flattens a column of list cells into one row per element (long format).
+
+    Parameters:
+    column (pd.Series): The column. Cells that are not lists have no elements.
+
+    Returns:
+    tuple: The elements of all lists (list), the number of elements per row (np.ndarray) and
+           the start of each row in the elements (np.ndarray).
+    """
+    cells = column.tolist()
+    lengths = np.fromiter((len(cell) if isinstance(cell, list) else 0 for cell in cells), dtype=np.intp, count=len(cells))
+    elements = list(chain.from_iterable(cell for cell in cells if isinstance(cell, list)))
+    return elements, lengths, np.cumsum(lengths) - lengths
+
 
-    if not isinstance(date_list, list):
-        return []
+def convert_dates(column):
+    """
+    Converts the lists of date strings of a column to lists of datetimes, ignoring non-dates (None values are kept).
+
+    All dates of the column are parsed in one batch by date_parsing.parse_dates (each distinct string once, with the
+    fixed formats of the exports).
+
+    Parameters:
+    column (pd.Series): The column. String cells are parsed as lists first; cells that are not lists give [].
+
+    Returns:
+    pd.Series: The lists of datetimes, indexed like 'column'.
+    """
+    cells = column.map(lambda cell: parse_string(cell) if isinstance(cell, str) else cell)
+    dates, lengths, _ = flatten_list_column(cells)
+    dates = pd.Series(dates, dtype=object)
+
+    # Parse all dates at once and keep the ones that are a date (or None)
+    is_none = np.equal(dates.to_numpy(), None)
+    parsed = parse_dates(dates).astype(object)
+    parsed[is_none] = None
+    keep = is_none | parsed.notna().to_numpy()
+
+    # Rebuild the lists once
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    kept_dates = parsed[keep].tolist()
+    kept_lengths = np.bincount(rows[keep], minlength=len(lengths))
+    kept_ends = np.cumsum(kept_lengths)
+    kept_starts = kept_ends - kept_lengths
+    return pd.Series([kept_dates[start:end] for start, end in zip(kept_starts, kept_ends)],
+                     index=column.index, dtype=object)
 
-    # Converts a list of strings to datetime, ignoring non-dates and None values
-    return [pd.to_datetime(date) for date in date_list if pd.to_datetime(date, errors='coerce') is not pd.NaT]
 
 # Apply the function to each row of 'miba_collection_date' and 'pato_received_date'
-cpr_miba_filterByKeywords_NoneToNegative['miba_collection_date'] = cpr_miba_filterByKeywords_NoneToNegative['miba_collection_date'].apply(convert_dates)
+cpr_miba_filterByKeywords_NoneToNegative['miba_collection_date'] = convert_dates(cpr_miba_filterByKeywords_NoneToNegative['miba_collection_date'])
 
-cpr_pato_TCodes_oldestDate_diagnoseCodes_df['pato_received_date'] = cpr_pato_TCodes_oldestDate_diagnoseCodes_df['pato_received_date'].apply(convert_dates)
+cpr_pato_TCodes_oldestDate_diagnoseCodes_df['pato_received_date'] = convert_dates(cpr_pato_TCodes_oldestDate_diagnoseCodes_df['pato_received_date'])
 
 def filter_by_date(df1, df2, id_col, date_col_df1, date_col_df2, cols_to_filter):
     """
     Filters df1 to only include elements where the date in date_col_df1 is earlier than the date in date_col_df2 in df2 for a matching id_col.
 
+    The index date of every id (the first date of the first df2 row of the id) is looked up with one hash join
+    instead of a scan of df2 per row. The dates of df1 are flattened to one row per event, compared with the
+    index date in one go, and the resulting mask filters all columns in cols_to_filter; their lists are
+    rebuilt once at the end.
+
     Parameters:
     df1 (pd.DataFrame): The first DataFrame. Expected to contain id_col and date_col_df1 columns.
     df2 (pd.DataFrame): The second DataFrame. Expected to contain id_col and date_col_df2 columns.
@@ -400,35 +373,46 @@ def filter_by_date(df1, df2, id_col, date_col_df1, date_col_df2, cols_to_filter)
     Returns:
     df1_filtered (pd.DataFrame): A filtered version of df1.
     """
-    # Make a copy of df1 to prevent modifications on the original
-    df1_filtered = df1.copy()
-
-    # Iterate over the rows of df1
-    for index, row in df1.iterrows():
-        id_val = row[id_col]
-
-        # Find the corresponding row in df2
-        df2_row = df2[df2[id_col] == id_val]
-
-        # If there is no corresponding row in df2, drop the row from df1
-        if df2_row.empty:
-            df1_filtered = df1_filtered.drop(index)
+    # The index date of every id: the first date of the first row of the id in df2, or None if it has no date
+    first_rows = df2.drop_duplicates(subset=id_col, keep='first')
+    first_rows = first_rows[first_rows[id_col].notna()]
+    index_dates = pd.Series([dates[0] if dates else None for dates in first_rows[date_col_df2]],
+                            index=first_rows[id_col].to_numpy(), dtype=object)
+
+    # Drop the rows without a corresponding row in df2
+    df1_filtered = df1[df1[id_col].isin(index_dates.index) & df1[id_col].notna()].copy()
+
+    # One row per date of df1, with the index date of its id
+    dates, date_lengths, date_starts = flatten_list_column(df1_filtered[date_col_df1])
+    row_index_dates = pd.to_datetime(df1_filtered[id_col].map(index_dates).to_numpy(dtype=object))
+    event_index_dates = row_index_dates.repeat(date_lengths)
+    event_dates = pd.to_datetime(pd.Series(dates, dtype=object))
+
+    # Keep the events that are earlier than the index date
+    keep = ~(event_index_dates.isna() | (event_dates.to_numpy() >= event_index_dates.to_numpy()))
+
+    for col in cols_to_filter:
+        # Check if the column exists in the DataFrame
+        if col not in df1_filtered.columns:
             continue
 
-        # Get the dates from df1 and df2
-        dates_df1 = row[date_col_df1]
-        # Get the first (and only) date from date_col_df2 or None if the list is empty
-        date_df2 = df2_row.iloc[0][date_col_df2][0] if df2_row.iloc[0][date_col_df2] else None
-
-        # Iterate over each date in dates_df1 and its index in reverse order
-        for i in reversed(range(len(dates_df1))):
-            # If date_df2 is None or if the date in dates_df1 is not earlier than date_df2, remove the
-            # corresponding elements from all columns in cols_to_filter
-            if date_df2 is None or dates_df1[i] >= date_df2:
-                for col in cols_to_filter:
-                    # Check if the column exists in the DataFrame
-                    if col in df1_filtered.columns:
-                        del df1_filtered.at[index, col][i]
+        # Element i of a list is filtered like date i of its row; elements without a date are kept
+        elements, lengths, starts = flatten_list_column(df1_filtered[col])
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.arange(len(elements)) - starts[rows]
+        has_date = positions < date_lengths[rows]
+        keep_element = ~has_date
+        keep_element[has_date] = keep[date_starts[rows[has_date]] + positions[has_date]]
+
+        # Rebuild the lists of the column once
+        kept_elements = list(compress(elements, keep_element))
+        kept_ends = np.cumsum(np.bincount(rows[keep_element], minlength=len(lengths)))
+        kept_starts = np.r_[0, kept_ends[:-1]]
+        cells = df1_filtered[col].tolist()
+        df1_filtered[col] = pd.Series(
+            [kept_elements[start:end] if isinstance(cell, list) else cell
+             for cell, start, end in zip(cells, kept_starts, kept_ends)],
+            index=df1_filtered.index, dtype=object)
 
     return df1_filtered
 
@@ -443,14 +427,6 @@ cpr_pato_miba = pd.merge(filtered_miba_by_date_before_pato, cpr_pato_TCodes_olde
 # ---------------------------------------
 # ---------------------------------------
 # ---------------------------------------
-def convert_dates(date_list):
-    # Check if date_list is not iterable (float, None etc.)
-    if not isinstance(date_list, list):
-        return []
-
-    # Converts a list of strings to datetime, ignoring non-dates and None values
-    return [pd.to_datetime(date) for date in date_list if pd.to_datetime(date, errors='coerce') is not pd.NaT]
-
 # Select columns that start with "blood" or "cpr"
 cpr_blood_columns = [col for col in df.columns if col.startswith(('cpr', 'blood'))]
 
@@ -460,7 +436,7 @@ cpr_blood_df = df[cpr_blood_columns]
 
 # # Convert the string representation of lists to actual lists using the safe function
 # for col in blood_cols:
-#     cpr_blood_df[col] = cpr_blood_df[col].apply(safe_literal_eval)
+#     cpr_blood_df[col] = cpr_blood_df[col].apply(parse_list_cell)
 
 # Usage
 cpr_blood_df_list = convert_string_to_list(cpr_blood_df)
@@ -470,83 +446,44 @@ cpr_blood_df_list = convert_string_to_list(cpr_blood_df)
 # Only data concerning
 keywords = ['Hæmoglobin', 'Leukocytter', 'Neutrophilocytter', 'CRP', 'kreatinin', 'natrium', 'kalium', 'trombocytter', 'LDH']
 
-def filter_lists(df, cols, keywords):
+def filter_lists(events, cols, keywords):
     """
-    This function takes a DataFrame, column names, and a list of keywords. It filters out entries in the specified
-    columns of the DataFrame that do not contain any of the keywords.
+    This function takes events, column names, and a list of keywords. It keeps the events in which any of the
+    specified columns contains any of the keywords.
 
     Parameters:
-    df (pd.DataFrame): DataFrame containing the columns.
-    cols (List[str]): List of column names to filter.
+    events (pd.DataFrame): The events (see event_store.explode_events).
+    cols (List[str]): List of column names to check.
     keywords (List[str]): List of keywords to filter the contents.
 
     Returns:
-    pd.DataFrame: The DataFrame with filtered content.
+    pd.DataFrame: The kept events.
     """
+    keep = np.zeros(len(events), dtype=bool)
+    for col in cols:
+        keep |= contains_any_code(events[col], keywords).to_numpy()
+    return events[keep]
 
-    # Iterate over each row in DataFrame
-    for idx, row in df.iterrows():
-
-        # Initialize a dictionary to store new lists for each column
-        new_lists = {col: [] for col in cols}
-
-        # Check if all items in cols are lists, if not, continue to next iteration
-        if not all(isinstance(row[col], list) for col in cols):
-            continue
-
-        # Find the minimum length of lists in the current row, to avoid out-of-range errors
-        min_len = min(len(row[col]) for col in cols)
-
-        # Iterate over elements in the lists in the current row
-        for i in range(min_len):
 
-            # Check if any keyword is in the content of all columns for current index
-            if any(keyword in row[col][i] for keyword in keywords for col in cols):
+# Merge blood columns: the chunk columns of the REDCap export ('blood_date_1', ...) or the single list column of
+# the typed export
+blood_date_cols = [col for col in cpr_blood_df_list.columns if col == 'blood_date' or col.startswith('blood_date_')]
+blood_content_cols = [col for col in cpr_blood_df_list.columns
+                      if col == 'blood_content' or col.startswith('blood_content_')]
+merged_dates = concat_list_columns(cpr_blood_df_list, blood_date_cols)
+merged_contents = concat_list_columns(cpr_blood_df_list, blood_content_cols)
 
-                # If yes, append the element at current index to the new list for each column
-                for col in cols:
-                    new_lists[col].append(row[col][i])
-
-        # Replace the old lists with new filtered lists in the DataFrame
-        for col in cols:
-            df.at[idx, col] = new_lists[col]
-
-    return df
-
-
-# Merge blood columns 
-blood_date_cols = [col for col in cpr_blood_df_list.columns if col.startswith('blood_date')]
-blood_content_cols = [col for col in cpr_blood_df_list.columns if col.startswith('blood_content')]
-
-cpr_blood_df_list['blood_date'] = None
-cpr_blood_df_list['blood_content'] = None
-
-for index, row in cpr_blood_df_list.iterrows():
-    merged_date_list = []
-    merged_content_list = []
-
-    for col in blood_date_cols:
-        row_data = row[col]
-        if isinstance(row_data, list):
-            merged_date_list.extend(row_data)
-    for col in blood_content_cols:
-        row_data = row[col]
-        if isinstance(row_data, list):
-            merged_content_list.extend(row_data)
-
-    cpr_blood_df_list.at[index, 'blood_date'] = merged_date_list
-    cpr_blood_df_list.at[index, 'blood_content'] = merged_content_list
- 
 # Remove undesire columns
-blood_date_cols = [col for col in cpr_blood_df_list.columns if col.startswith('blood_date_')]
-blood_content_cols = [col for col in cpr_blood_df_list.columns if col.startswith('blood_content_')]
 cpr_blood_df_list = cpr_blood_df_list.drop(columns=blood_date_cols + blood_content_cols)
+cpr_blood_df_list['blood_date'] = merged_dates
+cpr_blood_df_list['blood_content'] = merged_contents
 
 # Fliter 
 blood_cols = [col for col in cpr_blood_df_list.columns if col.startswith(('blood'))]
-cpr_blood_codes_filter = filter_lists(cpr_blood_df_list, blood_cols, keywords)
+blood_events = filter_lists(explode_events(cpr_blood_df_list, blood_cols), blood_cols, keywords)
+cpr_blood_codes_filter = implode_events(blood_events, cpr_blood_df_list, blood_cols)
 
-cpr_blood_codes_filter['blood_date'] = cpr_blood_codes_filter['blood_date'].apply(convert_dates)
+cpr_blood_codes_filter['blood_date'] = convert_dates(cpr_blood_codes_filter['blood_date'])
 cpr_blood_filter_by_codes_and_dates = filter_by_date(cpr_blood_codes_filter, cpr_pato_miba, 'cpr', 'blood_date',  'pato_received_date', blood_cols)
 
 # Merge two dataframe
@@ -575,7 +512,8 @@ medicine_keywords = [
     "Cefuroxim", "Meropenem"
 ]
 
-cpr_medicine_filter_by_kewords = filter_lists(cpr_medicine_df_list, medicine_cols, medicine_keywords)
+medicine_events = filter_lists(explode_events(cpr_medicine_df_list, medicine_cols), medicine_cols, medicine_keywords)
+cpr_medicine_filter_by_kewords = implode_events(medicine_events, cpr_medicine_df_list, medicine_cols)
 
 # Merge two dataframe
 cpr_pato_miba_blood_medicine = pd.merge(cpr_medicine_filter_by_kewords, cpr_pato_miba_blood, on='cpr')
@@ -618,3 +556,6 @@ cpr_vitale_df_list = convert_string_to_list(cpr_vitale_df)
 cpr_pato_miba_blood_medicine_diagnose_vitale = pd.merge(cpr_vitale_df_list, cpr_pato_miba_blood_medicine_diagnose, on='cpr')
 
 cpr_pato_miba_blood_medicine_diagnose_vitale.to_excel('bladder_infect_data.xlsx', index=False)
+
+# Dates that matched none of the fixed formats and were parsed with format inference
+print(f"Date parsing: {date_parsing_report()}")
@@ -0,0 +1,112 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+@lru_cache(maxsize=None)
+def compile_codes(codes):
+    """
+    Compile a set of codes (e.g. SNOMED codes such as 'T74940') into one matcher.
+
+    The matcher is a single regex that, at every position of a text, matches the longest code starting
+    there. Codes that are a prefix of the matched code start at the same position too, so they are added
+    afterwards; together this finds every code that occurs in a text (like `code in text` for every code)
+    in one scan.
+
+    Parameters:
+    codes (tuple): The codes to look for. Duplicates are ignored.
+
+    Returns:
+    dict: 'codes' (the unique codes, in the given order), 'pattern' (regex finding every code occurrence),
+          'any_pattern' (regex for checking if any code occurs) and 'prefixes' (code -> codes that are a prefix of it).
+    """
+    unique_codes = list(dict.fromkeys(codes))
+    alternatives = '|'.join(re.escape(code) for code in sorted(unique_codes, key=len, reverse=True))
+    prefixes = {code: [other for other in unique_codes if other != code and code.startswith(other)]
+                for code in unique_codes}
+
+    return {
+        'codes': unique_codes,
+        'pattern': re.compile(f'(?=({alternatives}))'),
+        'any_pattern': re.compile(alternatives),
+        'prefixes': prefixes
+    }
+
+
+def find_codes(text, codes):
+    """
+    Find all codes that occur in a text.
+
+    Parameters:
+    text (str): The text to scan.
+    codes (list): The codes to look for.
+
+    Returns:
+    list: The codes found, in the order of 'codes'.
+    """
+    matcher = compile_codes(tuple(codes))
+    found = set()
+    for code in matcher['pattern'].findall(text):
+        found.add(code)
+        found.update(matcher['prefixes'][code])
+    return [code for code in matcher['codes'] if code in found]
+
+
+def codes_per_row(texts, codes):
+    """
+    Find the codes that occur in each text of a Series (one scan per text).
+
+    Parameters:
+    texts (pd.Series): The texts to scan (e.g. the 'Diagnoser' column). Missing values have no codes.
+    codes (list): The codes to look for.
+
+    Returns:
+    pd.Series: For each row, the list of codes found (in the order of 'codes').
+    """
+    return texts.map(lambda text: find_codes(text, codes) if isinstance(text, str) else [])
+
+
+def code_indicator_matrix(texts, codes, sparse=False):
+    """
+    Build a one-hot matrix of the codes that occur in each text of a Series.
+
+    Parameters:
+    texts (pd.Series): The texts to scan. Missing values have no codes.
+    codes (list): The codes to look for.
+    sparse (bool): Return sparse boolean columns (useful for many rows and codes).
+
+    Returns:
+    pd.DataFrame: One boolean column per unique code, indexed like 'texts'.
+    """
+    unique_codes = compile_codes(tuple(codes))['codes']
+    column_of = {code: column for column, code in enumerate(unique_codes)}
+    found = codes_per_row(texts, codes)
+
+    # Set the cells of the codes found in each row
+    matrix = np.zeros((len(texts), len(unique_codes)), dtype=bool)
+    rows = [row for row, row_codes in enumerate(found) for _ in row_codes]
+    columns = [column_of[code] for row_codes in found for code in row_codes]
+    matrix[rows, columns] = True
+
+    indicators = pd.DataFrame(matrix, index=texts.index, columns=unique_codes)
+    if sparse:
+        indicators = indicators.astype(pd.SparseDtype(bool, False))
+    return indicators
+
+
+def contains_any_code(texts, codes):
+    """
+    Check which texts of a Series contain at least one of the codes (one scan per text).
+    Replaces pd.concat([texts.str.contains(code, na=False) for code in codes], axis=1).any(axis=1).
+
+    Parameters:
+    texts (pd.Series): The texts to scan. Missing values never match.
+    codes (list): The codes to look for.
+
+    Returns:
+    pd.Series: A boolean mask, indexed like 'texts'.
+    """
+    any_pattern = compile_codes(tuple(codes))['any_pattern']
+    return texts.map(lambda text: isinstance(text, str) and any_pattern.search(text) is not None).astype(bool)
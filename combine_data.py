@@ -1,103 +1,21 @@
 import os
+import numpy as np
 import pandas as pd
 import re
 import openpyxl
-from collections import defaultdict
-
-
-def transform_vitale_data(original_data):
-    # Dictionary to store the tidy data
-    # Keys are tuples of (cpr, date), values are dictionaries of the measurements
-    tidy_data_dict = defaultdict(dict)
-
-    # Regular expression pattern to extract date
-    date_pattern = re.compile(r'\d{2}-\d{2}-\d{4}')
-
-    # Regular expression pattern to extract date and time
-    date_time_pattern = re.compile(r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}')
-
-    # Mapping from measurement type to column name
-    measurement_to_column = {
-        'Blodtryk': 'vitale_blodtryk',
-        'Puls': 'vitale_puls',
-        'Resp.frekv.': 'vitale_respfrekv',
-        'Temperatur': 'vitale_temperatur',
-        'Temp.kilde': 'vitale_tempkilde',
-        'Saturation': 'vitale_saturation',
-        'Hovedomfang (cm)': 'vitale_hovedomfang',
-        'Vægt': 'vitale_vaegt',
-        'Højde': 'vitale_hoejde',
-        'Body Mass Index': 'vitale_bodymassindex'
-    }
-
-    # Loop through each row in the original data
-    for index, row in original_data.iterrows():
-        # Extract the cpr
-        cpr = row['cpr']
-
-        # Extract the measurement type
-        measurement_type = str(row['værdier']).replace(':', '').strip()
-
-        # Check if the measurement type is in the mapping
-        if measurement_type in measurement_to_column:
-            # Loop through each column except 'værdier'
-            for column in original_data.columns[2:]:
-                raw_value = str(row[column]).replace('\xa0', ' ').replace('_x000D_', '').strip()
-
-                # Extract date from column name
-                match = date_time_pattern.search(column)
-                column_date = match.group() if match else None
-
-                # If date is extracted from column name, use it, otherwise, extract from raw value
-                measurement_date = column_date
-                if not measurement_date:
-                    match = date_pattern.search(raw_value)
-                    measurement_date = match.group() if match else None
-
-                    # Remove date from raw_value if measurement_date exists
-                    if measurement_date:
-                        raw_value_no_date = date_pattern.sub('', raw_value)
-                    else:
-                        raw_value_no_date = raw_value
-
-                    # Split the string into an array
-                    raw_value_array = raw_value_no_date.split()
-
-                    if 'pr.' in raw_value_array:
-                        raw_value_array.remove('pr.')
-
-                    # Check if raw_value_array[1] is not a date and concatenate
-                    if len(raw_value_array) > 1 and not date_pattern.match(raw_value_array[1]):
-                        raw_value_no_date = raw_value_array[0] + ' ' + raw_value_array[1]
-                    else:
-                        raw_value_no_date = raw_value_array[0] if raw_value_array else ''
-                else:
-                    raw_value_no_date = raw_value
-
-                # Extract the measurement value
-                if raw_value_no_date not in ('nan', ''):
-                    # Add data to the tidy data dict
-                    key = (cpr, measurement_date)
-                    tidy_data_dict[key][measurement_to_column[measurement_type]] = raw_value_no_date
-
-    # Convert the nested dictionaries to a list of dictionaries
-    tidy_data_list = [{'cpr': cpr, 'vitale_measurement_date': date, **measurements}
-                      for (cpr, date), measurements in tidy_data_dict.items()]
-
-    # Convert the list of dictionaries to a DataFrame
-    tidy_data = pd.DataFrame(tidy_data_list)
 
-    # Return the tidy data
-    return tidy_data
+from bladder_cohort import find_bladder_cohort, patient_directories
+from combined_data_io import COMBINED_DATA_PARQUET, aggregate_to_lists, write_combined_data
+from redcap_export import combine_sources, serialise_redcap_frame
+from vitale_transform import transform_vitale_data
 
 
-def read_blood_test_excel_data():
+def read_blood_test_excel_data(cprs=None):
     # Base directory
     base_directory = 'HospitalData'
 
-    # List subdirectories within the base directory
-    patient_dirs = [dir_name for dir_name in os.listdir(base_directory) if
-                    os.path.isdir(os.path.join(base_directory, dir_name))]
+    # List subdirectories within the base directory (only those of the cohort, if given)
+    patient_dirs = patient_directories(cprs, base_directory)
 
     # Define the default file name here
     file_name = 'blood_test.xlsx'
@@ -136,19 +54,19 @@ def read_blood_test_excel_data():
     return data_frame
 
 
-def read_excel_data_into_dataframe(file=None):
+def read_excel_data_into_dataframe(file=None, cprs=None):
     """
     Read Excel files from patient folders into a DataFrame.
 
     :param file: Name of the Excel file to read.
+    :param cprs: The cprs to read (e.g. the bladder cohort); None reads every patient.
     :return: DataFrame containing data from Excel files with additional columns for cpr.
     """
     # List to store individual DataFrames
     data_frames = []
 
     # Patient directories
-    patient_dirs = [dir_name for dir_name in os.listdir('HospitalData') if
-                    os.path.isdir(os.path.join('HospitalData', dir_name))]
+    patient_dirs = patient_directories(cprs)
 
     # Iterate through patient directories
     for cpr in patient_dirs:
@@ -172,40 +90,57 @@ def read_excel_data_into_dataframe(file=None):
     return data
 
 
+# Loading mode: with COHORT_FIRST the bladder cohort (patients with a T-code in pato_bank.xlsx) is found first, and
+# the other sources are read for the cohort patients only. Every column is read: all of them are exported.
+COHORT_FIRST = False
+
+# Columns of the sources and their names in the combined data
+miba_columns = {'Prøvens art': 'miba_sample_type', 'Taget d.': 'miba_collection_date', 'Kvantitet': 'miba_quantity',
+                'Analyser': 'miba_analysis', 'Resistens': 'miba_resistance', 'Mikroskopi': 'miba_microscopy'}
+medicin_columns = {'Medication': 'medicines_name', 'Start-Date': 'medicine_start_date',
+                   'End-Date': 'medicine_end_date'}
+diagnoses_columns = {'note': 'diagnose_note', 'date': 'diagnose_date'}
+pato_bank_columns = {'Modtaget': 'pato_received_date', 'Serviceyder': 'pato_service_provider',
+                     'Rekv.nr.': 'pato_request_number', 'Kategori': 'pato_category', 'Diagnoser': 'pato_diagnoses',
+                     'Mat.nr.	Beskrivelse af materiale/prøve': 'pato_material_description_of_smple',
+                     'Konklusion': 'pato_conclusion', 'Mikroskopi': 'pato_microscopy',
+                     'Andre undersøgelser': 'pato_other_investigations', 'Makroskopi': 'pato_macroscopy',
+                     'Kliniske oplysninger': 'pato_clinical_information'}
+
 # Read Data
+# Read pato_bank data first: it defines the cohort
+if COHORT_FIRST:
+    pato_bank_excels = read_excel_data_into_dataframe('pato_bank.xlsx')
+    cohort = find_bladder_cohort(pato_bank_excels)
+    pato_bank_excels = pato_bank_excels[pato_bank_excels['cpr'].isin(cohort)].reset_index(drop=True)
+    print(f"Cohort-first loading: {len(cohort)} patients with a bladder T-code")
+else:
+    pato_bank_excels = read_excel_data_into_dataframe('pato_bank.xlsx')
+    cohort = None
+
+
 # Read miba data
-miba_excels = read_excel_data_into_dataframe('miba.xlsx')
+miba_excels = read_excel_data_into_dataframe('miba.xlsx', cohort)
 
 # Read medications data
-medicin_excels = read_excel_data_into_dataframe('medicin.xlsx')
+medicin_excels = read_excel_data_into_dataframe('medicin.xlsx', cohort)
 
 # Read diagnoses data
-diagnoses_excels = read_excel_data_into_dataframe('diagnose_list.xlsx')
-
-# Read pato_bank data
-pato_bank_excels = read_excel_data_into_dataframe('pato_bank.xlsx')
+diagnoses_excels = read_excel_data_into_dataframe('diagnose_list.xlsx', cohort)
 
-vitale_excels = read_excel_data_into_dataframe('vitale.xlsx')
+# Read vitale data
+vitale_excels = read_excel_data_into_dataframe('vitale.xlsx', cohort)
 
-blood_test_excels = read_blood_test_excel_data()
+blood_test_excels = read_blood_test_excel_data(cohort)
 
 # Transform Data
 vitale_excels = transform_vitale_data(vitale_excels)
 
 # Rename Column
-miba_excels = miba_excels.rename(
-    columns={'Prøvens art': 'miba_sample_type', 'Taget d.': 'miba_collection_date', 'Kvantitet': 'miba_quantity',
-             'Analyser': 'miba_analysis', 'Resistens': 'miba_resistance', 'Mikroskopi': 'miba_microscopy'})
-medicin_excels = medicin_excels.rename(
-    columns={'Medication': 'medicines_name', 'Start-Date': 'medicine_start_date', 'End-Date': 'medicine_end_date'})
-diagnoses_excels = diagnoses_excels.rename(columns={'note': 'diagnose_note', 'date': 'diagnose_date'})
-pato_bank_excels = pato_bank_excels.rename(
-    columns={'Modtaget': 'pato_received_date', 'Serviceyder': 'pato_service_provider',
-             'Rekv.nr.': 'pato_request_number', 'Kategori': 'pato_category', 'Diagnoser': 'pato_diagnoses',
-             'Mat.nr.	Beskrivelse af materiale/prøve': 'pato_material_description_of_smple',
-             'Konklusion': 'pato_conclusion', 'Mikroskopi': 'pato_microscopy',
-             'Andre undersøgelser': 'pato_other_investigations', 'Makroskopi': 'pato_macroscopy',
-             'Kliniske oplysninger': 'pato_clinical_information'})
+miba_excels = miba_excels.rename(columns=miba_columns)
+medicin_excels = medicin_excels.rename(columns=medicin_columns)
+diagnoses_excels = diagnoses_excels.rename(columns=diagnoses_columns)
+pato_bank_excels = pato_bank_excels.rename(columns=pato_bank_columns)
 blood_test_excels = blood_test_excels.rename(columns={'content': 'blood_content'})
 
 # Aggregate Data into List
@@ -228,106 +163,90 @@ vitale_egg = vitale_excels.groupby('cpr').agg(aggregations).reset_index()
 MAX_LEN = 32767
 MAX_LEN = 25000
 
-def custom_aggregate(series):
-    columns_data = []
-    current_str = ""
-    cumulative_length = 0  # This will keep a running count of the items' lengths in the series
-
-    for item in series:
-        item_str = str(item)
-        cumulative_length += len(item_str)
-
-        # If adding the cumulative length of items and the current_str exceeds MAX_LEN
-        if cumulative_length + 300 > MAX_LEN:  # Can use either cumulative_length or len(current_str)
-            columns_data.append(current_str)
-            current_str = ""
-            cumulative_length = 0  # Reset the cumulative length for the new chunk
-        else:
-            # Separate 'item' by @ because we already have data some '3,2' as decimal number
-            current_str += '\'' + item_str + '\'' + ', ' if current_str else  item_str + '\'' + ', '
-
-    # Add the last chunk if any data is left
-    if current_str:
-        columns_data.append(current_str)
-
-    return columns_data
-
+def chunk_list_columns(df, id_col='cpr', max_len=MAX_LEN):
+    """
+    Aggregate the items of every column per id into chunks of quoted strings that fit in a REDCap cell, and spread
+    the chunks over numbered columns ('<column>_1', '<column>_2', ...).
 
-aggregations = {col: custom_aggregate for col in blood_test_excels.columns if col != 'cpr'}
-blood_test_egg = blood_test_excels.groupby('cpr').agg(aggregations).reset_index()
+    A chunk is the items joined as "a', 'b', 'c', " and holds as many items as fit in max_len minus 300 characters
+    of item text; the chunk boundaries are found with a binary search on the cumulative item lengths per id. The item
+    at a boundary starts the next chunk, and an item that is longer than a chunk on its own gets a chunk of its own.
 
+    :param df: The records, e.g. one row per blood test.
+    :param id_col: The column to group by.
+    :param max_len: The maximum length of a cell.
+    :return: DataFrame with one row per id (sorted) and the chunk columns; ids with fewer chunks have NaN.
+    """
+    df = df[df[id_col].notna()].sort_values(id_col, kind='stable')
+    ids, starts = np.unique(df[id_col].to_numpy(), return_index=True)
+    ends = np.r_[starts[1:], len(df)]
+    budget = max_len - 300
 
-def explode_list_columns(df):
-    """Expand columns with list entries into separate columns."""
+    chunked_data = {id_col: ids}
     for col in df.columns:
-        # If any cell in the column is a list, we proceed
-        if any(isinstance(cell, list) for cell in df[col]):
-            # Create separate columns for each item in the list
-            exploded = df[col].apply(pd.Series)
-            exploded.columns = [f"{col}_{i}" for i in range(1, len(exploded.columns) + 1)]
-
-            # Drop original column and append exploded columns to dataframe
-            df = df.drop(col, axis=1).join(exploded)
-    return df
-
-
-# Process your dataframe
-blood_test_egg_exploded = explode_list_columns(blood_test_egg)
+        if col == id_col:
+            continue
+
+        items = df[col].map(str).to_numpy(dtype=object)
+        cumulative_lengths = np.cumsum(np.fromiter(map(len, items), dtype=np.int64, count=len(items)))
+
+        # Greedy chunks per id: extend a chunk while the item lengths since its start fit in the budget
+        chunks_per_id = []
+        for start, end in zip(starts, ends):
+            chunks = []
+            i = start
+            while i < end:
+                offset = cumulative_lengths[i - 1] if i > 0 else 0
+                j = i + np.searchsorted(cumulative_lengths[i:end], offset + budget, side='right')
+                j = max(j, i + 1)
+                chunks.append("', '".join(items[i:j]) + "', ")
+                i = j
+            chunks_per_id.append(chunks)
+
+        # One column per chunk number, filled from a 2-D array
+        width = max(map(len, chunks_per_id), default=0)
+        table = np.full((len(ids), width), np.nan, dtype=object)
+        for row, chunks in enumerate(chunks_per_id):
+            table[row, :len(chunks)] = chunks
+        for k in range(width):
+            chunked_data[f"{col}_{k + 1}"] = table[:, k]
+
+    return pd.DataFrame(chunked_data)
+
+
+# Chunk the blood tests into REDCap-sized cells
+blood_test_egg_exploded = chunk_list_columns(blood_test_excels)
 
 # Combine Data
-# Merge the two DataFrames based on the 'cpr' column
-miba_medicin_combined_data = pd.merge(miba_agg, medicin_agg, on='cpr', how='outer')
-
-miba_medicin_diagnoses_combined_data = pd.merge(miba_medicin_combined_data, diagnoses_egg, on='cpr', how='outer')
-
-miba_medicin_diagnoses_pato_combined_data = pd.merge(miba_medicin_diagnoses_combined_data, pato_bank_egg, on='cpr',
-                                                     how='outer')
-
-miba_medicin_diagnoses_pato_vitale_combined_data = pd.merge(miba_medicin_diagnoses_pato_combined_data, vitale_egg,
-                                                            on='cpr', how='outer')
+# Align the aggregates of all sources on the union of the cprs in one step
+combined_data = combine_sources([miba_agg, medicin_agg, diagnoses_egg, pato_bank_egg, vitale_egg,
+                                 blood_test_egg_exploded])
+combined_data.insert(0, 'record_id', range(1, 1 + len(combined_data)))
 
-miba_medicin_diagnoses_pato_vitale_blood_combined_data = pd.merge(miba_medicin_diagnoses_pato_vitale_combined_data,
-                                                                  blood_test_egg_exploded, on='cpr', how='outer')
+# Typed export: native list columns with datetime types, read by the analysis scripts without any string parsing.
+# The lists are not split into chunks, so the blood tests are one 'blood_date' and one 'blood_content' list.
+typed_combined_data = combine_sources([aggregate_to_lists(excels) for excels in [
+    miba_excels, medicin_excels, diagnoses_excels, pato_bank_excels, vitale_excels, blood_test_excels]])
+typed_combined_data.insert(0, 'record_id', range(1, 1 + len(typed_combined_data)))
+write_combined_data(typed_combined_data, COMBINED_DATA_PARQUET)
 
-miba_medicin_diagnoses_pato_vitale_blood_combined_data.insert(0, 'record_id', [i for i in range(1, 1 + len(
-    miba_medicin_diagnoses_pato_vitale_blood_combined_data))])
 
+def write_redcap_export(combined_data, csv_path='combine_all_data.csv', xlsx_path='combine_all_data.xlsx'):
+    """
+    Write the combined data in the REDCap import format: every cell as a quoted string representation of a list.
 
-def process_cell(cell_value):
-    # If cell_value is empty, return an empty string ""
-    if str(cell_value) == 'nan':
-        return "nan"
-
-    # Check if cell_value is already a list
-    if isinstance(cell_value, list):
-        # Convert list items to string, replace 'nan' with empty string
-        values = [str(item) if str(item) != 'nan' else '' for item in cell_value]
-        return '\"' + str(values) + '\"'
-
-    # If cell_value is a string and starts with "[" and ends with "]"
-    if isinstance(cell_value, str) and cell_value.startswith("[") and cell_value.endswith("]"):
-        # Strip off the brackets and split the string into a list based on comma separation
-        values = cell_value[1:-1].split(", ")
-
-        # Replace 'nan' with empty string
-        values = ['' if val.strip() == 'nan' else val for val in values]
-
-        # Convert list back to string representation
-        return values
-
-    # If cell_value is a string and NOT starts with "[" and ends with "]"
-    if isinstance(cell_value, str):
-        return '\"[\'' + str(cell_value) + '\']\"'
-
-    # If it's neither a string in list format nor a list, return the cell_value as is
-    return cell_value
+    :param combined_data: The combined data, with list cells.
+    :param csv_path: The CSV file to write.
+    :param xlsx_path: The Excel file to write.
+    """
+    # Serialise the cells column by column (see redcap_export.process_cell)
+    redcap_data = serialise_redcap_frame(combined_data)
 
+    # Save with headers
+    redcap_data.to_csv(csv_path, index=False, header=False)
+    redcap_data.to_excel(xlsx_path, index=False, header=False)
+    # redcap_data.to_excel(xlsx_path, index=False, header=True)
 
-# Apply the function to each cell in the dataframe
-miba_medicin_diagnoses_pato_vitale_blood_combined_data = miba_medicin_diagnoses_pato_vitale_blood_combined_data.applymap(
-    process_cell)
 
-# Save with headers
-miba_medicin_diagnoses_pato_vitale_blood_combined_data.to_csv('combine_all_data.csv', index=False, header=False)
-miba_medicin_diagnoses_pato_vitale_blood_combined_data.to_excel('combine_all_data.xlsx', index=False, header=False)
-# miba_medicin_diagnoses_pato_vitale_blood_combined_data.to_excel('combine_all_data.xlsx', index=False, header=True)
\ No newline at end of file
+# REDCap export
+write_redcap_export(combined_data)
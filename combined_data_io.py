@@ -0,0 +1,89 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Typed export of combine_data.py, read by the bladder analysis scripts instead of combine_all_data.xlsx
+COMBINED_DATA_PARQUET = 'combine_all_data.parquet'
+
+
+def _typed_values(column):
+    """
+    Give every value of a column one element type for the list columns: datetimes stay Timestamps, numbers and
+    booleans stay numbers, everything else becomes a string. Missing values become None.
+
+    Parameters:
+    column (pd.Series): The column.
+
+    Returns:
+    pd.Series: The column as objects.
+    """
+    missing = column.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(column) or pd.api.types.is_numeric_dtype(column) \
+            or pd.api.types.is_bool_dtype(column):
+        values = column.astype(object)
+    else:
+        values = column.map(str, na_action='ignore').astype(object)
+    return values.where(~missing, None)
+
+
+def aggregate_to_lists(df, id_col='cpr'):
+    """
+    Group a DataFrame by id and aggregate every other column into a native list per id.
+
+    Parameters:
+    df (pd.DataFrame): The records, e.g. all rows of miba.xlsx of all patients.
+    id_col (str): The column to group by.
+
+    Returns:
+    pd.DataFrame: One row per id, with one list column per other column (in the order of the records).
+    """
+    typed = pd.DataFrame({col: df[col] if col == id_col else _typed_values(df[col]) for col in df.columns})
+    aggregations = {col: list for col in typed.columns if col != id_col}
+    return typed.groupby(id_col).agg(aggregations).reset_index()
+
+
+def write_combined_data(df, path=COMBINED_DATA_PARQUET):
+    """
+    Write the combined data with native list columns and datetime types to a Parquet file.
+
+    Parameters:
+    df (pd.DataFrame): The combined data; cells of the list columns are lists (or missing for ids without records).
+    path (str): The Parquet file to write.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if values.map(lambda cell: isinstance(cell, list)).any():
+            # Ids without records of a source have no list
+            values = values.map(lambda cell: cell if isinstance(cell, list) else None)
+            columns[col] = pa.array(values.tolist(), from_pandas=True)
+        else:
+            columns[col] = pa.Array.from_pandas(values)
+    pq.write_table(pa.table(columns), path)
+
+
+def read_combined_data(path=COMBINED_DATA_PARQUET):
+    """
+    Read the combined data written by write_combined_data.
+
+    The list columns come back as Python lists (datetimes as Timestamps), the same as parsing the string
+    cells of combine_all_data.xlsx, but without any string parsing.
+
+    Parameters:
+    path (str): The Parquet file to read.
+
+    Returns:
+    pd.DataFrame: The combined data.
+    """
+    table = pq.read_table(path)
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+            cells = column.to_pylist()
+            if pa.types.is_timestamp(column.type.value_type) or pa.types.is_date(column.type.value_type):
+                cells = [None if cell is None else [None if value is None else pd.Timestamp(value) for value in cell]
+                         for cell in cells]
+            columns[name] = pd.Series(cells, dtype=object)
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns)
@@ -123,60 +123,15 @@ df.drop(columns=blood_columns, inplace=True)
 # Now, df is the original DataFrame without the 'blood' columns, and df_blood is a new DataFrame containing only the 'blood' columns.
 
 
-import ast
 import pandas as pd
 
-def validate_and_clean_item(item):
-    """
-    Validates and cleans individual list items.
-    """
-    cleaned_item = item.strip().strip("'\"")
-    try:
-        ast.literal_eval(f"'{cleaned_item}'")
-    except SyntaxError:
-        print(f"Error on: {cleaned_item}.")
-        cleaned_item = cleaned_item.replace("'", r"\'")
-    return cleaned_item
-
-def check_individual_items(string_list_repr):
-    """
-    Processes a string representing a list, attempting to validate and clean each item.
-    """
-    items = string_list_repr.strip('[]').split(',')
-    return [validate_and_clean_item(item) for item in items]
-
-def handle_malformed_string(s):
-    """
-    Fixes common malformed patterns in the string.
-    """
-    # Remove trailing , ']'
-    if s.endswith(', \']'):
-        s = s[:-3] + ']'
-    # Remove trailing comma before ']'
-    if s.endswith(',]'):
-        s = s[:-2] + ']'
-    return s
-
-def safe_literal_eval(s):
-    """
-    Attempts to convert a string representation of lists to an actual list.
-    """
-    if pd.isna(s):
-        return []
-
-    s = str(s).strip("'\"")  # Remove surrounding single or double quotes
-
-    s = handle_malformed_string(s)
-
-    try:
-        return ast.literal_eval(s)
-    except SyntaxError:
-        return check_individual_items(s)
+from date_parsing import date_parsing_report, parse_dates
+from list_cell_parser import parse_list_cell
 
 
 # Convert the string representation of lists to actual lists using the safe function
 for col in df.columns:
-    df[col] = df[col].apply(safe_literal_eval)
+    df[col] = df[col].apply(parse_list_cell)
 
 # Initialize an empty dataframe to store the unstacked data
 unstacked_data = []
@@ -237,12 +192,11 @@ str_columns = str_columns.difference(['original_id'])
 unstacked_df[str_columns] = unstacked_df[str_columns].applymap(lambda x: x.lower().strip() if isinstance(x, str) else x)
 
 # Ensure that the date columns are in a datetime format.
-unstacked_df['miba_collection_date'] = pd.to_datetime(unstacked_df['miba_collection_date'], dayfirst=True, errors='coerce')
-unstacked_df['medicine_start_date'] = pd.to_datetime(unstacked_df['medicine_start_date'], dayfirst=True, errors='coerce')
-unstacked_df['medicine_end_date'] = pd.to_datetime(unstacked_df['medicine_end_date'], dayfirst=True, errors='coerce')
-unstacked_df['diagnose_date'] = pd.to_datetime(unstacked_df['diagnose_date'], dayfirst=True, errors='coerce')
-unstacked_df['pato_received_date'] = pd.to_datetime(unstacked_df['pato_received_date'], dayfirst=True, errors='coerce')
-unstacked_df['vitale_measurement_date'] = pd.to_datetime(unstacked_df['vitale_measurement_date'], dayfirst=True, errors='coerce')
+# The distinct strings are parsed once with the fixed formats of the exports; the rest falls back to inference
+for date_column in ['miba_collection_date', 'medicine_start_date', 'medicine_end_date', 'diagnose_date',
+                    'pato_received_date', 'vitale_measurement_date']:
+    unstacked_df[date_column] = parse_dates(unstacked_df[date_column], dayfirst=True)
+print(f"Date parsing: {date_parsing_report()}")
 
 
 # Replace any digit followed by a dot either at the beginning of the string or after a newline character with an empty string
@@ -0,0 +1,137 @@
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# The date formats of the hospital exports, tried in order: pato 'Modtaget' and miba 'Taget d.', blood test headers,
+# vitale dates, and dates written by str(Timestamp) in combine_all_data
+DATE_FORMATS = ('%d.%m.%Y', '%d-%m-%y %H:%M', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+# Memoised dates of the strings parsed with a fixed format, and of the leftover strings (per dayfirst), shared by
+# all calls
+_parsed_dates = {}
+_fallback_dates = {False: {}, True: {}}
+_date_parsing_counts = {'fixed_format': 0, 'fallback': 0, 'fallback_failed': 0}
+_fallback_samples = []
+
+
+def _parse_new_texts(texts, dayfirst):
+    """
+    Parse date strings that are not memoised yet: every fixed format once over all strings, then the leftovers
+    one by one with format inference.
+    """
+    remaining = pd.Series(texts, dtype=object)
+    for date_format in DATE_FORMATS:
+        if remaining.empty:
+            break
+        parsed = pd.to_datetime(remaining, format=date_format, errors='coerce')
+        matched = parsed.notna().to_numpy()
+        _parsed_dates.update(zip(remaining[matched], parsed[matched]))
+        _date_parsing_counts['fixed_format'] += int(matched.sum())
+        remaining = remaining[~matched]
+
+    fallback_dates = _fallback_dates[bool(dayfirst)]
+    for text in remaining:
+        with warnings.catch_warnings():
+            # Inference warns when it can not infer a format, which is expected for these leftovers
+            warnings.simplefilter('ignore', UserWarning)
+            fallback_dates[text] = pd.to_datetime(text, dayfirst=dayfirst, errors='coerce')
+        _date_parsing_counts['fallback'] += 1
+        _date_parsing_counts['fallback_failed'] += int(pd.isna(fallback_dates[text]))
+        if len(_fallback_samples) < 10:
+            _fallback_samples.append(text)
+
+
+def parse_dates(values, dayfirst=False):
+    """
+    Parse date values with the fixed formats of DATE_FORMATS.
+
+    Every distinct string is parsed once (memoised across calls) with one vectorised pd.to_datetime per format;
+    only strings that match none of the formats are parsed one by one with format inference (see
+    date_parsing_report for how many). Datetimes are kept, and missing or unparseable values become NaT.
+
+    Parameters:
+    values (list-like): The values, e.g. a column or the flattened items of list cells.
+    dayfirst (bool): Passed to the format inference of the leftover strings.
+
+    Returns:
+    pd.Series: The dates (datetime64), indexed like 'values' if it is a Series.
+    """
+    values = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values.astype(object)
+    is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+
+    codes, unique_texts = pd.factorize(values[is_text].to_numpy(dtype=object))
+    fallback_dates = _fallback_dates[bool(dayfirst)]
+    new_texts = [text for text in unique_texts if text not in _parsed_dates and text not in fallback_dates]
+    if new_texts:
+        _parse_new_texts(new_texts, dayfirst)
+
+    # Look up every distinct string once and spread the dates over the values
+    unique_dates = pd.DatetimeIndex([_parsed_dates[text] if text in _parsed_dates else fallback_dates[text]
+                                     for text in unique_texts]).astype('datetime64[ns]')
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    dates[is_text] = unique_dates.take(codes)
+    if not is_text.all():
+        dates[~is_text] = pd.to_datetime(values[~is_text], errors='coerce').astype('datetime64[ns]')
+    return dates
+
+
+def date_parsing_report():
+    """
+    Count the distinct date strings parsed so far: with a fixed format, with the slow format inference
+    ('fallback'), and the fallback strings that were no date at all ('fallback_failed').
+
+    Returns:
+    dict: The counts, and up to 10 sample fallback strings ('fallback_samples').
+    """
+    return {**_date_parsing_counts, 'fallback_samples': list(_fallback_samples)}
+
+
+def clear_date_cache():
+    """
+    Clear the memoised dates and the counts of date_parsing_report.
+    """
+    _parsed_dates.clear()
+    for fallback_dates in _fallback_dates.values():
+        fallback_dates.clear()
+    for key in _date_parsing_counts:
+        _date_parsing_counts[key] = 0
+    _fallback_samples.clear()
+
+
+if __name__ == '__main__':
+    # Benchmark against parsing every element on its own on dates shaped like the exports
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2015-01-01', '2023-12-31').to_numpy()
+    samples = pd.to_datetime(rng.choice(days, size=200000))
+    formats = ['%d.%m.%Y'] * 80000 + ['%d-%m-%y %H:%M'] * 60000 + ['%d-%m-%Y'] * 40000 + ['%Y-%m-%d'] * 20000
+    values = [sample.strftime(date_format) for sample, date_format in zip(samples, formats)]
+    expected = list(samples)
+    values += ['none', 'nan', 'March 4 2019'] * 100
+    expected += [pd.NaT, pd.NaT, pd.Timestamp('2019-03-04')] * 100
+    order = rng.permutation(len(values))
+    values = [values[i] for i in order]
+    expected = [expected[i] for i in order]
+
+    start_time = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for value in values[:20000]:
+            pd.to_datetime(value, dayfirst=True, errors='coerce')
+    element_seconds = (time.perf_counter() - start_time) * len(values) / 20000
+
+    start_time = time.perf_counter()
+    dates = parse_dates(values, dayfirst=True)
+    parser_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    parse_dates(values, dayfirst=True)
+    cached_seconds = time.perf_counter() - start_time
+
+    assert dates.equals(pd.Series(expected, dtype='datetime64[ns]'))
+    print(f"{len(values)} values")
+    print(f"per element (extrapolated): {element_seconds:.2f} s")
+    print(f"parse_dates:                {parser_seconds:.2f} s ({element_seconds / parser_seconds:.0f}x)")
+    print(f"repeated (memoised):        {cached_seconds:.2f} s ({element_seconds / cached_seconds:.0f}x)")
+    print(date_parsing_report())
@@ -0,0 +1,136 @@
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+
+def list_rows(frame, cols):
+    """
+    Find the rows in which every one of the columns holds a list.
+
+    Parameters:
+    frame (pd.DataFrame): A frame with list cells (one row per cpr).
+    cols (list): The parallel list columns.
+
+    Returns:
+    np.ndarray: A boolean mask over the rows.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for col in cols:
+        mask &= np.fromiter((isinstance(cell, list) for cell in frame[col]), dtype=bool, count=len(frame))
+    return mask
+
+
+def _event_rows(frame, cols, id_col, key_col):
+    """
+    Find the rows that have events and their number of events (the length of their shortest list).
+
+    Raises a ValueError for a row whose key_col cell is a list while another of the columns is not.
+    """
+    if key_col is None:
+        rows = np.flatnonzero(list_rows(frame, cols))
+    else:
+        rows = np.flatnonzero(list_rows(frame, [key_col]))
+        missing = ~list_rows(frame.iloc[rows], cols)
+        if missing.any():
+            row = rows[np.argmax(missing)]
+            not_lists = [col for col in cols if not isinstance(frame[col].iat[row], list)]
+            raise ValueError(f"{id_col} {frame[id_col].iat[row]} has a list in '{key_col}' but none in {not_lists}")
+
+    cells = {col: frame[col].to_numpy(dtype=object)[rows] for col in cols}
+    lengths = np.zeros(len(rows), dtype=np.intp)
+    if cols:
+        lengths = np.min([np.fromiter(map(len, cells[col]), dtype=np.intp, count=len(rows)) for col in cols], axis=0)
+    return rows, cells, lengths
+
+
+def explode_events(frame, cols, id_col='cpr', key_col=None):
+    """
+    Turn the parallel list columns of a frame into a long-format event table: one row per list position.
+
+    The filters of the analysis scripts are masks (or groupby reductions) over this table, and implode_events turns
+    the kept events back into list cells.
+
+    Which rows have events:
+    - key_col None: the rows in which every column holds a list. A row with a non-list cell (e.g. a cell that
+      failed to parse) has no events and is left as it is by implode_events.
+    - key_col given: the rows in which key_col holds a list, like the filters that only test that column. Every
+      other column of these rows must hold a list too; a ValueError is raised otherwise.
+    A row has as many events as its shortest list. The items of longer lists past that position (ragged rows) are
+    not events: implode_events puts them back untouched after the kept items.
+
+    Parameters:
+    frame (pd.DataFrame): A frame with list cells (one row per cpr), e.g. the pato columns of combine_all_data.
+    cols (list): The parallel list columns.
+    id_col (str): The id column, copied to every event.
+    key_col (str): The column whose list cells decide which rows have events, or None.
+
+    Returns:
+    pd.DataFrame: The events, ordered by row and position, with the columns 'row' (the position of the row in
+                  'frame'), id_col, 'position' (the position in the lists) and the list columns (objects).
+    """
+    rows, cells, lengths = _event_rows(frame, cols, id_col, key_col)
+
+    starts = np.cumsum(lengths) - lengths
+    events = {
+        'row': np.repeat(rows, lengths),
+        id_col: np.repeat(frame[id_col].to_numpy(dtype=object)[rows], lengths),
+        'position': np.arange(lengths.sum()) - np.repeat(starts, lengths)
+    }
+    for col in cols:
+        items = chain.from_iterable(cell if len(cell) == length else cell[:length]
+                                    for cell, length in zip(cells[col], lengths))
+        events[col] = pd.Series(list(items), dtype=object)
+    return pd.DataFrame(events)
+
+
+def implode_events(events, frame, cols, id_col='cpr', key_col=None):
+    """
+    Turn the kept events of explode_events back into the list cells of the frame.
+
+    The rows that had events get the lists of their kept events (an empty list if none are kept), followed by the
+    untouched items of their lists past the shortest one; the other rows are left as they are. The frame itself is
+    not modified.
+
+    Parameters:
+    events (pd.DataFrame): The events of explode_events(frame, cols, id_col, key_col), e.g. after filtering, in
+                           the same order.
+    frame (pd.DataFrame): The frame the events were exploded from.
+    cols (list): The list columns to rebuild.
+    id_col (str): The id column, as for explode_events.
+    key_col (str): The key column, as for explode_events.
+
+    Returns:
+    pd.DataFrame: A copy of the frame with the rebuilt list columns.
+    """
+    rows, cells, lengths = _event_rows(frame, cols, id_col, key_col)
+    counts = np.bincount(events['row'].to_numpy(dtype=np.intp), minlength=len(frame))[rows]
+    ends = np.cumsum(counts)
+    starts = ends - counts
+
+    result = frame.copy()
+    for col in cols:
+        values = events[col].tolist()
+        column = frame[col].tolist()
+        for row, start, end, cell, length in zip(rows, starts, ends, cells[col], lengths):
+            column[row] = values[start:end] + cell[length:]
+        result[col] = pd.Series(column, index=frame.index, dtype=object)
+    return result
+
+
+def concat_list_columns(frame, cols):
+    """
+    Concatenate the lists of several columns per row (in the order of the columns), e.g. the blood test chunk
+    columns 'blood_date_1', 'blood_date_2', ... into one list. Cells that are not lists are skipped.
+
+    Parameters:
+    frame (pd.DataFrame): A frame with list cells.
+    cols (list): The columns to concatenate.
+
+    Returns:
+    pd.Series: One list per row, indexed like 'frame'.
+    """
+    columns = [frame[col].tolist() for col in cols]
+    merged = [list(chain.from_iterable(cell for cell in cells if isinstance(cell, list)))
+              for cells in zip(*columns)] if columns else [[] for _ in range(len(frame))]
+    return pd.Series(merged, index=frame.index, dtype=object)
@@ -0,0 +1,202 @@
+import re
+import weakref
+from bisect import bisect_right
+import pandas as pd
+
+# Stringified (and case-folded) columns per DataFrame: id(df) -> (weak reference, shape, columns, {case: columns})
+_column_cache = {}
+
+# Danish letters folded to their two-letter spelling, so e.g. 'Aarhus' matches 'århus'
+_danish_fold = str.maketrans({'å': 'aa', 'æ': 'ae', 'ø': 'oe'})
+
+CASE_OPTIONS = ('sensitive', 'insensitive', 'danish')
+
+# Written after every rendered row
+_ROW_SEPARATOR = "\n----------------------\n"
+
+
+def _fold_text(text, case):
+    """
+    Fold a text (keyword) the same way the columns are folded for the given case option.
+    """
+    if case == 'insensitive':
+        return text.lower()
+    if case == 'danish':
+        return text.casefold().translate(_danish_fold)
+    return text
+
+
+def _string_columns(df):
+    """
+    Stringify every column of a DataFrame once.
+
+    The strings are the same as row.astype(str) gives when the frame is searched row by row: rows of an
+    all-numeric frame are upcast to a common type (e.g. ints become floats), other frames keep the value of
+    each cell. Empty cells stay missing, so they never match. Frames whose columns are all datetimes are
+    matched on the full timestamp of each cell.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame.
+
+    Returns:
+    list: One Series of strings per column, in column order.
+    """
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        values = df.to_numpy()
+        columns = [pd.Series(values[:, i], index=df.index) for i in range(df.shape[1])]
+    else:
+        columns = [df.iloc[:, i].astype(object) for i in range(df.shape[1])]
+    return [column.astype(str).where(column.notna()) for column in columns]
+
+
+def _cached_columns(df, case):
+    """
+    Return the stringified columns of a DataFrame for a case option, computing them only on first use.
+
+    The cache entry is dropped when the DataFrame is garbage collected, and rebuilt when its shape or
+    columns change.
+    """
+    key = id(df)
+    entry = _column_cache.get(key)
+    if entry is None or entry[0]() is not df or entry[1] != df.shape or entry[2] != list(df.columns):
+        entry = (weakref.ref(df, lambda _, key=key: _column_cache.pop(key, None)), df.shape, list(df.columns), {})
+        _column_cache[key] = entry
+
+    by_case = entry[3]
+    if case not in by_case:
+        if case == 'sensitive':
+            by_case[case] = _string_columns(df)
+        elif case == 'insensitive':
+            by_case[case] = [column.str.lower() for column in _cached_columns(df, 'sensitive')]
+        else:
+            by_case[case] = [column.str.casefold().str.translate(_danish_fold)
+                             for column in _cached_columns(df, 'sensitive')]
+    return by_case[case]
+
+
+def clear_keyword_cache():
+    """
+    Forget all stringified columns, e.g. after DataFrames were changed in place.
+    """
+    _column_cache.clear()
+
+
+def match_rows(df, keyword, case='sensitive'):
+    """
+    Find the rows of a DataFrame that contain a keyword in any cell (substring match, no regex).
+
+    Each column is stringified once per DataFrame and searched with one vectorised str.contains; the
+    column masks are OR-ed together. Replaces df.apply(lambda row: row.astype(str).str.contains(...), axis=1).
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to search.
+    keyword (str): The keyword to search for.
+    case (str): 'sensitive' (default), 'insensitive' (lower-cased), or 'danish' (case-folded, with å/æ/ø
+                matching aa/ae/oe).
+
+    Returns:
+    tuple: A boolean Series marking the matching rows, and a Series with the first matching column of
+           each row (missing for rows without a match). Both are indexed like df.
+    """
+    if case not in CASE_OPTIONS:
+        raise ValueError(f"Unknown case option: {case}")
+
+    mask = pd.Series(False, index=df.index)
+    first_column = pd.Series(None, index=df.index, dtype=object)
+    if df.empty:
+        return mask, first_column
+
+    folded_keyword = _fold_text(keyword, case)
+    for label, column in zip(df.columns, _cached_columns(df, case)):
+        column_mask = column.str.contains(folded_keyword, regex=False).fillna(False).astype(bool)
+        first_column[column_mask & ~mask] = label
+        mask |= column_mask
+
+    return mask, first_column
+
+
+def filter_rows(df, keyword, case='sensitive'):
+    """
+    Return the rows of a DataFrame that contain a keyword in any cell.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to search.
+    keyword (str): The keyword to search for.
+    case (str): See match_rows.
+
+    Returns:
+    pd.DataFrame: The matching rows.
+    """
+    mask, _ = match_rows(df, keyword, case)
+    return df[mask]
+
+
+def render_matches(dataframe, keyword):
+    """
+    Render the rows of a DataFrame as display text and find the keyword in it (case-insensitive).
+
+    Each row is written as 'column: value<TAB>' for every column, followed by a separator line. The text is
+    built in one pass and every occurrence of the keyword in a cell value is returned as a span, so the
+    caller can insert the text once and highlight the spans.
+
+    Parameters:
+    dataframe (pd.DataFrame): The rows to render.
+    keyword (str): The keyword to highlight.
+
+    Returns:
+    tuple: The text, and a list of (start, end) character offsets of the matches in the text.
+    """
+    pattern = re.compile(re.escape(keyword), re.IGNORECASE) if keyword else None
+    columns = [f"{column}: " for column in dataframe.columns]
+
+    parts = []
+    spans = []
+    offset = 0
+    for row in dataframe.itertuples(index=False, name=None):
+        for column, value in zip(columns, row):
+            cell_value = str(value)
+            offset += len(column)
+            if pattern is not None:
+                spans.extend((offset + match.start(), offset + match.end()) for match in pattern.finditer(cell_value))
+            parts.extend((column, cell_value, "\t"))
+            offset += len(cell_value) + 1
+        parts.append(_ROW_SEPARATOR)  # Add a separator between rows
+        offset += len(_ROW_SEPARATOR)
+
+    return ''.join(parts), spans
+
+
+def insert_highlighted(text_widget, text, spans, tag='highlight', batch_size=1000):
+    """
+    Insert rendered text at the end of a Tk Text widget and apply a tag to the given spans.
+
+    The spans are converted to 'line.column' indexes directly (instead of '+N chars' arithmetic) and
+    tagged in batches, so tens of thousands of matches take one insert and a few tag_add calls.
+
+    Parameters:
+    text_widget (tk.Text): The widget to insert into.
+    text (str): The text to insert.
+    spans (list): (start, end) character offsets into text, as returned by render_matches.
+    tag (str): The tag to apply to the spans.
+    batch_size (int): Number of spans tagged per tag_add call.
+    """
+    # Position of the first inserted character
+    base_line, base_column = map(int, text_widget.index('end-1c').split('.'))
+    text_widget.insert('end', text)
+    if not spans:
+        return
+
+    # Offsets at which each line of the inserted text starts
+    line_starts = [0]
+    line_starts.extend(match.end() for match in re.finditer('\n', text))
+
+    def to_index(offset):
+        line = bisect_right(line_starts, offset) - 1
+        column = offset - line_starts[line] + (base_column if line == 0 else 0)
+        return f"{base_line + line}.{column}"
+
+    for batch_start in range(0, len(spans), batch_size):
+        indexes = []
+        for start, end in spans[batch_start:batch_start + batch_size]:
+            indexes.extend((to_index(start), to_index(end)))
+        text_widget.tag_add(tag, *indexes)
@@ -0,0 +1,210 @@
+import ast
+import re
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+# One item of the list literals written by redcap_export.process_cell: a quoted string (without line breaks or
+# null bytes, which ast.literal_eval rejects) or one of the constants None/True/False
+_ITEM = r"""'[^'\\\n\r\x00]*(?:\\.[^'\\\n\r\x00]*)*'|"[^"\\\n\r\x00]*(?:\\.[^"\\\n\r\x00]*)*"|None|True|False"""
+_ITEM_PATTERN = re.compile('(' + _ITEM + ')')
+_OPENING_PATTERN = re.compile(r'[ \t]*\[[ \t]*')
+_SEPARATOR_PATTERN = re.compile(r'[ \t]*,[ \t]*')
+_CLOSING_PATTERN = re.compile(r'[ \t]*(?:,[ \t]*)?\][ \t]*')
+_EMPTY_PATTERN = re.compile(r'[ \t]*\[[ \t]*\][ \t]*')
+_CONSTANTS = {'None': None, 'True': True, 'False': False}
+# Characters that rule out the plain split. None/True/False need no check of their own: between or around quoted
+# items they leave quotes inside the split items, which the quote count rejects.
+_FAST_PATH_EXCLUDED = ('\\', '\n', '\r', '\x00')
+# A quoted string without escape sequences, e.g. 'Blod' or "Patient's" (str() writes items with a ' in double quotes)
+_QUOTED_PATTERN = re.compile('\'[^\']*\'|"[^"]*"')
+
+
+def parse_list_literal(text):
+    """
+    Parse a list literal of strings and None/True/False values (the format written by redcap_export.process_cell)
+    with plain string splitting, a simple regex if some strings are in double quotes, or a single regex split if
+    the strings contain escape sequences. Gives the same list as ast.literal_eval(text).
+
+    Parameters:
+    text (str): The list literal, e.g. "['Blod', 'Urin', None]".
+
+    Returns:
+    list: The parsed items.
+
+    Raises:
+    ValueError: If the text is not a list literal of this format (parse it with ast.literal_eval instead).
+    """
+    # Common case, str() of a list of strings without backslashes or line breaks in them: split in C
+    stripped = text.strip(' \t')
+    if (stripped[:1] == '[' and stripped[-1:] == ']'
+            and not any(character in stripped for character in _FAST_PATH_EXCLUDED)):
+        body = stripped[1:-1].strip(' \t')
+        if not body:
+            return []
+        if body[-1] == ',':
+            body = body[:-1].rstrip(' \t')
+        if '"' not in body:
+            if len(body) >= 2 and body[0] == "'" and body[-1] == "'":
+                items = body[1:-1].split("', '")
+                if body.count("'") == 2 * len(items):
+                    return items
+        else:
+            # Some items are in double quotes: find the quoted items and check that they make up the whole list
+            tokens = _QUOTED_PATTERN.findall(body)
+            if ', '.join(tokens) == body:
+                return [token[1:-1] for token in tokens]
+
+    # Split into [opening, item, separator, item, ..., closing] in one pass and check the structure
+    parts = _ITEM_PATTERN.split(text)
+    if len(parts) == 1:
+        if _EMPTY_PATTERN.fullmatch(text) is None:
+            raise ValueError(f"Not a list literal of strings: {text[:50]}")
+        return []
+
+    tokens = parts[1::2]
+    separators = set(parts[2:-1:2])
+    if (_OPENING_PATTERN.fullmatch(parts[0]) is None
+            or _CLOSING_PATTERN.fullmatch(parts[-1]) is None
+            or not all(separator == ', ' or _SEPARATOR_PATTERN.fullmatch(separator) for separator in separators)):
+        raise ValueError(f"Not a list literal of strings: {text[:50]}")
+
+    # Common case: only quoted strings without escape sequences
+    if '\\' not in text and not any(constant in tokens for constant in _CONSTANTS):
+        return [token[1:-1] for token in tokens]
+
+    items = []
+    for token in tokens:
+        if token in _CONSTANTS:
+            items.append(_CONSTANTS[token])
+        elif '\\' in token:
+            # Escape sequences, e.g. \' or \xa0; invalid ones are left to ast.literal_eval on the whole text
+            try:
+                items.append(ast.literal_eval(token))
+            except (SyntaxError, ValueError):
+                raise ValueError(f"Invalid escape sequence in: {token[:50]}")
+        else:
+            items.append(token[1:-1])
+    return items
+
+
+@lru_cache(maxsize=4096)
+def _parse_list_literal_cached(text):
+    """
+    Memoised parse_list_literal; the items are stored as a tuple, so the cached result can not be modified.
+    """
+    return tuple(parse_list_literal(text))
+
+
+def clear_list_cell_cache():
+    """
+    Clear the memoised list literals.
+    """
+    _parse_list_literal_cached.cache_clear()
+
+
+def validate_and_clean_item(item):
+    """
+    Validates and cleans individual list items.
+    """
+    cleaned_item = item.strip().strip("'\"")
+    try:
+        ast.literal_eval(f"'{cleaned_item}'")
+    except SyntaxError:
+        print(f"validate_and_clean_item(): Error on: {cleaned_item}.")
+        cleaned_item = cleaned_item.replace("'", r"\'")
+    return cleaned_item
+
+
+def check_individual_items(string_list_repr):
+    """
+    Processes a string representing a list, attempting to validate and clean each item.
+    """
+    items = string_list_repr.strip('[]').split(',')
+    return [validate_and_clean_item(item) for item in items]
+
+
+def handle_malformed_string(s):
+    """
+    Fixes common malformed patterns in the string.
+    """
+    # Remove trailing , ']'
+    if s.endswith(', \']'):
+        s = s[:-3] + ']'
+    # Remove trailing comma before ']'
+    if s.endswith(',]'):
+        s = s[:-2] + ']'
+    return s
+
+
+def parse_list_cell(s):
+    """
+    Converts a string representation of a list (a cell of combine_all_data.xlsx) to an actual list.
+
+    The usual list literals are parsed by parse_list_literal, and repeated cells are parsed once; anything else
+    goes through ast.literal_eval, and a list that can not be evaluated is split on commas item by item.
+
+    Parameters:
+    s: The cell value. Missing values give an empty list.
+
+    Returns:
+    The parsed value (a new list for list literals).
+
+    Raises:
+    ValueError: If ast.literal_eval rejects the cell for another reason than its syntax (e.g. a name in the list).
+    """
+    if pd.isna(s):
+        return []
+
+    s = str(s).strip("'\"")  # Remove surrounding single or double quotes
+
+    s = handle_malformed_string(s)
+
+    try:
+        return list(_parse_list_literal_cached(s))
+    except ValueError:
+        pass
+
+    try:
+        return ast.literal_eval(s)
+    except SyntaxError:
+        return check_individual_items(s)
+
+
+if __name__ == '__main__':
+    # Benchmark on cells shaped like the combine_all_data.xlsx cells (up to ~25k characters)
+    import random
+
+    random.seed(0)
+    words = ['Blod', 'Urin', 'Negativ', 'Hæmoglobin;B', 'P-Kreatinin', 'E. coli', '', '2019-03-04 10:12:00']
+    cells = []
+    for i in range(300):
+        values = [' '.join(random.choices(words, k=random.randint(1, 4))) for _ in range(random.randint(1, 1200))]
+        if i % 10 == 0:
+            values[0] = "Patient's"  # Written with double quotes by str()
+        cells.append('"' + str(values) + '"')
+    cells.append('"' + str(['a', 'b']).replace("]", ", ']") + '"')  # Malformed ending written by process_cell
+    total_characters = sum(len(cell) for cell in cells)
+
+    start_time = time.perf_counter()
+    expected = []
+    for cell in cells:
+        cell = handle_malformed_string(cell.strip("'\""))
+        expected.append(ast.literal_eval(cell))
+    literal_eval_seconds = time.perf_counter() - start_time
+
+    clear_list_cell_cache()
+    start_time = time.perf_counter()
+    parsed = [parse_list_cell(cell) for cell in cells]
+    parser_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    parsed_again = [parse_list_cell(cell) for cell in cells]
+    cached_seconds = time.perf_counter() - start_time
+
+    assert parsed == expected == parsed_again
+    print(f"{len(cells)} cells, {total_characters / 1e6:.1f}M characters")
+    print(f"ast.literal_eval:  {literal_eval_seconds:.3f} s")
+    print(f"parse_list_cell:   {parser_seconds:.3f} s ({literal_eval_seconds / parser_seconds:.1f}x)")
+    print(f"repeated cells:    {cached_seconds:.3f} s ({literal_eval_seconds / cached_seconds:.1f}x)")
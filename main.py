@@ -1,10 +1,24 @@
 import os
+import queue
+import threading
+import time
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk
 import tkinter.messagebox as messagebox
 
+from keyword_search import filter_rows, render_matches, insert_highlighted
+from search_index import load_search_index, save_search_index, update_search_index, iter_search_index
+
 data = ''
+keyword_index = None
+
+# State of the background search: results are passed from the worker thread to the GUI through a queue
+search_queue = queue.Queue()
+search_lock = threading.Lock()  # Only one worker at a time uses keyword_index
+search_cancel_event = None
+search_id = 0
+cpr_list = []  # To store cpr numbers where results were found
 
 
 def read_excel_data(directory):
@@ -20,29 +34,8 @@ def read_excel_data(directory):
     return data
 
 
-def format_dataframe(dataframe, keyword):
-    formatted_text = ""
-    for index, row in dataframe.iterrows():
-        for column in dataframe.columns:
-            cell_value = str(row[column])
-            formatted_text += f"{column}: "
-            start = 0
-            while True:
-                start = cell_value.lower().find(keyword.lower(), start)
-                if start == -1:
-                    break
-                end = start + len(keyword)
-                formatted_text += cell_value[:start]
-                formatted_text += f"[[[{cell_value[start:end]}]]]"
-                cell_value = cell_value[end:]
-                start = end - len(keyword)
-            formatted_text += cell_value + "\t"
-        formatted_text += "\n----------------------\n"  # Add a separator between rows
-    return formatted_text
-
-
 def search_keyword():
-    global data
+    global data, search_id
     if not data:
         messagebox.showwarning("Data not loaded", "Please click on 'Load Patient Data' before searching.")
         return
@@ -51,24 +44,20 @@ def search_keyword():
         results_text.delete('1.0', tk.END)
         messagebox.showwarning("No Keyword Entered", "Please enter a keyword in the search box.")
         return
+    # Stop a running all-patient search and ignore its remaining results
+    cancel_search()
+    search_id += 1
+    cancel_button.config(state=tk.DISABLED)
+    progress_var.set("")
     results_text.delete('1.0', tk.END)
     for filename, df in data.items():
-        rows_with_keyword = df[df.apply(lambda row: row.astype(str).str.contains(keyword, regex=False).any(), axis=1)]
+        rows_with_keyword = filter_rows(df, keyword)
         if not rows_with_keyword.empty:
             results_text.insert(tk.END, f"-----------------------------------------\n"
                                         f"Results found in {filename}:\n"
                                         f"-----------------------------------------\n")
-            formatted_rows = format_dataframe(rows_with_keyword, keyword)
-            start = 0
-            while True:
-                start = formatted_rows.find("[[[", start)
-                if start == -1:
-                    break
-                results_text.insert(tk.END, formatted_rows[:start])
-                results_text.insert(tk.END, formatted_rows[start + 3:start + 3 + len(keyword)], 'highlight')
-                formatted_rows = formatted_rows[start + 3 + len(keyword):]
-                start = 0
-            results_text.insert(tk.END, formatted_rows + "\n\n")
+            formatted_rows, spans = render_matches(rows_with_keyword, keyword)
+            insert_highlighted(results_text, formatted_rows + "\n\n", spans, 'highlight')
 
 
 def read_all_excel_data():
@@ -88,43 +77,109 @@ def read_all_excel_data():
     return data
 
 
+def search_worker(current_search_id, keyword, cancel_event):
+    """
+    Runs an all-patient search in a background thread and streams the results to the GUI through search_queue.
+
+    Messages are tuples starting with the search id, followed by one of
+    ('progress', text), ('result', filename, formatted_rows, spans) and ('done', cancelled).
+    """
+    global keyword_index
+
+    def report(phase):
+        last_report = [0.0]
+
+        def progress(files_done, files_total):
+            # At most ten progress messages per second, and always the last one
+            now = time.monotonic()
+            if now - last_report[0] >= 0.1 or files_done == files_total:
+                last_report[0] = now
+                search_queue.put((current_search_id, 'progress', f"{phase} files: {files_done} / {files_total}"))
+        return progress
+
+    try:
+        with search_lock:
+            # Look the keyword up in the persistent index; only new or changed files are read
+            if keyword_index is None:
+                keyword_index = load_search_index()
+            if update_search_index(keyword_index, 'HospitalData', progress=report('Indexing'),
+                                   cancel_event=cancel_event):
+                save_search_index(keyword_index)
+
+            for filename, rows_with_keyword in iter_search_index(keyword_index, keyword, progress=report('Searched'),
+                                                                 cancel_event=cancel_event):
+                # Render in the worker, so the GUI only has to insert the text
+                formatted_rows, spans = render_matches(rows_with_keyword, keyword)
+                search_queue.put((current_search_id, 'result', filename, formatted_rows, spans))
+    except Exception as e:
+        search_queue.put((current_search_id, 'progress', f"Search failed: {e}"))
+
+    search_queue.put((current_search_id, 'done', cancel_event.is_set()))
+
+
+def poll_search_queue():
+    """
+    Moves the messages of the current search from search_queue into the GUI. Runs every 50 ms on the Tk thread.
+    """
+    try:
+        # Handle a limited number of messages per call, so the window stays responsive
+        for _ in range(200):
+            message = search_queue.get_nowait()
+            if message[0] != search_id:
+                continue  # Message from a cancelled search
+
+            if message[1] == 'progress':
+                progress_var.set(message[2])
+            elif message[1] == 'result':
+                _, _, filename, formatted_rows, spans = message
+                cpr_number = filename.split('_')[0]  # Extracting cpr number from filename
+                cpr_list.append(cpr_number)  # Storing cpr number
+                id_picker['values'] = cpr_list  # Update id_var with the new string
+                if len(cpr_list) == 1:
+                    id_var.set(cpr_number)
+
+                results_text.insert(tk.END, f"-----------------------------------------\n"
+                                            f"Results found in {filename}:\n"
+                                            f"-----------------------------------------\n")
+                insert_highlighted(results_text, formatted_rows + "\n\n", spans, 'highlight')
+            elif message[1] == 'done':
+                cancel_button.config(state=tk.DISABLED)
+                if message[2]:
+                    progress_var.set(progress_var.get() + " (cancelled)")
+                elif not cpr_list:
+                    messagebox.showwarning("OppppS!", "No matches found.")
+    except queue.Empty:
+        pass
+
+    root.after(50, poll_search_queue)
+
+
+def cancel_search():
+    """
+    Cancels the running all-patient search, if any.
+    """
+    if search_cancel_event is not None:
+        search_cancel_event.set()
+
+
 def search_keyword_all():
-    data_all = read_all_excel_data()
+    global search_cancel_event, search_id, cpr_list
     keyword = search_entry.get()
     if not keyword:  # Check if the keyword is empty
         results_text.delete('1.0', tk.END)
         messagebox.showwarning("No Keyword Entered", "Please enter a keyword in the search box.")
         return
-    results_text.delete('1.0', tk.END)
 
-    cpr_list = []  # To store cpr numbers where results were found
-
-    for filename, df in data_all.items():
-        rows_with_keyword = df[df.apply(lambda row: row.astype(str).str.contains(keyword, regex=False).any(), axis=1)]
-        if not rows_with_keyword.empty:
-            cpr_number = filename.split('_')[0]  # Extracting cpr number from filename
-            cpr_list.append(cpr_number)  # Storing cpr number
+    # A new search replaces the one in flight
+    cancel_search()
+    results_text.delete('1.0', tk.END)
+    cpr_list = []
+    search_id += 1
+    search_cancel_event = threading.Event()
+    progress_var.set("Starting search...")
+    cancel_button.config(state=tk.NORMAL)
 
-            results_text.insert(tk.END, f"-----------------------------------------\n"
-                                        f"Results found in {filename}:\n"
-                                        f"-----------------------------------------\n")
-            formatted_rows = format_dataframe(rows_with_keyword, keyword)
-            start = 0
-            while True:
-                start = formatted_rows.find("[[[", start)
-                if start == -1:
-                    break
-                results_text.insert(tk.END, formatted_rows[:start])
-                results_text.insert(tk.END, formatted_rows[start + 3:start + 3 + len(keyword)], 'highlight')
-                formatted_rows = formatted_rows[start + 3 + len(keyword):]
-                start = 0
-            results_text.insert(tk.END, formatted_rows + "\n\n")
-
-    if cpr_list:  # If the list is not empty
-        id_picker['values'] = cpr_list  # Update id_var with the new string
-        id_var.set(cpr_list[0])
-    else:
-        messagebox.showwarning("OppppS!", "No matches found.")
+    threading.Thread(target=search_worker, args=(search_id, keyword, search_cancel_event), daemon=True).start()
 
 
 def load_patient_data():
@@ -190,6 +245,13 @@ display_button.grid(row=0, column=0, padx=5, pady=5)
 display_all_button = tk.Button(button_frame, text="Search in All Patients", command=search_keyword_all)
 display_all_button.grid(row=0, column=1, padx=5, pady=5)
 
+cancel_button = tk.Button(button_frame, text="Cancel", command=cancel_search, state=tk.DISABLED)
+cancel_button.grid(row=0, column=2, padx=5, pady=5)
+
+progress_var = tk.StringVar()
+progress_label = tk.Label(button_frame, textvariable=progress_var)
+progress_label.grid(row=0, column=3, sticky='w', padx=5, pady=5)
+
 results_frame = tk.Frame(main_frame)  # A frame to hold the Text widget and the Scrollbar widget
 results_frame.grid(row=6, column=0, sticky='nsew', padx=5, pady=5)
 results_frame.columnconfigure(0, weight=1)
@@ -205,4 +267,5 @@ scrollbar.config(command=results_text.yview)  # Link scrollbar to results_text
 
 results_text.tag_configure('highlight', foreground='red')
 
+root.after(50, poll_search_queue)
 root.mainloop()
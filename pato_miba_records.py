@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the table of collect_diagnose_codes_in_columns: the diagnose codes that are collected
+DIAGNOSE_CODE_COLUMNS = [
+    "cpr",
+    "first_pato_date",
+    "ÆYY111 lav malignitetsgrad",
+    "ÆYY113 høj malignitetsgrad",
+    "P30611 ekscisionsbiopsi",
+    "P30615 endoskopisk biopsi",
+    "P30619 randombiopsi",
+    "P30625 spånresektat",
+    "P306x0 ektomipræparat",
+    "P306x4 tumorektomi",
+    "ÆYYY0R nested inkl. large nested type",
+    "ÆYYY0S mikrocystisk type",
+    "ÆYYY0U plasmacytoid/signetringscelle/diffus type",
+    "ÆYYY0X lipidrig type",
+    "M80133 storcellet neuroendokrint karcinom",
+    "M80203 udifferentieret karcinom",
+    "M80403 småcellet karcinom",
+    "M80702 planocellulært karcinom in situ",
+    "M80703 planocellulært karcinom",
+    "M80823 lymfoepitelialt karcinom",
+    # "M09450 ingen tegn på malignitet", # TODO: this code was not exist -> do we need it or just stick with the list in document
+    "M81200 urotelialt papillom",
+    "M81202 urotelialt karcinom in situ",
+    "M81203 urotelialt",
+    "M81300 inverteret urotelialt papillom",
+    "M81233 sarkomatoidt urotelialt karcinom",
+    "M81313 mikropapillært urotelialt karcinom",
+    "M81301 papillær urotelial tumor med minimalt malignitetspotentiale",
+    "M81302 ikkeinvasiv papillær urotelial tumor",
+    "M81403 adenokarcinom",
+    "M81402 adenokarcinom in situ",
+    "M81303 urotelial tumor",
+    "M80703 planocellulært karcinom",
+    "M81403 adenokarcinom",
+    "M69760 malignitetssuspekte celler"
+]
+
+MIBA_COLUMNS = ['cpr', 'Prøvens art', 'Taget d.', 'Kvantitet']
+
+
+def collect_diagnose_codes_in_columns(patients_data):
+    """
+    Process the patients' data and collect specified diagnose codes into multiple columns.
+
+    The records are collected in a list and the DataFrame is built once at the end.
+
+    :param patients_data: DataFrame containing patients' data with 'cpr', 'first_pato_date', and 'diagnoser' columns.
+    :return: DataFrame with collected diagnose codes in multiple columns.
+    """
+    columns = DIAGNOSE_CODE_COLUMNS
+    known_columns = set(columns)
+    records = []
+
+    # One pass over the rows
+    for cpr, first_pato_date, diagnoser in zip(patients_data['cpr'], patients_data['first_pato_date'],
+                                               patients_data['diagnoser']):
+        lines = diagnoser.split('\n')
+
+        # Skip if there are not enough lines
+        if len(lines) < 3:
+            continue
+
+        # Column name is in the second line
+        column_name = lines[1].strip()
+
+        if column_name in known_columns:
+            # The rest of the lines are the data for the column
+            records.append({'cpr': cpr, 'first_pato_date': first_pato_date,
+                            column_name: '\n'.join(lines[2:]).strip()})
+
+    # Build the DataFrame once
+    return pd.DataFrame(records, columns=list(dict.fromkeys(columns)), dtype=object).reindex(columns=columns)
+
+
+def filter_dataframes(miba_excels, earliest_records_df):
+    """
+    Collect the blood and urine miba samples taken before the first pato date of every record.
+
+    The samples of all miba files are concatenated once, with the cpr of their file; the records are then joined
+    with the samples of their cpr (a hash join instead of a scan of all file names per record) and filtered in one
+    go. The rows come in the order of the records, and per record in the order of the files.
+
+    :param miba_excels: Dict of the miba files ('<cpr>_miba.xlsx' -> DataFrame), see read_excel_data_from_folders.
+    :param earliest_records_df: DataFrame with 'cpr' and 'first_pato_date' ('%d.%m.%Y') columns.
+    :return: DataFrame with the 'cpr', 'Prøvens art', 'miba_date' and 'Kvantitet' columns.
+    """
+    # Concatenate the samples of all files once, with the cpr of the file name
+    frames = list(miba_excels.values())
+    if frames:
+        miba = pd.concat(frames, ignore_index=True)[MIBA_COLUMNS[1:]]
+        cprs = np.array([filename.split('_')[0] for filename in miba_excels], dtype=object)
+        miba.insert(0, 'cpr', np.repeat(cprs, [len(df) for df in frames]))
+    else:
+        miba = pd.DataFrame(columns=MIBA_COLUMNS)
+
+    # Keep the blood and urine samples ('Prøvens art' starting with 'Blod' or 'Urin')
+    miba = miba[miba['Prøvens art'].str.startswith(('Blod', 'Urin'), na=False)]
+    miba = miba.assign(**{'Taget d.': pd.to_datetime(miba['Taget d.'], format='%d.%m.%Y'),
+                          'sample_order': np.arange(len(miba))})
+
+    # Join every record with the samples of its cpr and keep the samples taken before its first pato date
+    records = pd.DataFrame({'cpr': earliest_records_df['cpr'].to_numpy(dtype=object),
+                            'min_date': pd.to_datetime(earliest_records_df['first_pato_date'], format='%d.%m.%Y')
+                            .to_numpy(),
+                            'record_order': np.arange(len(earliest_records_df))})
+    filtered_data = pd.merge(records, miba, on='cpr', how='inner')
+    filtered_data = filtered_data[(filtered_data['Taget d.'] < filtered_data['min_date']).to_numpy(dtype=bool)]
+    filtered_data = filtered_data.sort_values(['record_order', 'sample_order'], kind='stable')
+    filtered_data = filtered_data[MIBA_COLUMNS].reset_index(drop=True)
+
+    # Fill empty 'Kvantitet' cells with 'Negative'
+    filtered_data['Kvantitet'] = filtered_data['Kvantitet'].fillna('Negative')
+
+    # Convert date back to string in the desired format
+    filtered_data['Taget d.'] = filtered_data['Taget d.'].dt.strftime('%d.%m.%Y')
+
+    # Rename the column
+    return filtered_data.rename(columns={'Taget d.': 'miba_date'})
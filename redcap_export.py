@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+def combine_sources(sources, id_col='cpr'):
+    """
+    Align the per-id aggregates of several sources (one row per id each) on the union of their ids in one step.
+
+    The ids are coded once against a categorical of the sorted union of the ids; every source is reindexed to the
+    codes of the union and the sources are then put side by side with a single concat(axis=1). Gives the same frame
+    as chaining pd.merge(..., on=id_col, how='outer') over the sources, without copying the growing frame once per
+    source.
+
+    Parameters:
+    sources (list): The aggregated DataFrames, each with a unique id_col column.
+    id_col (str): The id column shared by the sources.
+
+    Returns:
+    pd.DataFrame: One row per id (sorted), the id column followed by the columns of every source in order.
+    """
+    ids = pd.concat([source[id_col] for source in sources], ignore_index=True).drop_duplicates().sort_values()
+    ids = pd.Index(ids, name=id_col)
+    union = pd.RangeIndex(len(ids))
+
+    aligned = []
+    for source in sources:
+        block = source.drop(columns=id_col)
+        block.index = pd.Categorical(source[id_col], categories=ids).codes
+        aligned.append(block.reindex(union))
+
+    combined = pd.concat(aligned, axis=1)
+    combined.index = ids
+    return combined.reset_index()
+
+
+def process_cell(cell_value):
+    # If cell_value is empty, return an empty string ""
+    if str(cell_value) == 'nan':
+        return "nan"
+
+    # Check if cell_value is already a list
+    if isinstance(cell_value, list):
+        # Convert list items to string, replace 'nan' with empty string
+        values = [str(item) if str(item) != 'nan' else '' for item in cell_value]
+        return '\"' + str(values) + '\"'
+
+    # If cell_value is a string and starts with "[" and ends with "]"
+    if isinstance(cell_value, str) and cell_value.startswith("[") and cell_value.endswith("]"):
+        # Strip off the brackets and split the string into a list based on comma separation
+        values = cell_value[1:-1].split(", ")
+
+        # Replace 'nan' with empty string
+        values = ['' if val.strip() == 'nan' else val for val in values]
+
+        # Convert list back to string representation
+        return values
+
+    # If cell_value is a string and NOT starts with "[" and ends with "]"
+    if isinstance(cell_value, str):
+        return '\"[\'' + str(cell_value) + '\']\"'
+
+    # If it's neither a string in list format nor a list, return the cell_value as is
+    return cell_value
+
+
+def _object_array(items):
+    """
+    Build a 1-D object array of the items, keeping list items as single cells.
+    """
+    array = np.empty(len(items), dtype=object)
+    for position, item in enumerate(items):
+        array[position] = item
+    return array
+
+
+def serialise_redcap_column(column):
+    """
+    Serialise the cells of one column for the REDCap import, the same as column.map(process_cell).
+
+    The cells are grouped by type once: plain strings are quoted with one vectorised concatenation, missing values
+    are replaced with one mask and only the list cells (and unusual types) are serialised one by one.
+
+    Parameters:
+    column (pd.Series): A column of the combined data.
+
+    Returns:
+    pd.Series: The serialised cells (objects), indexed like 'column'.
+    """
+    if pd.api.types.is_integer_dtype(column) or pd.api.types.is_bool_dtype(column):
+        return column.copy()
+
+    values = column.to_numpy(dtype=object)
+    result = values.copy()
+    kinds = pd.Series(list(map(type, values)), dtype=object)
+
+    # Missing values (NaN), as floats or as the text 'nan'; other subclasses are left to process_cell
+    is_float = kinds.isin([float, np.float64]).to_numpy()
+    is_str = kinds.isin([str]).to_numpy()
+    is_list = kinds.isin([list]).to_numpy()
+    is_nan = np.zeros(len(values), dtype=bool)
+    is_nan[is_float] = np.isnan(values[is_float].astype(float))
+    is_nan[is_str] = values[is_str] == 'nan'
+    result[is_nan] = "nan"
+
+    # Plain strings are quoted as a one-item list; strings that are already a list literal are split
+    is_text = is_str & ~is_nan
+    strings = values[is_text]
+    bracketed = np.fromiter((text[:1] == '[' and text[-1:] == ']' for text in strings), dtype=bool,
+                            count=len(strings))
+    quoted = '\"[\'' + strings + '\']\"'
+    quoted[bracketed] = _object_array([process_cell(value) for value in strings[bracketed]])
+    result[is_text] = quoted
+
+    # Lists, with the 'nan' items left empty
+    result[is_list] = ['\"' + str([text if text != 'nan' else '' for text in map(str, cell)]) + '\"'
+                       for cell in values[is_list]]
+
+    # Anything else (e.g. numbers, dates, None) is serialised cell by cell
+    other = ~(is_float | is_str | is_list)
+    result[other] = _object_array([process_cell(value) for value in values[other]])
+    return pd.Series(result, index=column.index, name=column.name, dtype=object)
+
+
+def serialise_redcap_frame(combined_data):
+    """
+    Serialise every cell of the combined data for the REDCap import, column by column.
+
+    Parameters:
+    combined_data (pd.DataFrame): The combined data, with list cells.
+
+    Returns:
+    pd.DataFrame: The serialised data.
+    """
+    return pd.DataFrame({col: serialise_redcap_column(combined_data[col]) for col in combined_data.columns},
+                        index=combined_data.index)
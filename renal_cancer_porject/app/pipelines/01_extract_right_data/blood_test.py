@@ -4,6 +4,9 @@ import pandas as pd
 from datetime import datetime
 from openpyxl import load_workbook
 
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from renal_cancer_porject.utils.analyte_parser import match_analyte, parse_value_text
+
 
 def parse_biochemistry_value(cell_content, biochemistry_keys):
     """
@@ -16,15 +19,11 @@ def parse_biochemistry_value(cell_content, biochemistry_keys):
     Returns:
         tuple: A tuple containing the key and the parsed value, or (None, None) if no key is found.
     """
-    for key in biochemistry_keys:
-        if key.lower() in cell_content.lower():
-            value_str = cell_content.split(';')[-1].split(':')[-1].strip()
-            value_str = value_str.replace(',', '.').lstrip('<')
-            try:
-                return key, float(value_str)
-            except ValueError:
-                return key, value_str
-    return None, None
+    # The first key that occurs in the content, found with one precompiled pattern
+    key = match_analyte(cell_content, biochemistry_keys)
+    if key is None:
+        return None, None
+    return key, parse_value_text(cell_content)
 
 
 def process_excel_file(file_path, biochemistry_keys, target_date_obj):
@@ -4,6 +4,9 @@ import pandas as pd
 from datetime import datetime
 from openpyxl import load_workbook
 
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from renal_cancer_porject.utils.analyte_parser import match_analyte, parse_value_text
+
 
 def parse_biochemistry_value(cell_content, biochemistry_keys):
     """
@@ -16,15 +19,11 @@ def parse_biochemistry_value(cell_content, biochemistry_keys):
     Returns:
         tuple: A tuple containing the key and the parsed value, or (None, None) if no key is found.
     """
-    for key in biochemistry_keys:
-        if key.lower() in cell_content.lower():
-            value_str = cell_content.split(';')[-1].split(':')[-1].strip()
-            value_str = value_str.replace(',', '.').lstrip('<')
-            try:
-                return key, float(value_str)
-            except ValueError:
-                return key, value_str
-    return None, None
+    # The first key that occurs in the content, found with one precompiled pattern
+    key = match_analyte(cell_content, biochemistry_keys)
+    if key is None:
+        return None, None
+    return key, parse_value_text(cell_content)
 
 
 def process_excel_file(file_path, biochemistry_keys, target_date_obj):
@@ -116,20 +115,6 @@ def extract_latest_patient_biochemistry_data_before_operation(file_name, base_di
 #                                                                             biochemistry_keys)
 # print(blood_test_data)
 
-import pandas as pd
-from datetime import datetime
-import os
-
-import pandas as pd
-from openpyxl import load_workbook
-from datetime import datetime
-import re
-
-from openpyxl import load_workbook
-from datetime import datetime
-import re
-
-
 # def parse_biochemistry_value(cell_content):
 #     """
 #     Tries to parse any potential biochemistry value from the cell content.
@@ -193,42 +178,14 @@ import re
 #     return closest_row_data, closest_date
 
 
-def extract_key_and_value(cell_content):
-    """
-    Extracts the key and value from a given string formatted as 'Key: Value'.
-
-    Parameters:
-        cell_content (str): The content of the cell in the format 'Key: Value'.
-
-    Returns:
-        tuple: A tuple containing the key and the parsed value.
-    """
-    # Split the content into key and value parts
-    parts = cell_content.split(':')
-    if len(parts) == 2:
-        key = parts[0].strip()
-        value_str = parts[1].strip()
-        value_str = value_str.replace(',', '.').lstrip('<')
-
-        # Attempt to convert value to float, if possible
-        try:
-            value = float(value_str)
-        except ValueError:
-            value = value_str  # Keep as string if it's not a valid float
-
-        return key, value
-
-    return None, None  # Return None if the format isn't as expected
-
+from blood_test_index import get_blood_test_index, first_values_after
 from datetime import timedelta
-from openpyxl import load_workbook
-from datetime import datetime
-import pandas as pd
 
 def process_excel_file(file_path, target_date_obj, days_after, max_values_per_key=5):
     """
     Processes the Excel file of a single patient to extract biochemistry data after a specific date plus additional days,
     without resetting collected data unless it surpasses the set limit of values per key.
+    The workbook is parsed once into an index (shared with blood_test_all_before) and queried here.
 
     Parameters:
         file_path (str): Full path to the patient's Excel file.
@@ -239,38 +196,9 @@ def process_excel_file(file_path, target_date_obj, days_after, max_values_per_ke
     Returns:
         dict: Dictionary with keys as biochemistry markers and values as lists of (date, value) tuples.
     """
-    workbook = load_workbook(file_path)
-    sheet = workbook.active
-    date_pattern = re.compile(r'(\d{2}-\d{2}-\d{2} \d{2}:\d{2})')
-
+    index = get_blood_test_index(file_path)
     end_date = target_date_obj + timedelta(days=days_after)
-    latest_data = {}
-    latest_date = None
-
-    for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row, values_only=True):
-        for cell in row:
-            if cell and isinstance(cell, str):
-                cell_content = cell.strip().replace('_x000D_', '')
-                date_match = date_pattern.match(cell_content)
-
-                if date_match:
-                    row_date_str = date_match.groups()[0]
-                    row_date_obj = datetime.strptime(row_date_str, "%d-%m-%y %H:%M")
-                    if row_date_obj > end_date:  # Only consider dates after the end_date
-                        if latest_date is None or row_date_obj > latest_date:
-                            latest_date = row_date_obj  # Update the latest date
-                            # Do not reset latest_data here
-                elif latest_date:  # Only process cells if a valid date has been set and is after the end_date
-                    key, value = extract_key_and_value(cell_content)
-                    if key:
-                        if key not in latest_data:
-                            latest_data[key] = []  # Initialize a new list for this key
-                        # Append only up to the maximum number of allowed entries
-                        if len(latest_data[key]) < max_values_per_key:
-                            # latest_data[key].append((latest_date, value))
-                            latest_data[key].append((latest_date.strftime('%Y-%m-%d %H:%M:%S'), value))
-
-    return latest_data, latest_date
+    return first_values_after(index, end_date, max_values_per_key)
 
 def read_patient_operation_dates(file_path):
     """
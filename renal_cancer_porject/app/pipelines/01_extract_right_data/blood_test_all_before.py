@@ -4,6 +4,9 @@ import pandas as pd
 from datetime import datetime
 from openpyxl import load_workbook
 
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from renal_cancer_porject.utils.analyte_parser import match_analyte, parse_value_text
+
 
 def parse_biochemistry_value(cell_content, biochemistry_keys):
     """
@@ -16,15 +19,11 @@ def parse_biochemistry_value(cell_content, biochemistry_keys):
     Returns:
         tuple: A tuple containing the key and the parsed value, or (None, None) if no key is found.
     """
-    for key in biochemistry_keys:
-        if key.lower() in cell_content.lower():
-            value_str = cell_content.split(';')[-1].split(':')[-1].strip()
-            value_str = value_str.replace(',', '.').lstrip('<')
-            try:
-                return key, float(value_str)
-            except ValueError:
-                return key, value_str
-    return None, None
+    # The first key that occurs in the content, found with one precompiled pattern
+    key = match_analyte(cell_content, biochemistry_keys)
+    if key is None:
+        return None, None
+    return key, parse_value_text(cell_content)
 
 
 def process_excel_file(file_path, biochemistry_keys, target_date_obj):
@@ -114,20 +113,6 @@ def extract_latest_patient_biochemistry_data_before_operation(file_name, base_di
 #                                                                             biochemistry_keys)
 # print(blood_test_data)
 
-import pandas as pd
-from datetime import datetime
-import os
-
-import pandas as pd
-from openpyxl import load_workbook
-from datetime import datetime
-import re
-
-from openpyxl import load_workbook
-from datetime import datetime
-import re
-
-
 # def parse_biochemistry_value(cell_content):
 #     """
 #     Tries to parse any potential biochemistry value from the cell content.
@@ -191,38 +176,13 @@ import re
 #     return closest_row_data, closest_date
 
 
-def extract_key_and_value(cell_content):
-    """
-    Extracts the key and value from a given string formatted as 'Key: Value'.
-
-    Parameters:
-        cell_content (str): The content of the cell in the format 'Key: Value'.
-
-    Returns:
-        tuple: A tuple containing the key and the parsed value.
-    """
-    # Split the content into key and value parts
-    parts = cell_content.split(':')
-    if len(parts) == 2:
-        key = parts[0].strip()
-        value_str = parts[1].strip()
-        value_str = value_str.replace(',', '.').lstrip('<')
-
-        # Attempt to convert value to float, if possible
-        try:
-            value = float(value_str)
-        except ValueError:
-            value = value_str  # Keep as string if it's not a valid float
-
-        return key, value
-
-    return None, None  # Return None if the format isn't as expected
-
+from blood_test_index import get_blood_test_index, latest_values_before
 
 
 def process_excel_file(file_path, target_date_obj):
     """
     Processes the Excel file of a single patient to extract biochemistry data.
+    The workbook is parsed once into an index (shared with blood_test_all_after) and queried here.
 
     Parameters:
         file_path (str): Full path to the patient's Excel file.
@@ -231,36 +191,8 @@ def process_excel_file(file_path, target_date_obj):
     Returns:
         dict: Dictionary with the latest biochemistry data and the closest date.
     """
-    workbook = load_workbook(file_path)
-    sheet = workbook.active
-    date_pattern = re.compile(r'(\d{2}-\d{2}-\d{2} \d{2}:\d{2})')
-
-    closest_date = None
-    most_recent_values = {}  # Initialize an empty dictionary to track the most recent values.
-    closest_row_data = {}
-
-    for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row, values_only=True):
-        for cell in row:
-            if cell and isinstance(cell, str):
-                cell_content = cell.strip().replace('_x000D_', '')
-                date_match = date_pattern.match(cell_content)
-
-                if date_match:
-                    row_date_str = date_match.groups()[0]
-                    row_date_obj = datetime.strptime(row_date_str, "%d-%m-%y %H:%M")
-                    if row_date_obj > target_date_obj:
-                        return closest_row_data, closest_date
-                    if closest_date is None or row_date_obj > closest_date:
-                        closest_date = row_date_obj
-                        closest_row_data = most_recent_values.copy()
-
-                elif closest_date:
-                    key, value = extract_key_and_value(cell_content)
-                    if key:
-                        closest_row_data[key] = value
-                        most_recent_values[key] = value
-
-    return closest_row_data, closest_date
+    index = get_blood_test_index(file_path)
+    return latest_values_before(index, target_date_obj)
 
 
 
@@ -317,8 +249,6 @@ def extract_latest_patient_biochemistry_data_before_operation(file_name, base_di
     } for data in patient_data])
 
 
-import pandas as pd
-
 # Define the parameters
 # file_name = 'blood_test.xlsx'
 # base_directory = 'C:\\src\\hospital-ui\\renal_cancer_porject\\data'
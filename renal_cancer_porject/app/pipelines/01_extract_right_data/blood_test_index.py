@@ -0,0 +1,214 @@
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from openpyxl import load_workbook
+
+# Date cells start with a timestamp such as '03-02-19 08:15'
+date_pattern = re.compile(r'(\d{2}-\d{2}-\d{2} \d{2}:\d{2})')
+
+# Parsed indexes, keyed by absolute file path -> (size, mtime_ns, index), least recently used first. At most
+# INDEX_CACHE_SIZE workbooks are kept, so a long-running process does not keep the index of every file it has seen.
+INDEX_CACHE_SIZE = 128
+_index_cache = OrderedDict()
+
+
+def extract_key_and_value(cell_content):
+    """
+    Extracts the key and value from a given string formatted as 'Key: Value'.
+
+    Parameters:
+        cell_content (str): The content of the cell in the format 'Key: Value'.
+
+    Returns:
+        tuple: A tuple containing the key and the parsed value.
+    """
+    # Split the content into key and value parts
+    parts = cell_content.split(':')
+    if len(parts) == 2:
+        key = parts[0].strip()
+        value_str = parts[1].strip()
+        value_str = value_str.replace(',', '.').lstrip('<')
+
+        # Attempt to convert value to float, if possible
+        try:
+            value = float(value_str)
+        except ValueError:
+            value = value_str  # Keep as string if it's not a valid float
+
+        return key, value
+
+    return None, None  # Return None if the format isn't as expected
+
+
+def build_blood_test_index(file_path):
+    """
+    Parses a patient's blood test workbook once into an index that the before/after extractors can query.
+
+    The workbook is a sequence of date cells, each followed by the measurement cells taken at that date.
+    Cells are read in the same order as before (row by row, left to right), and the order of the file is
+    kept, so queries give the same results as scanning the workbook.
+
+    Parameters:
+        file_path (str): Full path to the patient's Excel file.
+
+    Returns:
+        dict: The index with the keys
+              'block_dates': the date of each date block, in file order,
+              'running_max': the latest date seen up to each block (sorted, used for bisecting),
+              'keys': for each biochemistry key, in order of first appearance, a dict with the
+                      'blocks' (block numbers), 'seqs' (cell order) and 'values' of its measurements.
+    """
+    workbook = load_workbook(file_path, read_only=True)
+    sheet = workbook.active
+
+    block_dates = []
+    running_max = []
+    keys = {}
+    seq = 0
+
+    for row in sheet.iter_rows(values_only=True):
+        for cell in row:
+            if cell and isinstance(cell, str):
+                cell_content = cell.strip().replace('_x000D_', '')
+                date_match = date_pattern.match(cell_content)
+
+                if date_match:
+                    row_date_obj = datetime.strptime(date_match.groups()[0], "%d-%m-%y %H:%M")
+                    block_dates.append(row_date_obj)
+                    running_max.append(max(running_max[-1], row_date_obj) if running_max else row_date_obj)
+
+                elif block_dates:  # Measurements before the first date cell are ignored
+                    key, value = extract_key_and_value(cell_content)
+                    if key:
+                        entry = keys.setdefault(key, {'blocks': [], 'seqs': [], 'values': []})
+                        entry['blocks'].append(len(block_dates) - 1)
+                        entry['seqs'].append(seq)
+                        entry['values'].append(value)
+                        seq += 1
+
+    workbook.close()
+
+    return {'block_dates': block_dates, 'running_max': running_max, 'keys': keys}
+
+
+def get_blood_test_index(file_path):
+    """
+    Returns the parsed index of a blood test workbook, parsing the file only if it was not parsed before
+    or has changed since (size or modification time). The INDEX_CACHE_SIZE most recently used indexes are kept.
+
+    Parameters:
+        file_path (str): Full path to the patient's Excel file.
+
+    Returns:
+        dict: The index built by build_blood_test_index.
+    """
+    cache_key = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    cached = _index_cache.get(cache_key)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        _index_cache.move_to_end(cache_key)
+        return cached[2]
+
+    # Replaces the entry of a changed file, and drops the least recently used entries beyond the limit
+    index = build_blood_test_index(file_path)
+    _index_cache[cache_key] = (stat.st_size, stat.st_mtime_ns, index)
+    _index_cache.move_to_end(cache_key)
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def latest_values_before(index, target_date_obj):
+    """
+    Looks up the latest value of every biochemistry key before a target date.
+
+    Like reading the workbook until the first date cell after the target date, this returns the last
+    value of every key seen before that cell, and the latest date seen.
+
+    Parameters:
+        index (dict): The index built by build_blood_test_index.
+        target_date_obj (datetime): The cutoff datetime object for data extraction.
+
+    Returns:
+        tuple: Dictionary with the latest biochemistry data, and the closest date (None if no data).
+    """
+    # First block whose date lies after the target date (the running maximum is sorted)
+    stop = bisect_right(index['running_max'], target_date_obj)
+    if stop == 0:
+        return {}, None
+
+    closest_row_data = {}
+    for key, entry in index['keys'].items():
+        position = bisect_left(entry['blocks'], stop)
+        if position > 0:
+            closest_row_data[key] = entry['values'][position - 1]
+
+    return closest_row_data, index['running_max'][stop - 1]
+
+
+def first_values_after(index, end_date, max_values_per_key=5):
+    """
+    Looks up the first values of every biochemistry key from the first date cell after end_date on.
+
+    Like reading the workbook from the first date cell after end_date, each value is returned together
+    with the latest date seen at that point.
+
+    Parameters:
+        index (dict): The index built by build_blood_test_index.
+        end_date (datetime): Values are collected from the first date block after this date.
+        max_values_per_key (int): Maximum number of values to return for each key.
+
+    Returns:
+        tuple: Dictionary with keys as biochemistry markers and values as lists of (date, value) tuples,
+               and the latest date in the file (None if there is no date after end_date).
+    """
+    running_max = index['running_max']
+    start = bisect_right(running_max, end_date)
+    if start == len(running_max):
+        return {}, None
+
+    found = []
+    for key, entry in index['keys'].items():
+        position = bisect_left(entry['blocks'], start)
+        if position < len(entry['blocks']):
+            found.append((entry['seqs'][position], key, position))
+
+    # Keys are reported in the order they first appear after end_date
+    latest_data = {}
+    for _, key, position in sorted(found):
+        entry = index['keys'][key]
+        latest_data[key] = [
+            (running_max[block].strftime('%Y-%m-%d %H:%M:%S'), value)
+            for block, value in zip(entry['blocks'][position:position + max_values_per_key],
+                                    entry['values'][position:position + max_values_per_key])
+        ]
+
+    return latest_data, running_max[-1]
+
+
+def values_within(index, start_date, end_date):
+    """
+    Looks up all values of every biochemistry key measured between two dates (both included).
+
+    Parameters:
+        index (dict): The index built by build_blood_test_index.
+        start_date (datetime): Start of the window.
+        end_date (datetime): End of the window.
+
+    Returns:
+        dict: Dictionary with keys as biochemistry markers and values as lists of (date, value) tuples,
+              in file order. Keys without values in the window are left out.
+    """
+    block_dates = index['block_dates']
+    in_window = [start_date <= block_date <= end_date for block_date in block_dates]
+
+    window_data = {}
+    for key, entry in index['keys'].items():
+        values = [(block_dates[block].strftime('%Y-%m-%d %H:%M:%S'), value)
+                  for block, value in zip(entry['blocks'], entry['values']) if in_window[block]]
+        if values:
+            window_data[key] = values
+
+    return window_data
@@ -0,0 +1,112 @@
+import os
+import pandas as pd
+from datetime import timedelta
+
+from blood_test_index import get_blood_test_index, latest_values_before, first_values_after, values_within
+
+# Windows used by combine.py; the column prefixes match the old before/after extractors
+default_windows = [
+    {'kind': 'before', 'prefix': 'before_surgery_'},
+    {'kind': 'after', 'days': 31, 'max_values': 5, 'prefix': 'after_surgery_1mo_first5_'},
+]
+
+
+def query_window(index, anchor_date, window):
+    """
+    Answers a single window request from the parsed blood test index of a patient.
+
+    Supported window specs (dicts):
+        {'kind': 'before'}                                  latest value of every key before the anchor date
+        {'kind': 'after', 'days': N, 'max_values': K}       first K values of every key after anchor date + N days
+        {'kind': 'within', 'start_days': a, 'end_days': b}  all values between anchor date + a and + b days
+
+    Parameters:
+        index (dict): The index built by build_blood_test_index.
+        anchor_date (datetime): The date the window is relative to (e.g. the diagnosis date).
+        window (dict): The window spec.
+
+    Returns:
+        dict: Dictionary with the biochemistry data of the window (empty if there is none).
+    """
+    kind = window['kind']
+    if kind == 'before':
+        data, closest_date = latest_values_before(index, anchor_date)
+    elif kind == 'after':
+        end_date = anchor_date + timedelta(days=window.get('days', 0))
+        data, closest_date = first_values_after(index, end_date, window.get('max_values', 5))
+    elif kind == 'within':
+        data = values_within(index, anchor_date + timedelta(days=window['start_days']),
+                             anchor_date + timedelta(days=window['end_days']))
+        closest_date = bool(data)
+    else:
+        raise ValueError(f"Unknown window kind: {kind}")
+
+    # Same as the old extractors: no data unless a date was found for the window
+    return data if closest_date else {}
+
+
+def extract_biochemistry_windows(requests, base_directory, file_name='blood_test.xlsx'):
+    """
+    Extracts biochemistry data for a list of (patient, anchor date, window spec) requests.
+
+    The blood test file of each patient is parsed once, and every window of every anchor date of that
+    patient (e.g. the initial diagnosis and each recurrence) is answered from the parsed index.
+
+    Parameters:
+        requests (list): List of (patient ID, anchor date, window spec) tuples. A window spec is a dict as
+                         described in query_window, with a 'prefix' that is put in front of its column names.
+        base_directory (str): Path to the directory containing patient subdirectories.
+        file_name (str): The name of the Excel file within each patient's subdirectory.
+
+    Returns:
+        pd.DataFrame: One row per (PatientID, EarliestDiagnosisDate) with the data of all its windows.
+    """
+    # Group the requests by patient, keeping the order of the requests
+    requests_by_patient = {}
+    for patient_id, anchor_date, window in requests:
+        requests_by_patient.setdefault(patient_id, []).append((pd.Timestamp(anchor_date), window))
+
+    rows = {}
+    for patient_id, patient_requests in requests_by_patient.items():
+        file_path = os.path.join(base_directory, str(patient_id), file_name)
+        if not os.path.isfile(file_path):
+            continue
+
+        index = get_blood_test_index(file_path)
+        for anchor_date, window in patient_requests:
+            row = rows.setdefault((patient_id, anchor_date),
+                                  {'PatientID': patient_id, 'EarliestDiagnosisDate': anchor_date})
+            for key, value in query_window(index, anchor_date, window).items():
+                row[f"{window.get('prefix', '')}{key}"] = value
+
+    return pd.DataFrame(list(rows.values()))
+
+
+def build_window_requests(diagnoses, windows=None):
+    """
+    Builds the window requests for every row of a diagnoses DataFrame.
+
+    Parameters:
+        diagnoses (pd.DataFrame): DataFrame with 'PatientID' and 'EarliestDiagnosisDate' columns,
+                                  e.g. the initial diagnoses or the recurrences.
+        windows (list): The window specs to request for each row. Defaults to default_windows.
+
+    Returns:
+        list: List of (patient ID, anchor date, window spec) tuples.
+    """
+    if windows is None:
+        windows = default_windows
+
+    return [(patient_id, anchor_date, window)
+            for patient_id, anchor_date in zip(diagnoses['PatientID'], diagnoses['EarliestDiagnosisDate'])
+            if pd.notna(anchor_date)
+            for window in windows]
+
+
+# # Example usage
+# base_directory = 'C:\\src\\hospital-ui\\renal_cancer_porject\\data'
+# requests = [
+#     ('0101011234', '2019-01-01', {'kind': 'before', 'prefix': 'before_surgery_'}),
+#     ('0101011234', '2019-01-01', {'kind': 'within', 'start_days': 0, 'end_days': 7, 'prefix': 'first_week_'}),
+# ]
+# print(extract_biochemistry_windows(requests, base_directory))
@@ -17,39 +17,25 @@ initial_diagnoses.to_excel(patient_diagnoses_file, index=False)
 # Save the recurrences DataFrame to another Excel file
 # recurrences.to_excel('recurrences.xlsx', index=False)
 
-from blood_test_all_before import extract_latest_patient_biochemistry_data_before_operation
+from blood_test_windows import default_windows, build_window_requests, extract_biochemistry_windows
 
-# Call the function
-blood_test_data_before = extract_latest_patient_biochemistry_data_before_operation(
-    file_name=file_name,
-    base_directory=base_directory,
-    patient_date_file=patient_diagnoses_file
-)
-from blood_test_all_after import extract_patient_biochemistry_data_after_operation
+# Extract biochemistry data before and after the operation for the initial diagnoses and every recurrence.
+# Each blood test file is parsed once, and each recurrence gets the windows of its own diagnosis date.
+window_requests = (build_window_requests(initial_diagnoses, default_windows) +
+                   build_window_requests(recurrences, default_windows))
+blood_test_data = extract_biochemistry_windows(window_requests, base_directory, file_name)
+merge_keys = ['PatientID', 'EarliestDiagnosisDate']
+if blood_test_data.empty:
+    blood_test_data = pd.DataFrame(columns=merge_keys)
 
-# Call the function
-# Extract biochemistry data after operation
-blood_test_data_after = extract_patient_biochemistry_data_after_operation(
-    file_name=file_name,
-    base_directory=base_directory,
-    patient_date_file=patient_diagnoses_file,
-    days_after=31
-)
-
-# Merge initial diagnoses with blood test data before operation
-combined_data_rcc = pd.merge(initial_diagnoses, blood_test_data_before, on='PatientID', how='left')
-
-# Now merge the combined data with blood test data after operation
-final_combined_data_rcc = pd.merge(combined_data_rcc, blood_test_data_after, on='PatientID', how='left')
+# Merge initial diagnoses with their blood test data
+final_combined_data_rcc = pd.merge(initial_diagnoses, blood_test_data, on=merge_keys, how='left')
 
 # Save the combined DataFrame to an Excel file
 final_combined_data_rcc.to_excel('rcc_.xlsx', index=False)
 
-# Merge initial diagnoses with blood test data before operation
-combined_data_recurrences = pd.merge(recurrences, blood_test_data_before, on='PatientID', how='left')
-
-# Now merge the combined data with blood test data after operation
-final_combined_data_recurrences = pd.merge(combined_data_recurrences, blood_test_data_after, on='PatientID', how='left')
+# Merge recurrences with the blood test data of their own diagnosis date
+final_combined_data_recurrences = pd.merge(recurrences, blood_test_data, on=merge_keys, how='left')
 
 # Save the combined DataFrame to an Excel file
 final_combined_data_recurrences.to_excel('recurrences_.xlsx', index=False)
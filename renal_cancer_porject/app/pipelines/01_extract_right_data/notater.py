@@ -1,6 +1,15 @@
 import os
-import PyPDF2
+import re
+import time
 import pandas as pd
+from bisect import bisect_right
+from contextlib import closing
+from functools import lru_cache
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from renal_cancer_porject.utils.pdf_text_cache import iter_pdf_pages_cached, read_pdf_pages_cached
 
 
 def search_terms_in_pdf(pdf_path, search_terms):
@@ -15,26 +24,46 @@ def search_terms_in_pdf(pdf_path, search_terms):
         dict: A dictionary with category as key and the first found term as value.
     """
     found_terms = {category: None for category in search_terms}
-    with open(pdf_path, 'rb') as f:
-        pdf_reader = PyPDF2.PdfReader(f)
-        for page in pdf_reader.pages:
-            page_text = page.extract_text().lower()
-            for category, terms in search_terms.items():
-                if found_terms[category] is None:  # Skip if we've already found a term for this category
-                    for term in terms:
-                        if term.lower() in page_text:
-                            found_terms[category] = term
-                            # break  # Stop after the first term is found in category
+    # Page texts are extracted once per PDF change and then read from the text cache
+    for page_text in read_pdf_pages_cached(pdf_path):
+        page_text = page_text.lower()
+        for category, terms in search_terms.items():
+            if found_terms[category] is None:  # Skip if we've already found a term for this category
+                for term in terms:
+                    if term.lower() in page_text:
+                        found_terms[category] = term
+                        # break  # Stop after the first term is found in category
     return found_terms
 
 
-import PyPDF2
+@lru_cache(maxsize=None)
+def _compile_search_terms(search_terms_items):
+    """
+    Compiles the search terms once into lower-cased lookups and one combined regex of all category headers.
+
+    Parameters:
+        search_terms_items (tuple): The search terms as a tuple of (category, tuple of terms) pairs.
+
+    Returns:
+        tuple: The list of (category, lower-cased category, [(term, lower-cased term)]) and the header regex.
+    """
+    categories = [(category, category.lower(), [(term, term.lower()) for term in terms])
+                  for category, terms in search_terms_items]
+    # The lookahead finds a header at every position, so headers that overlap or share a prefix are not missed
+    header_pattern = re.compile('(?=(?:' + '|'.join(re.escape(lower_category)
+                                                      for _, lower_category, _ in categories) + '))')
+    return categories, header_pattern
+
 
 def search_terms_in_pdf(pdf_path, search_terms):
     """
     Searches for specified terms within a PDF file and checks the same or next few lines
     after finding a category, to find the first term for each category.
 
+    Each page is lower-cased once and scanned for all category headers with one combined regex; only the
+    lines with a header are checked further. The pages are extracted lazily (iter_pdf_pages_cached), so once
+    every category has a term the remaining pages are not parsed, not even on a cold cache.
+
     Parameters:
         pdf_path (str): The file path to the PDF document.
         search_terms (dict): A dictionary of terms to search for, organized by category.
@@ -43,70 +72,144 @@ def search_terms_in_pdf(pdf_path, search_terms):
         dict: A dictionary with category as key and the first found term as value.
     """
     found_terms = {category: None for category in search_terms}
-    with open(pdf_path, 'rb') as f:
-        pdf_reader = PyPDF2.PdfReader(f)
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:  # Ensure there's text on the page
-                lines = page_text.split('\n')
-                for i, line in enumerate(lines):
-                    for category in search_terms:
-                        if found_terms[category] is None and category.lower() in line.lower():
-                            # Check the same line and the next few lines for terms
-                            search_window = lines[i:i+3]  # Current line and the next two lines
-                            for term in search_terms[category]:
-                                if any(term.lower() in line.lower() for line in search_window):
-                                    found_terms[category] = term
-                                    break
+    categories, header_pattern = _compile_search_terms(
+        tuple((category, tuple(terms)) for category, terms in search_terms.items()))
+    remaining = len(categories)
+
+    # Page texts are extracted once per PDF change and then read from the text cache, page by page
+    with closing(iter_pdf_pages_cached(pdf_path)) as pages:
+        for page_text in pages if remaining else ():
+            if not page_text:  # Skip empty pages
+                continue
+
+            page_text = page_text.lower()
+            lines = page_text.split('\n')
+
+            # Lines containing at least one category header, in order
+            line_starts = [0]
+            line_starts.extend(match.end() for match in re.finditer('\n', page_text))
+            header_lines = sorted({bisect_right(line_starts, match.start()) - 1
+                                   for match in header_pattern.finditer(page_text)})
+
+            for i in header_lines:
+                line = lines[i]
+                search_window = None
+                for category, lower_category, terms in categories:
+                    if found_terms[category] is None and lower_category in line:
+                        # Check the same line and the next few lines for terms
+                        if search_window is None:
+                            search_window = '\n'.join(lines[i:i + 3])  # Current line and the next two lines
+                        for term, lower_term in terms:
+                            if lower_term in search_window:
+                                found_terms[category] = term
+                                remaining -= 1
+                                break
+                if remaining == 0:
+                    break
+            if remaining == 0:  # Stop once every category is filled, without extracting the remaining pages
+                break
     return found_terms
 
 
+def search_terms_in_pdf_timed(pdf_path, search_terms):
+    """
+    Runs search_terms_in_pdf on one PDF, catching its errors and timing it.
+    Runs either in the calling process or inside a worker process of process_patient_directories.
 
-def process_patient_directories(base_directory, search_terms):
+    Parameters:
+        pdf_path (str): The file path to the PDF document.
+        search_terms (dict): A dictionary of terms to search for, organized by category.
+
+    Returns:
+        tuple: The found terms (None on failure), the error message (None on success) and the time taken in seconds.
+    """
+    start_time = time.perf_counter()
+    try:
+        found_terms, error = search_terms_in_pdf(pdf_path, search_terms), None
+    except Exception as e:
+        found_terms, error = None, str(e)
+    return found_terms, error, time.perf_counter() - start_time
+
+
+def process_patient_directories(base_directory, search_terms, workers=None, return_timings=False):
     """
     Processes all patient directories to search for terms within their PDF files and records findings.
 
+    With workers > 1 the PDFs are spread over a pool of worker processes; the rows keep the same order as
+    in the single-process run. A PDF that fails (e.g. a corrupt file) is reported and skipped instead of
+    aborting the run. With return_timings=True the time taken per PDF is returned as well.
+
     Parameters:
         base_directory (str): The base directory containing patient subdirectories.
         search_terms (dict): A dictionary of terms to search for, organized by category.
+        workers (int, optional): Number of worker processes. None or 1 processes the PDFs in the calling process.
+        return_timings (bool): Also return a DataFrame with the time taken (and the error, if any) per PDF.
 
     Returns:
-        pd.DataFrame: A DataFrame with patient CPR numbers and corresponding found terms.
+        pd.DataFrame: A DataFrame with patient CPR numbers and corresponding found terms
+                      (and the timings DataFrame if return_timings is True).
     """
-    patient_findings = []
-
+    # Collect the PDFs, in patient directory order
+    cprs = []
+    pdf_paths = []
     for patient_dir in os.listdir(base_directory):
         patient_path = os.path.join(base_directory, patient_dir)
         if os.path.isdir(patient_path):
             pdf_files = [f for f in os.listdir(patient_path) if f.endswith('.pdf')]
             for pdf_file in pdf_files:
-                pdf_path = os.path.join(patient_path, pdf_file)
-                found_terms = search_terms_in_pdf(pdf_path, search_terms)
-                patient_findings.append({
-                    'cpr': patient_dir,
-                    **found_terms
-                })
+                cprs.append(patient_dir)
+                pdf_paths.append(os.path.join(patient_path, pdf_file))
+
+    if workers is not None and workers > 1 and len(pdf_paths) > 1:
+        # Fan the PDFs out to a process pool; map() returns the results in submission order
+        chunk_size = max(1, len(pdf_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(search_terms_in_pdf_timed, pdf_paths, repeat(search_terms),
+                                        chunksize=chunk_size))
+    else:
+        results = [search_terms_in_pdf_timed(pdf_path, search_terms) for pdf_path in pdf_paths]
+
+    patient_findings = []
+    timings = []
+    for cpr, pdf_path, (found_terms, error, seconds) in zip(cprs, pdf_paths, results):
+        timings.append({'cpr': cpr, 'pdf_path': pdf_path, 'seconds': seconds, 'error': error})
+        if error is not None:
+            print(f"Failed to read the file {pdf_path}: {error}")
+            continue
+        patient_findings.append({
+            'cpr': cpr,
+            **found_terms
+        })
 
     # Convert the list of dictionaries to a DataFrame
-    return pd.DataFrame(patient_findings)
-
-
-# Example usage:
-base_directory = 'C:\\src\\hospital-ui\\renal_cancer_porject\\data'
-
-# Example usage:
-search_terms = {
-    'Symptomer': ['Hæmaturi', 'Smerte', 'Vægttab', 'Andet'],
-    'Rygning': ['Aktuelt', 'Tidligere', 'Aldrig'],
-    'Forhøjt blodtryk': ['Ja', 'Nej'],
-    'ASA-score': ['1', '2', '>3'],
-    'Performance status': ['0', '1', '2', '3', '4', '5'],
-    'Charlson score': ['0', '1', '2', '3', '4', '5'],
-    'Beslutning truffet i MDT': ['Ja', 'Nej'],
-    'Subtype af RCC': ['Type1', 'Type2'],  # Replace with actual subtypes
-    'Type af kirurgi': ['Ingen', 'Laparoskopi', 'Robot', 'Åben'],
-    'Tilbagefald': ['Ja', 'Nej']
-}
-
-patient_results_df = process_patient_directories(base_directory, search_terms)
-print(patient_results_df)
+    patient_results = pd.DataFrame(patient_findings)
+    if return_timings:
+        return patient_results, pd.DataFrame(timings, columns=['cpr', 'pdf_path', 'seconds', 'error'])
+    return patient_results
+
+
+# The guard is needed for the worker processes (they import this module)
+if __name__ == '__main__':
+    # Example usage:
+    base_directory = 'C:\\src\\hospital-ui\\renal_cancer_porject\\data'
+
+    # Example usage:
+    search_terms = {
+        'Symptomer': ['Hæmaturi', 'Smerte', 'Vægttab', 'Andet'],
+        'Rygning': ['Aktuelt', 'Tidligere', 'Aldrig'],
+        'Forhøjt blodtryk': ['Ja', 'Nej'],
+        'ASA-score': ['1', '2', '>3'],
+        'Performance status': ['0', '1', '2', '3', '4', '5'],
+        'Charlson score': ['0', '1', '2', '3', '4', '5'],
+        'Beslutning truffet i MDT': ['Ja', 'Nej'],
+        'Subtype af RCC': ['Type1', 'Type2'],  # Replace with actual subtypes
+        'Type af kirurgi': ['Ingen', 'Laparoskopi', 'Robot', 'Åben'],
+        'Tilbagefald': ['Ja', 'Nej']
+    }
+
+    patient_results_df, pdf_timings = process_patient_directories(base_directory, search_terms,
+                                                                  workers=os.cpu_count(), return_timings=True)
+    print(patient_results_df)
+
+    # The slowest PDFs
+    print(pdf_timings.sort_values('seconds', ascending=False).head(10))
@@ -1,4 +1,6 @@
 import pandas as pd
+import numpy as np
+import functools
 import traceback
 import os
 import re
@@ -205,6 +207,51 @@ def parse_diagnosis_detail(diagnosis_details, mapping_dict):
     return None, None  # Return a tuple with both elements as None if no match is found
 
 
+# Patterns of the details extracted from the 'Other' text, per output column and code
+other_details_mappings = {
+    "TumorSize": {
+        "ÆTD": {"pattern": r"ÆTD(\d{3})\s*tumordiameter (\d+ mm)", "group": 1}
+    },
+    "Side": {
+        "T71010": {"pattern": "T71010 Højre nyre", "group": 0},
+        "T71020": {"pattern": "T71020 Venstre nyre", "group": 0}
+    },
+    "Karination": {
+        "M09420": {"pattern": "M09420 karinvasion ikke påvist", "group": 0},
+        "M09421": {"pattern": "M09421 karinvasion påvist", "group": 0}
+    },
+    "PapellerTumorType": {
+        "ÆYYY41": {"pattern": "ÆYYY41 type 1", "group": 0},
+        "ÆYYY42": {"pattern": "ÆYYY42 type 2", "group": 0}
+    },
+    "OperationType": {
+        "P306X4": {"pattern": "P306X4 tumorektomi", "group": 0},
+        "P306X0": {"pattern": "P306X0 ektomipraeparat", "group": 0}
+    },
+    "Biopsi": {
+        "P30990": {"pattern": "P30990 nålebiopsi", "group": 0}
+    },
+    "Lymphadenectomy": {
+        "ÆLY007": {"pattern": "ÆLY007 lymfeknuder", "group": 0},
+        "T0857": {"pattern": "T0857", "group": 0},
+        "T0858": {"pattern": "T0858", "group": 0}
+    },
+    "LymphnodesMetastasis": {
+        "ÆLX001": {"pattern": "ÆLX001 lymfeknudemetastaser", "group": 0}
+    },
+    "Rhabdoid": {
+        "ÆYYY0Z": {"pattern": "ÆYYY0Z rhabdoid", "group": 0}
+    }
+}
+
+# The same patterns, compiled once. Every pattern starts with its code, which is checked with a plain
+# substring test before running the regex.
+compiled_other_details = [
+    (key, [(code, re.compile(info["pattern"]), info["group"]) for code, info in sub_mappings.items()])
+    for key, sub_mappings in other_details_mappings.items()
+]
+
+
 def extract_details_from_other(other_text):
     """
     Extracts additional details from the 'Other' text and returns a dictionary of the parsed fields.
@@ -215,58 +262,101 @@ def extract_details_from_other(other_text):
     Returns:
     dict: Dictionary containing parsed data.
     """
-    mappings = {
-        "TumorSize": {
-            "ÆTD": {"pattern": r"ÆTD(\d{3})\s*tumordiameter (\d+ mm)", "group": 1}
-        },
-        "Side": {
-            "T71010": {"pattern": "T71010 Højre nyre", "group": 0},
-            "T71020": {"pattern": "T71020 Venstre nyre", "group": 0}
-        },
-        "Karination": {
-            "M09420": {"pattern": "M09420 karinvasion ikke påvist", "group": 0},
-            "M09421": {"pattern": "M09421 karinvasion påvist", "group": 0}
-        },
-        "PapellerTumorType": {
-            "ÆYYY41": {"pattern": "ÆYYY41 type 1", "group": 0},
-            "ÆYYY42": {"pattern": "ÆYYY42 type 2", "group": 0}
-        },
-        "OperationType": {
-            "P306X4": {"pattern": "P306X4 tumorektomi", "group": 0},
-            "P306X0": {"pattern": "P306X0 ektomipraeparat", "group": 0}
-        },
-        "Biopsi": {
-            "P30990": {"pattern": "P30990 nålebiopsi", "group": 0}
-        },
-        "Lymphadenectomy": {
-            "ÆLY007": {"pattern": "ÆLY007 lymfeknuder", "group": 0},
-            "T0857": {"pattern": "T0857", "group": 0},
-            "T0858": {"pattern": "T0858", "group": 0}
-        },
-        "LymphnodesMetastasis": {
-            "ÆLX001": {"pattern": "ÆLX001 lymfeknudemetastaser", "group": 0}
-        },
-        "Rhabdoid": {
-            "ÆYYY0Z": {"pattern": "ÆYYY0Z rhabdoid", "group": 0}
-        }
-    }
-
     details = {}
-    for key, sub_mappings in mappings.items():
-        for code, info in sub_mappings.items():
-            match = re.search(info["pattern"], other_text)
+    for key, patterns in compiled_other_details:
+        for code, pattern, group in patterns:
+            match = pattern.search(other_text) if code in other_text else None
             if match:
-                details[key] = match.group(info["group"])
+                details[key] = match.group(group)
                 # Optional: remove found data from other_text to avoid duplication
-                other_text = re.sub(info["pattern"], '', other_text)
+                other_text = pattern.sub('', other_text)
             else:
                 details[key] = ''
     details['RemainingTextInOther'] = other_text.strip()  # To store any text that was not matched
     return details
 
 
+def build_code_scanner(mappings):
+    """
+    Builds a scanner that finds all mapped codes in a diagnosis text with one regex pass.
+
+    Parameters:
+    mappings (dict): A dictionary of mappings where each key is a column name and each value is a dictionary
+                     mapping diagnosis codes to descriptive text.
+
+    Returns:
+    dict: 'pattern' (regex finding every code occurrence, overlapping ones included), 'index'
+          (code -> list of (column name, rank of the code within its mapping, description)) and 'prefixes'
+          (code -> the shorter codes it starts with).
+    """
+    index = {}
+    for column_name, mapping_dict in mappings.items():
+        for rank, (code, description) in enumerate(mapping_dict.items()):
+            index.setdefault(code, []).append((column_name, rank, description))
+
+    # Longest codes first; shorter codes that are a prefix of a found code start at the same position
+    codes = sorted(index, key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(re.escape(code) for code in codes) + '))')
+    prefixes = {code: [other for other in codes if other != code and code.startswith(other)] for code in codes}
+    return {'pattern': pattern, 'index': index, 'prefixes': prefixes}
+
 
-def extract_patient_diagnosis_records(patient_df, patient_id, mappings):
+def _codes_in_text(text, scanner):
+    """
+    Finds all mapped codes that occur in a text.
+    """
+    found = set()
+    for code in scanner['pattern'].findall(text):
+        found.add(code)
+        found.update(scanner['prefixes'][code])
+    return found
+
+
+def parse_mapped_details(diagnoser_text, mappings, scanner):
+    """
+    Assigns the mapped value of every column from a diagnosis text, and removes the mapped codes and
+    descriptions from the text.
+
+    Gives the same result as calling parse_diagnosis_detail for every mapping in turn (the first code of a
+    mapping found in the text wins), but the text is scanned once instead of once per code; it is only
+    scanned again after text was removed from it.
+
+    Parameters:
+    diagnoser_text (str): The diagnosis text.
+    mappings (dict): The mappings the scanner was built from.
+    scanner (dict): The scanner built by build_code_scanner.
+
+    Returns:
+    tuple: The mapped value per column name (None if no code was found), and the remaining text.
+    """
+    # The best (first in its mapping) code found per column
+    def best_codes(text):
+        best = {}
+        for code in _codes_in_text(text, scanner):
+            for column_name, rank, description in scanner['index'][code]:
+                if column_name not in best or rank < best[column_name][0]:
+                    best[column_name] = (rank, code, description)
+        return best
+
+    values = {}
+    best = best_codes(diagnoser_text)
+    for column_name in mappings:
+        if column_name not in best:
+            values[column_name] = None
+            continue
+
+        _, code, description = best[column_name]
+        values[column_name] = description
+        remaining_text = diagnoser_text.replace(code, "").replace(description, "")
+        if remaining_text != diagnoser_text:
+            # Removing text can break or join codes, so scan the new text again
+            diagnoser_text = remaining_text
+            best = best_codes(diagnoser_text)
+
+    return values, diagnoser_text
+
+
+def extract_patient_diagnosis_records(patient_df, patient_id, mappings, scanner=None):
     """
     Extracts and compiles key information from the earliest occurrence of specified diagnosis codes in a patient's data.
 
@@ -278,6 +368,7 @@ def extract_patient_diagnosis_records(patient_df, patient_id, mappings):
     patient_df (pd.DataFrame): The DataFrame containing the patient's medical records.
     patient_id (str): The unique identifier for the patient.
     mappings (dict): A dictionary of mappings where each key is a column name and each value is a dictionary mapping diagnosis codes to descriptive text.
+    scanner (dict, optional): The code scanner built by build_code_scanner(mappings); built here if not given.
 
     Returns:
     pd.DataFrame: A DataFrame containing the extracted information, with each row representing the earliest record for a specific diagnosis code.
@@ -285,6 +376,8 @@ def extract_patient_diagnosis_records(patient_df, patient_id, mappings):
     Note:
     This function assumes the existence of 'Diagnoser' (diagnosis details) and 'Modtaget' (received date) columns in the input DataFrame.
     """
+    if scanner is None:
+        scanner = build_code_scanner(mappings)
 
     # Define the list of diagnosis codes to search for.
     diagnosis_codes = [
@@ -294,11 +387,16 @@ def extract_patient_diagnosis_records(patient_df, patient_id, mappings):
         # Additional diagnosis codes can be added here.
     ]
 
+    # Find the diagnosis codes of every row in one pass over the 'Diagnoser' column.
+    diagnosis_pattern = re.compile('(?=(' + '|'.join(re.escape(code) for code in diagnosis_codes) + '))')
+    codes_per_row = patient_df['Diagnoser'].map(
+        lambda text: set(diagnosis_pattern.findall(text)) if isinstance(text, str) else set())
+
     records = []
 
     for code in diagnosis_codes:
         # Filter the DataFrame for rows containing the current diagnosis code.
-        matching_rows = patient_df[patient_df['Diagnoser'].str.contains(code, na=False)]
+        matching_rows = patient_df[codes_per_row.map(lambda row_codes: code in row_codes).astype(bool)]
 
         if not matching_rows.empty:
             # Select the earliest record based on 'Modtaget' column.
@@ -312,12 +410,8 @@ def extract_patient_diagnosis_records(patient_df, patient_id, mappings):
             }
 
             # Extract and assign mapped values; remove mapped text from diagnoser_text.
-            for column_name, mapping_dict in mappings.items():
-                code, extracted_value = parse_diagnosis_detail(diagnoser_text, mapping_dict)
-                record[column_name] = extracted_value
-                if code:
-                    diagnoser_text = diagnoser_text.replace(code, "")
-                    diagnoser_text = diagnoser_text.replace(extracted_value, "")
+            mapped_values, diagnoser_text = parse_mapped_details(diagnoser_text, mappings, scanner)
+            record.update(mapped_values)
 
             # Assign remaining text to 'Other'.
             # record['Other'] = diagnoser_text.strip()
@@ -444,6 +538,107 @@ def split_initial_and_recurrences(merged_records):
     return initial_diagnoses, recurrences
 
 
+def merge_rule_preference(merge_rule_function):
+    """
+    Translates a merge rule function into the value it keeps per episode, so the episodes can be merged as a
+    groupby reduction.
+
+    Parameters:
+    merge_rule_function (function): merge_based_on_date_preference (optionally wrapped in functools.partial
+                                    with use_newest_date) or merge_keep_non_null.
+
+    Returns:
+    str: 'last' (the non-null value with the newest date), 'first' (the non-null value with the oldest date),
+         or None if the rule is not known (the records are then merged one by one).
+    """
+    keywords = {}
+    if isinstance(merge_rule_function, functools.partial) and not merge_rule_function.args:
+        keywords = merge_rule_function.keywords
+        merge_rule_function = merge_rule_function.func
+
+    if merge_rule_function is merge_based_on_date_preference and set(keywords) <= {'use_newest_date'}:
+        return 'last' if keywords.get('use_newest_date', True) else 'first'
+    if merge_rule_function is merge_keep_non_null and not keywords:
+        return 'first'
+    return None
+
+
+def consolidate_cohort_diagnosis_dates(records, mappings, use_newest_date=True, days=60):
+    """
+    Consolidates the diagnosis records of all patients at once and splits them into initial diagnoses and recurrences.
+
+    Gives the same result as calling consolidate_diagnosis_dates (with merge_based_on_date_preference) and
+    split_initial_and_recurrences for every patient in turn:
+    - The records are sorted by patient and date. An episode starts at the first record of a patient and holds
+      every following record less than 'days' days after that first record; the next record starts a new episode.
+    - The mapped columns of an episode hold the non-null value with the newest (or oldest) date, every other
+      column holds the value of the first record of the episode.
+    - The first episode of each patient is the initial diagnosis, the later episodes are recurrences.
+
+    Parameters:
+    records (pd.DataFrame): The records of all patients, as returned by extract_patient_diagnosis_records.
+    mappings (dict): A dictionary of mappings where each key is a column name.
+    use_newest_date (bool): If True, keeps the value associated with the newest date, else the oldest.
+    days (int): Records less than this many days after the start of an episode belong to the episode.
+
+    Returns:
+    tuple of pd.DataFrame: The initial diagnoses and the recurrences.
+    """
+    records = records.copy()
+    records['EarliestDiagnosisDate'] = pd.to_datetime(records['EarliestDiagnosisDate'], dayfirst=True)
+
+    # Sort by patient (in order of appearance) and date; missing dates go last, like in sort_values
+    patient_codes, _ = pd.factorize(records['PatientID'])
+    dates = records['EarliestDiagnosisDate'].to_numpy()
+    missing_dates = pd.isna(dates)
+    order = np.lexsort((dates.view('int64'), missing_dates, patient_codes))
+    records = records.iloc[order].reset_index(drop=True)
+    patient_codes = patient_codes[order]
+    dates = dates[order]
+    missing_dates = missing_dates[order]
+
+    # Walk the episode starts of each patient; the end of an episode is found by binary search
+    limit = np.timedelta64(days, 'D')
+    patient_starts = np.flatnonzero(np.r_[True, patient_codes[1:] != patient_codes[:-1]])
+    patient_ends = np.r_[patient_starts[1:], len(records)]
+    episode_starts = []
+    for start, end in zip(patient_starts, patient_ends):
+        dated_end = start + np.count_nonzero(~missing_dates[start:end])
+        i = start
+        while i < dated_end:
+            episode_starts.append(i)
+            i += 1 + np.searchsorted(dates[i + 1:dated_end], dates[i] + limit, side='left')
+        # Every record without a date is an episode of its own
+        episode_starts.extend(range(dated_end, end))
+
+    episode_starts = np.array(episode_starts, dtype=np.intp)
+    episode_ids = np.repeat(np.arange(len(episode_starts)), np.diff(np.r_[episode_starts, len(records)]))
+
+    # Start from the first record of every episode and merge the mapped columns per episode
+    episodes = records.iloc[episode_starts].reset_index(drop=True)
+    grouped = records.groupby(episode_ids, sort=True)
+    for col in mappings.keys():
+        merged = grouped[col].last() if use_newest_date else grouped[col].first()
+        episodes[col] = merged.to_numpy(dtype=object)
+
+    # Special handling for 'Other' column if it exists
+    if 'Other' in records:
+        sizes = np.diff(np.r_[episode_starts, len(records)])
+        joined = grouped['Other'].agg(lambda values: '; '.join((value or '') for value in values))
+        episodes['Other'] = episodes['Other'].where(sizes == 1, joined.to_numpy())
+
+    # The first episode of each patient is the initial diagnosis (a patient without any date keeps all
+    # its episodes as initial diagnoses, like split_initial_and_recurrences)
+    episode_patients = pd.Series(patient_codes[episode_starts])
+    episode_rank = episode_patients.groupby(episode_patients).cumcount().to_numpy()
+    undated_patient = episodes['EarliestDiagnosisDate'].isna().groupby(episode_patients).transform('all').to_numpy()
+    is_initial = (episode_rank == 0) | undated_patient
+
+    initial_diagnoses = episodes[is_initial].reset_index(drop=True)
+    recurrences = episodes[~is_initial].reset_index(drop=True)
+    return initial_diagnoses, recurrences
+
+
 def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_function):
     """
     Reads and consolidates patient data from Excel files located in subdirectories of a specified data folder.
@@ -453,7 +648,9 @@ def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_fun
     file_name (str): Name of the Excel file to be read from each patient subfolder.
     data_directory (str): Path to the folder containing patient subdirectories.
     mappings (dict): Dictionary of mappings for parsing diagnosis details.
-    merge_rule_function (function): Function defining the rule for merging diagnosis records.
+    merge_rule_function (function): Function defining the rule for merging diagnosis records. The records of all
+                                    patients are consolidated at once for merge_based_on_date_preference and
+                                    merge_keep_non_null, and one patient at a time for any other rule.
 
     Returns:
     tuple: A tuple containing two DataFrames. The first DataFrame ('initial_diagnoses') contains the consolidated
@@ -468,6 +665,13 @@ def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_fun
 
     consolidated_initial_diagnoses = []  # List to store initial diagnoses data from all patients
     consolidated_recurrences = []  # List to store recurrences data from all patients
+    cohort_records = []  # List to store the diagnosis records of all patients
+
+    # Known merge rules are applied to all patients at once
+    preference = merge_rule_preference(merge_rule_function)
+
+    # Compile the code scanner once for all patients
+    scanner = build_code_scanner(mappings)
 
     # Retrieve patient folders
     patient_folders = [folder for folder in os.listdir(data_directory) if
@@ -483,7 +687,16 @@ def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_fun
                 patient_df = pd.read_excel(patient_file_path, header=0)
 
                 # Extract and consolidate patient diagnosis records
-                patient_records = extract_patient_diagnosis_records(patient_df, patient_id, mappings)
+                patient_records = extract_patient_diagnosis_records(patient_df, patient_id, mappings, scanner)
+                if preference is not None:
+                    if not patient_records.empty:
+                        # Parse the dates per patient (like consolidate_diagnosis_dates), so a patient with an
+                        # unparseable date is reported and skipped here instead of failing the whole cohort
+                        patient_records['EarliestDiagnosisDate'] = pd.to_datetime(
+                            patient_records['EarliestDiagnosisDate'], dayfirst=True)
+                        cohort_records.append(patient_records)
+                    continue
+
                 consolidated_records = consolidate_diagnosis_dates(patient_records, mappings, merge_rule_function)
 
                 # Split into initial diagnoses and recurrences
@@ -497,6 +710,13 @@ def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_fun
                 traceback_details = traceback.format_exc()
                 print(f"Error processing file {patient_file_path}: {e}\nTraceback details: {traceback_details}")
 
+    # Consolidate the episodes of all patients in one pass
+    if cohort_records:
+        initial_diagnoses, recurrences = consolidate_cohort_diagnosis_dates(
+            pd.concat(cohort_records, ignore_index=True), mappings, use_newest_date=preference == 'last')
+        consolidated_initial_diagnoses.append(initial_diagnoses)
+        consolidated_recurrences.append(recurrences)
+
     # Combine all initial diagnoses and recurrences into final DataFrames
     final_initial_diagnoses = pd.concat(consolidated_initial_diagnoses, ignore_index=True) if consolidated_initial_diagnoses else pd.DataFrame()
     final_recurrences = pd.concat(consolidated_recurrences, ignore_index=True) if consolidated_recurrences else pd.DataFrame()
@@ -505,12 +725,14 @@ def consolidate_patient_data(file_name, data_directory, mappings, merge_rule_fun
 
 
 
-initial_diagnoses, recurrences = consolidate_patient_data('pato_bank.xlsx',
-                                                          'C:\\src\\hospital-ui\\renal_cancer_porject\\data', mappings, merge_based_on_date_preference)
+if __name__ == '__main__':
+    # Not run when combine.py imports the functions
+    initial_diagnoses, recurrences = consolidate_patient_data('pato_bank.xlsx',
+                                                              'C:\\src\\hospital-ui\\renal_cancer_porject\\data', mappings, merge_based_on_date_preference)
 
-# Save the initial_diagnoses DataFrame to an Excel file
-# initial_diagnoses.to_excel('rcc.xlsx', index=False)
-# initial_diagnoses.to_excel('rcc_new.xlsx', index=False)
+    # Save the initial_diagnoses DataFrame to an Excel file
+    # initial_diagnoses.to_excel('rcc.xlsx', index=False)
+    # initial_diagnoses.to_excel('rcc_new.xlsx', index=False)
 
-# Save the recurrences DataFrame to another Excel file
-# recurrences.to_excel('recurrences.xlsx', index=False)
\ No newline at end of file
+    # Save the recurrences DataFrame to another Excel file
+    # recurrences.to_excel('recurrences.xlsx', index=False)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The scripts of this directory are run from here (e.g. `python blood_test.py`) and import their siblings by
+# name. Importing this module first also puts the repository root on sys.path, so that they can import the shared
+# modules of renal_cancer_porject.utils.
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
@@ -0,0 +1,126 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Analytes of the bladder infection pipeline, matched case-insensitively anywhere in the blood test content
+BLADDER_ANALYTES = ('hæmoglobin', 'leukocytter', 'neutrophilocytter', 'crp', 'kreatinin', 'natrium', 'kalium',
+                    'trombocytter', 'ldh')
+
+# The first number of a value with an optional comparator and a decimal point or comma, e.g. '7,9', '<2,9', '> 90'
+VALUE_PATTERN = r'(?P<comparator>[<>])?\s?(?P<number>\d*[.,]?\d+)'
+
+COMPARATORS = ['<', '>']
+
+
+@lru_cache(maxsize=None)
+def compile_analytes(analytes: Tuple[str, ...]) -> Dict[str, object]:
+    """
+    Compile a list of analyte names into one matcher.
+
+    The matcher is a single regex with one group per analyte, tried in the order of the list, so that the
+    analyte found in a text is the first analyte of the list that occurs in it (like checking
+    `analyte.lower() in text.lower()` for one analyte after the other).
+
+    Parameters:
+    analytes (tuple): The analyte names, e.g. ('crp', 'Leukocytter'). Duplicates are ignored.
+
+    Returns:
+    dict: 'analytes' (the unique names, in the given order) and 'pattern' (the regex, matched against lowercase text).
+    """
+    unique_analytes = list(dict.fromkeys(analytes))
+    branches = '|'.join(f'.*?({re.escape(analyte.lower())})' for analyte in unique_analytes)
+    return {'analytes': unique_analytes, 'pattern': re.compile(f'(?s)^(?:{branches})')}
+
+
+def match_analyte(text: str, analytes: Iterable[str]) -> Optional[str]:
+    """
+    Find the analyte that occurs in a text.
+
+    Parameters:
+    text (str): The text to scan, e.g. the content of a blood test cell.
+    analytes (Iterable[str]): The analyte names, in order of priority.
+
+    Returns:
+    Optional[str]: The first analyte of the list that occurs in the text (case-insensitive), or None.
+    """
+    matcher = compile_analytes(tuple(analytes))
+    match = matcher['pattern'].match(text.lower())
+    if match is None or match.lastindex is None:
+        # No analyte occurs, or there are no analytes (the empty pattern matches without a group)
+        return None
+    return matcher['analytes'][match.lastindex - 1]
+
+
+def parse_value_text(cell_content: str):
+    """
+    Read the value of a single cell the way the renal blood test extractors do: the part after the last ';' and ':',
+    with a decimal comma and without a leading '<'.
+
+    Parameters:
+    cell_content (str): The content of the cell.
+
+    Returns:
+    float or str: The value as a float, or the stripped text if it is no number (e.g. 'Negativ').
+    """
+    value_str = cell_content.split(';')[-1].split(':')[-1].strip()
+    value_str = value_str.replace(',', '.').lstrip('<')
+    try:
+        return float(value_str)
+    except ValueError:
+        return value_str
+
+
+def parse_analytes(content: pd.Series, analytes: Iterable[str] = BLADDER_ANALYTES,
+                   value_dtype=np.float32) -> pd.DataFrame:
+    """
+    Parse a column of blood test contents ('name;value', e.g. 'Hæmoglobin;B;7,9') into typed analyte values.
+
+    Every distinct content is parsed once, with vectorised string operations over the distinct contents:
+    - 'name' and 'value_text' are split at the first ';' (str.split(expand=True)).
+    - 'analyte' is the first analyte of the list that occurs in the content, found with one precompiled regex.
+    - 'comparator' and 'value' come from one str.extract of the first number in 'value_text', with a decimal
+      comma read as a decimal point.
+
+    Parameters:
+    content (pd.Series): The blood test contents.
+    analytes (Iterable[str]): The analyte names to look for, in order of priority.
+    value_dtype (dtype): The dtype of 'value'. Use np.float64 for values that are written out (e.g. to Excel):
+                         a float32 such as 7.9 widens to 7.900000095367432.
+
+    Returns:
+    pd.DataFrame: Indexed like 'content', with the columns 'name' (str), 'value_text' (str, missing without a ';'),
+                  'analyte' (categorical, NaN if no analyte occurs), 'comparator' (categorical '<' or '>', NaN
+                  if none) and 'value' (value_dtype, NaN if there is no number).
+    """
+    matcher = compile_analytes(tuple(analytes))
+    codes, texts = pd.factorize(content.map(str).to_numpy(dtype=object))
+    texts = pd.Series(texts, dtype=object)
+
+    # Name and value at the first ';' (object columns, also when no content has a ';' or there is no content)
+    parts = texts.str.split(';', n=1, expand=True).reindex(columns=[0, 1]).astype(object)
+
+    # Analyte: the number of the first matching group of the precompiled pattern
+    if matcher['analytes'] and len(texts):
+        groups = texts.str.lower().str.extract(matcher['pattern'], expand=True)
+        found = groups.notna().to_numpy()
+        analyte_codes = np.where(found.any(axis=1), found.argmax(axis=1), -1)
+    else:
+        analyte_codes = np.full(len(texts), -1)
+
+    # Comparator and number, with a decimal comma
+    values = parts[1].str.extract(VALUE_PATTERN, expand=True)
+    numbers = pd.to_numeric(values['number'].str.replace(',', '.', regex=False), errors='coerce')
+    comparator_codes = values['comparator'].map({comparator: i for i, comparator in enumerate(COMPARATORS)})
+
+    # Spread the parsed distinct contents over the rows
+    return pd.DataFrame({
+        'name': parts[0].to_numpy(dtype=object)[codes],
+        'value_text': parts[1].to_numpy(dtype=object)[codes],
+        'analyte': pd.Categorical.from_codes(analyte_codes[codes], categories=matcher['analytes']),
+        'comparator': pd.Categorical.from_codes(comparator_codes.fillna(-1).to_numpy(dtype=int)[codes],
+                                                categories=COMPARATORS),
+        'value': numbers.to_numpy(dtype=value_dtype)[codes]
+    }, index=content.index)
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import hashlib
+import pandas as pd
+from typing import Dict, Optional
+
+# Default location of the on-disk cache. It is kept outside the patient data folder so the cache
+# directory never shows up as a patient directory when listing 'HospitalData'.
+DEFAULT_CACHE_DIR = os.environ.get('HOSPITAL_UI_EXCEL_CACHE', '.excel_cache')
+
+# Hit/miss counters for the current process
+_cache_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'write_errors': 0}
+
+
+def _cache_key(filepath: str, read_kwargs: dict) -> str:
+    """
+    Build the cache key for a source file and the options used to read it.
+
+    Parameters:
+    filepath (str): Path to the Excel file.
+    read_kwargs (dict): Keyword arguments passed to pd.read_excel.
+
+    Returns:
+    str: A hex digest identifying the cache entry.
+    """
+    source = os.path.abspath(filepath)
+    options = repr(sorted(read_kwargs.items()))
+    return hashlib.sha1(f"{source}|{options}".encode('utf-8')).hexdigest()
+
+
+def _write_entry(df: pd.DataFrame, cache_dir: str, key: str, meta: dict) -> None:
+    """
+    Write a DataFrame and its metadata to the cache.
+
+    The DataFrame is stored as Parquet when possible. Frames that Parquet cannot represent (mixed-type
+    columns, non-string headers, pyarrow not installed) are stored as a pickle instead.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    base = os.path.join(cache_dir, key)
+    tmp_suffix = f".{os.getpid()}.tmp"
+
+    try:
+        df.to_parquet(base + '.parquet' + tmp_suffix, index=False)
+        os.replace(base + '.parquet' + tmp_suffix, base + '.parquet')
+        meta['format'] = 'parquet'
+    except Exception:
+        if os.path.exists(base + '.parquet' + tmp_suffix):
+            os.remove(base + '.parquet' + tmp_suffix)
+        df.to_pickle(base + '.pkl' + tmp_suffix)
+        os.replace(base + '.pkl' + tmp_suffix, base + '.pkl')
+        meta['format'] = 'pkl'
+
+    # Write the metadata last, so a partially written entry is never treated as valid
+    with open(base + '.json' + tmp_suffix, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(base + '.json' + tmp_suffix, base + '.json')
+
+
+def read_excel_cached(filepath: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, **read_kwargs) -> pd.DataFrame:
+    """
+    Read an Excel file through the on-disk cache.
+
+    The cache entry is keyed by the absolute path of the file and the read options, and is only used
+    while the size and modification time of the file are unchanged. On a miss the file is decoded with
+    pd.read_excel and the result is stored for the next run.
+
+    Parameters:
+    filepath (str): Path to the Excel file.
+    cache_dir (str, optional): Directory holding the cache. If None, the file is read without caching.
+    **read_kwargs: Keyword arguments passed on to pd.read_excel.
+
+    Returns:
+    pd.DataFrame: The content of the Excel file.
+    """
+    if cache_dir is None:
+        return pd.read_excel(filepath, **read_kwargs)
+
+    stat = os.stat(filepath)
+    key = _cache_key(filepath, read_kwargs)
+    base = os.path.join(cache_dir, key)
+
+    # Try the cache first
+    try:
+        with open(base + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+            if meta['format'] == 'parquet':
+                df = pd.read_parquet(base + '.parquet')
+            else:
+                df = pd.read_pickle(base + '.pkl')
+            _cache_stats['hits'] += 1
+            return df
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Cache miss: decode the Excel file and store it
+    _cache_stats['misses'] += 1
+    df = pd.read_excel(filepath, **read_kwargs)
+
+    meta = {
+        'source': os.path.abspath(filepath),
+        'options': repr(sorted(read_kwargs.items())),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'created': time.time()
+    }
+    try:
+        _write_entry(df, cache_dir, key, meta)
+        _cache_stats['writes'] += 1
+    except Exception as e:
+        # A failing cache must never break the pipeline
+        _cache_stats['write_errors'] += 1
+        print(f"Failed to cache the file {filepath}: {e}")
+
+    return df
+
+
+def excel_cache_stats() -> Dict[str, int]:
+    """
+    Return the cache hit/miss counters of the current process.
+
+    Returns:
+    Dict[str, int]: Counts of 'hits', 'misses', 'writes' and 'write_errors'.
+    """
+    return dict(_cache_stats)
+
+
+def add_excel_cache_stats(counts: Dict[str, int]) -> None:
+    """
+    Add counts to the cache hit/miss counters, e.g. the counts reported back by worker processes.
+
+    Parameters:
+    counts (Dict[str, int]): Counts keyed like the result of excel_cache_stats().
+    """
+    for key, value in counts.items():
+        _cache_stats[key] = _cache_stats.get(key, 0) + value
+
+
+def reset_excel_cache_stats() -> None:
+    """
+    Reset the cache hit/miss counters of the current process.
+    """
+    for key in _cache_stats:
+        _cache_stats[key] = 0
+
+
+def inspect_excel_cache(cache_dir: str = DEFAULT_CACHE_DIR) -> pd.DataFrame:
+    """
+    List the entries of the cache.
+
+    Parameters:
+    cache_dir (str): Directory holding the cache.
+
+    Returns:
+    pd.DataFrame: One row per cache entry with the source file, read options, storage format,
+                  size on disk, creation time and whether the entry is stale (source changed or removed).
+    """
+    columns = ['key', 'source', 'options', 'format', 'cache_bytes', 'created', 'stale']
+    if not os.path.isdir(cache_dir):
+        return pd.DataFrame(columns=columns)
+
+    entries = []
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        key = file_name[:-len('.json')]
+        try:
+            with open(os.path.join(cache_dir, file_name), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        data_path = os.path.join(cache_dir, f"{key}.{meta.get('format')}")
+        try:
+            stat = os.stat(meta['source'])
+            stale = stat.st_size != meta['size'] or stat.st_mtime_ns != meta['mtime_ns']
+        except OSError:
+            stale = True
+
+        entries.append({
+            'key': key,
+            'source': meta.get('source'),
+            'options': meta.get('options'),
+            'format': meta.get('format'),
+            'cache_bytes': os.path.getsize(data_path) if os.path.isfile(data_path) else 0,
+            'created': pd.to_datetime(meta.get('created'), unit='s'),
+            'stale': stale or not os.path.isfile(data_path)
+        })
+
+    return pd.DataFrame(entries, columns=columns)
+
+
+def prune_excel_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_age_days: Optional[float] = None) -> int:
+    """
+    Remove stale entries from the cache.
+
+    An entry is stale if its source file was changed or removed. Entries older than max_age_days are
+    removed as well, and so are leftover files without metadata (e.g. from an interrupted write).
+
+    Parameters:
+    cache_dir (str): Directory holding the cache.
+    max_age_days (float, optional): Also remove entries created more than this many days ago.
+
+    Returns:
+    int: The number of files removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = inspect_excel_cache(cache_dir)
+    expired = entries['stale']
+    if max_age_days is not None and not entries.empty:
+        expired = expired | (entries['created'] < pd.Timestamp.now() - pd.Timedelta(days=max_age_days))
+    keep = set(entries.loc[~expired, 'key'])
+
+    removed = 0
+    for file_name in os.listdir(cache_dir):
+        if file_name.split('.')[0] not in keep:
+            os.remove(os.path.join(cache_dir, file_name))
+            removed += 1
+
+    return removed
@@ -1,9 +1,15 @@
 import os
 import pandas as pd
-from typing import Dict, Callable, Optional
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Callable, Optional, Tuple
 
+from renal_cancer_porject.utils.excel_cache import (DEFAULT_CACHE_DIR, read_excel_cached, excel_cache_stats,
+                                                    add_excel_cache_stats)
 
-def read_excel_data_from_folders(file: str, data_folder_path: str) -> Dict[str, pd.DataFrame]:
+
+def read_excel_data_from_folders(file: str, data_folder_path: str,
+                                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Dict[str, pd.DataFrame]:
     """
     Reads an Excel file from each subdirectory of the specified data folder,
     and stores them in a dictionary with keys formatted as '<patient_id>_<filename>'.
@@ -11,6 +17,7 @@ def read_excel_data_from_folders(file: str, data_folder_path: str) -> Dict[str,
     Parameters:
     file (str): The name of the Excel file to read from each subfolder.
     data_folder_path (str): The path to the data folder containing patient subdirectories. Defaults to 'HospitalData'.
+    cache_dir (str, optional): Directory of the on-disk Excel cache. Set to None to always decode the Excel files.
 
     Returns:
     Dict[str, pd.DataFrame]: A dictionary with patient IDs as keys and corresponding DataFrames as values.
@@ -34,8 +41,8 @@ def read_excel_data_from_folders(file: str, data_folder_path: str) -> Dict[str,
             # Check if the file exists and is a file
             if os.path.isfile(filepath):
                 try:
-                    # Read the Excel file into a DataFrame
-                    df = pd.read_excel(filepath, header=0)
+                    # Read the Excel file into a DataFrame (through the on-disk cache)
+                    df = read_excel_cached(filepath, cache_dir=cache_dir, header=0)
                     # Add the DataFrame to the dictionary with a unique key
                     data[f"{patient_id}_{file}"] = df
                 except Exception as e:
@@ -44,13 +51,15 @@ def read_excel_data_from_folders(file: str, data_folder_path: str) -> Dict[str,
     return data
 
 
-def read_excel_data_into_dataframe(file: str, data_folder_path: str) -> pd.DataFrame:
+def read_excel_data_into_dataframe(file: str, data_folder_path: str,
+                                   cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> pd.DataFrame:
     """
     Read Excel files from patient folders within the specified data folder into a single DataFrame.
 
     Parameters:
     file (str): The name of the Excel file to read from each subfolder.
     data_folder_path (str): The path to the data folder containing patient subdirectories. Defaults to 'HospitalData'.
+    cache_dir (str, optional): Directory of the on-disk Excel cache. Set to None to always decode the Excel files.
 
     Returns:
     pd.DataFrame: A DataFrame containing data from all Excel files, with an additional 'cpr' column for patient IDs.
@@ -77,8 +86,8 @@ def read_excel_data_into_dataframe(file: str, data_folder_path: str) -> pd.DataF
         filepath = os.path.join(patient_directory, file)
         if os.path.isfile(filepath):
             try:
-                # Read Excel file into DataFrame
-                df = pd.read_excel(filepath, header=0)
+                # Read Excel file into DataFrame (through the on-disk cache)
+                df = read_excel_cached(filepath, cache_dir=cache_dir, header=0)
 
                 # Add cpr column
                 df.insert(0, 'cpr', cpr)
@@ -97,19 +106,67 @@ def read_excel_data_into_dataframe(file: str, data_folder_path: str) -> pd.DataF
         return pd.DataFrame()
 
 
+def _read_and_process_patient_file(
+        filepath: str,
+        cpr: str,
+        operation_callback: Optional[Callable[[pd.DataFrame, str], pd.DataFrame]],
+        cache_dir: Optional[str]
+) -> Tuple[Optional[pd.DataFrame], Optional[str], Dict[str, int]]:
+    """
+    Read one patient's Excel file, add the 'cpr' column and apply the callback.
+    Runs either in the calling process or inside a worker process of read_process_and_combine_excel_data.
+
+    Parameters:
+    filepath (str): Path to the patient's Excel file.
+    cpr (str): The patient ID (name of the patient folder).
+    operation_callback (Callable[[pd.DataFrame, str], pd.DataFrame], optional): A function to apply to the DataFrame.
+    cache_dir (str, optional): Directory of the on-disk Excel cache.
+
+    Returns:
+    tuple: The processed DataFrame (None on failure), the error message (None on success)
+           and the cache hit/miss counts of this call.
+    """
+    stats_before = excel_cache_stats()
+    try:
+        # Read Excel file into DataFrame (through the on-disk cache)
+        df = read_excel_cached(filepath, cache_dir=cache_dir, header=0)
+
+        # Add cpr column
+        df.insert(0, 'cpr', cpr)
+
+        # If a callback operation is provided, apply it
+        if operation_callback:
+            df = operation_callback(df, cpr)
+        error = None
+    except Exception as e:
+        df, error = None, str(e)
+
+    stats_after = excel_cache_stats()
+    return df, error, {key: stats_after[key] - stats_before[key] for key in stats_after}
+
+
 def read_process_and_combine_excel_data(
         file: str,
         data_folder_path: str,
-        operation_callback: Optional[Callable[[pd.DataFrame, str], pd.DataFrame]] = None
+        operation_callback: Optional[Callable[[pd.DataFrame, str], pd.DataFrame]] = None,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        workers: Optional[int] = None
 ) -> pd.DataFrame:
     """
     Read Excel files from patient folders within the specified data folder into a single DataFrame.
     Optionally apply a callback operation on each DataFrame.
 
+    With workers > 1 the patient files are read and processed by a pool of worker processes. The result
+    has the same row order and the same per-file error reporting as the single-process run. The callback
+    must then be picklable (a module-level function), and on Windows the calling script must be guarded
+    by `if __name__ == '__main__':`.
+
     Parameters:
     file (str): The name of the Excel file to read from each subfolder.
     data_folder_path (str): The path to the data folder containing patient subdirectories. Defaults to 'HospitalData'.
     operation_callback (Callable[[pd.DataFrame, str], pd.DataFrame], optional): A function to apply to each DataFrame.
+    cache_dir (str, optional): Directory of the on-disk Excel cache. Set to None to always decode the Excel files.
+    workers (int, optional): Number of worker processes. None or 1 processes the files in the calling process.
 
     Returns:
     pd.DataFrame: A DataFrame containing data from all Excel files, with an additional 'cpr' column for patient IDs.
@@ -121,35 +178,41 @@ def read_process_and_combine_excel_data(
     if not os.path.exists(data_folder_path):
         raise FileNotFoundError(f"Data folder does not exist: {data_folder_path}")
 
-    # List to store individual DataFrames
-    data_frames = []
-
     # Patient directories
     patient_dirs = [dir_name for dir_name in os.listdir(data_folder_path) if
                     os.path.isdir(os.path.join(data_folder_path, dir_name))]
 
-    # Iterate through patient directories
+    # Collect the files to read, in patient directory order
+    cprs = []
+    filepaths = []
     for cpr in patient_dirs:
-        patient_directory = os.path.join(data_folder_path, cpr)
-
-        # Read specific file
-        filepath = os.path.join(patient_directory, file)
+        filepath = os.path.join(data_folder_path, cpr, file)
         if os.path.isfile(filepath):
-            try:
-                # Read Excel file into DataFrame
-                df = pd.read_excel(filepath, header=0)
-
-                # Add cpr column
-                df.insert(0, 'cpr', cpr)
-
-                # If a callback operation is provided, apply it
-                if operation_callback:
-                    df = operation_callback(df, cpr)
+            cprs.append(cpr)
+            filepaths.append(filepath)
+
+    used_pool = workers is not None and workers > 1 and len(filepaths) > 1
+    if used_pool:
+        # Fan the files out to a process pool; map() returns the results in submission order
+        chunk_size = max(1, len(filepaths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_read_and_process_patient_file, filepaths, cprs,
+                                        repeat(operation_callback), repeat(cache_dir), chunksize=chunk_size))
+    else:
+        results = [_read_and_process_patient_file(filepath, cpr, operation_callback, cache_dir)
+                   for filepath, cpr in zip(filepaths, cprs)]
 
-                # Append the DataFrame to the data_frames list
-                data_frames.append(df)
-            except Exception as e:
-                print(f"Failed to read the file {filepath}: {e}")
+    # List to store individual DataFrames
+    data_frames = []
+    for filepath, (df, error, stats) in zip(filepaths, results):
+        if used_pool:
+            # Counters of the worker processes are not visible here, so add them up (the files read in this
+            # process are counted already)
+            add_excel_cache_stats(stats)
+        if error is not None:
+            print(f"Failed to read the file {filepath}: {error}")
+        else:
+            data_frames.append(df)
 
     # Concatenate all the data_frames into a single DataFrame
     if data_frames:
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Iterator, List, Optional
+
+import PyPDF2
+
+# Default location of the on-disk cache, kept outside the patient data folder like the Excel cache
+DEFAULT_PDF_CACHE_DIR = os.environ.get('HOSPITAL_UI_PDF_CACHE', '.pdf_text_cache')
+
+# Hit/miss counters for the current process
+_cache_stats = {'hits': 0, 'misses': 0, 'write_errors': 0}
+
+
+def _cache_key(pdf_path: str) -> str:
+    """
+    Build the cache key for a PDF file.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+
+    Returns:
+    str: A hex digest identifying the cache entry.
+    """
+    return hashlib.sha1(os.path.abspath(pdf_path).encode('utf-8')).hexdigest()
+
+
+def _extract_pages(pdf_path: str) -> List[str]:
+    """
+    Extract the text of every page of a PDF file with PyPDF2 (pages without text give '').
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+
+    Returns:
+    List[str]: The text of each page.
+    """
+    with open(pdf_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [page.extract_text() or '' for page in pdf_reader.pages]
+
+
+def _build_offsets(pages: List[str]) -> Dict[str, list]:
+    """
+    Compute the page and line offsets of the extracted pages.
+
+    Parameters:
+    pages (List[str]): The text of each page.
+
+    Returns:
+    Dict[str, list]: 'page_offsets': start of each page in the pages joined with '\\n',
+                     'line_offsets': for each page, the start of each of its lines within the page.
+    """
+    page_offsets = []
+    line_offsets = []
+    offset = 0
+    for page_text in pages:
+        page_offsets.append(offset)
+        starts = [0]
+        position = page_text.find('\n')
+        while position != -1:
+            starts.append(position + 1)
+            position = page_text.find('\n', position + 1)
+        line_offsets.append(starts)
+        offset += len(page_text) + 1
+
+    return {'page_offsets': page_offsets, 'line_offsets': line_offsets}
+
+
+def _load_entry(entry_path: str, stat: os.stat_result) -> Optional[dict]:
+    """
+    Load a cache entry if it is still valid for the file.
+
+    Parameters:
+    entry_path (str): Path to the cache entry.
+    stat (os.stat_result): The current stat of the PDF file.
+
+    Returns:
+    Optional[dict]: The entry, or None if there is none or the size or modification time of the file changed.
+    """
+    try:
+        with open(entry_path, encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _store_entry(pdf_path: str, entry_path: str, stat: os.stat_result, pages: List[str], complete: bool):
+    """
+    Store the extracted pages of a PDF file (the leading pages only if not complete) in the cache.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    entry_path (str): Path to the cache entry.
+    stat (os.stat_result): The stat of the PDF file the pages were extracted from.
+    pages (List[str]): The text of each extracted page.
+    complete (bool): Whether every page of the file was extracted.
+    """
+    entry = {
+        'source': os.path.abspath(pdf_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'created': time.time(),
+        'complete': complete,
+        'pages': pages,
+        **_build_offsets(pages)
+    }
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+    except OSError as e:
+        # A failing cache must never break the pipeline
+        _cache_stats['write_errors'] += 1
+        print(f"Failed to cache the text of {pdf_path}: {e}")
+
+
+def read_pdf_text_cached(pdf_path: str, cache_dir: Optional[str] = DEFAULT_PDF_CACHE_DIR) -> Dict[str, list]:
+    """
+    Read the extracted text of a PDF file through the on-disk cache.
+
+    The cache entry is keyed by the absolute path of the file and is only used while the size and
+    modification time of the file are unchanged. On a miss (or an entry with the leading pages only, see
+    iter_pdf_pages_cached) the pages are extracted with PyPDF2 and stored for the next run.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    cache_dir (str, optional): Directory holding the cache. If None, the text is extracted without caching.
+
+    Returns:
+    Dict[str, list]: 'pages' (the text of each page), 'page_offsets' and 'line_offsets' (see _build_offsets).
+    """
+    if cache_dir is None:
+        pages = _extract_pages(pdf_path)
+        return {'pages': pages, **_build_offsets(pages)}
+
+    stat = os.stat(pdf_path)
+    entry_path = os.path.join(cache_dir, _cache_key(pdf_path) + '.json')
+
+    # Try the cache first
+    entry = _load_entry(entry_path, stat)
+    if entry is not None and entry.get('complete', True):
+        _cache_stats['hits'] += 1
+        return {'pages': entry['pages'], 'page_offsets': entry['page_offsets'],
+                'line_offsets': entry['line_offsets']}
+
+    # Cache miss: extract the text and store it
+    _cache_stats['misses'] += 1
+    pages = _extract_pages(pdf_path)
+    _store_entry(pdf_path, entry_path, stat, pages, complete=True)
+    return {'pages': pages, **_build_offsets(pages)}
+
+
+def read_pdf_pages_cached(pdf_path: str, cache_dir: Optional[str] = DEFAULT_PDF_CACHE_DIR) -> List[str]:
+    """
+    Read the text of every page of a PDF file through the on-disk cache.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    cache_dir (str, optional): Directory holding the cache. If None, the text is extracted without caching.
+
+    Returns:
+    List[str]: The text of each page.
+    """
+    return read_pdf_text_cached(pdf_path, cache_dir)['pages']
+
+
+def iter_pdf_pages_cached(pdf_path: str, cache_dir: Optional[str] = DEFAULT_PDF_CACHE_DIR) -> Iterator[str]:
+    """
+    Yield the text of the pages of a PDF file one by one through the on-disk cache.
+
+    Unlike read_pdf_pages_cached, a page that is not cached is only extracted when the caller asks for it, so a
+    caller that stops early (e.g. once every search term is found) does not parse the rest of the PDF. The
+    pages extracted so far are added to the cache entry when the caller stops or the last page is reached; an
+    entry with the leading pages only is continued from its last page on the next read. Close the generator
+    (e.g. with contextlib.closing) to store the pages right away when stopping early.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    cache_dir (str, optional): Directory holding the cache. If None, the text is extracted without caching.
+
+    Yields:
+    str: The text of each page, in order.
+    """
+    if cache_dir is None:
+        with open(pdf_path, 'rb') as f:
+            for page in PyPDF2.PdfReader(f).pages:
+                yield page.extract_text() or ''
+        return
+
+    stat = os.stat(pdf_path)
+    entry_path = os.path.join(cache_dir, _cache_key(pdf_path) + '.json')
+
+    # Try the cache first
+    entry = _load_entry(entry_path, stat)
+    pages = entry['pages'] if entry is not None else []
+    if entry is not None and entry.get('complete', True):
+        _cache_stats['hits'] += 1
+        yield from pages
+        return
+
+    # Cache miss: the cached leading pages, then the other pages extracted on demand
+    _cache_stats['misses'] += 1
+    cached_count = len(pages)
+    complete = False
+    try:
+        yield from pages[:cached_count]
+        with open(pdf_path, 'rb') as f:
+            pdf_reader = PyPDF2.PdfReader(f)
+            for page_number in range(cached_count, len(pdf_reader.pages)):
+                pages.append(pdf_reader.pages[page_number].extract_text() or '')
+                yield pages[-1]
+        complete = True
+    finally:
+        if complete or len(pages) > cached_count:
+            _store_entry(pdf_path, entry_path, stat, pages, complete)
+
+
+def pdf_cache_stats() -> Dict[str, int]:
+    """
+    Return the cache hit/miss counters of the current process.
+
+    Returns:
+    Dict[str, int]: Counts of 'hits', 'misses' and 'write_errors'.
+    """
+    return dict(_cache_stats)
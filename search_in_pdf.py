@@ -1,8 +1,9 @@
 import os
-import PyPDF2
 import tkinter as tk
 from tkinter import ttk
 
+from renal_cancer_porject.utils.pdf_text_cache import read_pdf_pages_cached
+
 data = ''
 
 
@@ -21,14 +22,11 @@ def load_patient_data():
     # Clear the search results and show the PDF file contents
     global page_texts
     page_texts = []
-    with open(pdf_path, 'rb') as f:
-        pdf_reader = PyPDF2.PdfReader(f)
-        num_pages = len(pdf_reader.pages)
-        for page_num in range(num_pages):
-            page = pdf_reader.pages[page_num]
-            page_text = "\n------------------------------------------------------------\n" \
-                        + page.extract_text()
-            page_texts.append(page_text)
+    # The page texts are extracted once per PDF change and then read from the text cache
+    for page_text in read_pdf_pages_cached(pdf_path):
+        page_text = "\n------------------------------------------------------------\n" \
+                    + page_text
+        page_texts.append(page_text)
     all_text = '\n'.join(page_texts)
     results_text.delete('1.0', 'end')
     results_text.insert('end', all_text)
@@ -0,0 +1,234 @@
+import os
+import pickle
+import pandas as pd
+
+# Location of the persistent index, next to the 'HospitalData' folder
+DEFAULT_INDEX_PATH = os.environ.get('HOSPITAL_UI_SEARCH_INDEX', '.search_index.pkl')
+
+# Bump when the layout of the index changes, so old index files are rebuilt
+INDEX_VERSION = 1
+
+# Length of the substrings (n-grams) stored in the index
+GRAM_SIZE = 3
+
+
+def _cell_texts(df):
+    """
+    Convert the cells of a DataFrame to the strings the search matches against, in row-major order.
+
+    The strings are the same as row.astype(str) gives when the frame is searched row by row: rows of an
+    all-numeric frame are upcast to a common type (e.g. ints become floats), other frames keep the value of
+    each cell. Empty cells are never matched and are stored as None.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame.
+
+    Returns:
+    list: One string (or None) per cell.
+    """
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        values = df.to_numpy()
+    else:
+        values = df.astype(object).to_numpy()
+    return [None if pd.isna(value) else str(value) for value in values.ravel()]
+
+
+def _build_document(filepath):
+    """
+    Read one Excel file and index its cells.
+
+    Parameters:
+    filepath (str): Path to the Excel file.
+
+    Returns:
+    dict: The indexed file with its 'columns', cell 'texts' (row-major) and 'grams'
+          (n-gram -> list of cell numbers; cell number = row * number of columns + column).
+    """
+    df = pd.read_excel(filepath, header=0)
+    texts = _cell_texts(df)
+
+    grams = {}
+    for cell_number, text in enumerate(texts):
+        if text is None:
+            continue
+        for gram in {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}:
+            grams.setdefault(gram, []).append(cell_number)
+
+    return {'columns': list(df.columns), 'texts': texts, 'grams': grams}
+
+
+def load_search_index(index_path=DEFAULT_INDEX_PATH):
+    """
+    Load the index from disk, or return an empty index if there is none (or it is outdated or unreadable).
+
+    Parameters:
+    index_path (str): Path of the index file.
+
+    Returns:
+    dict: The index.
+    """
+    try:
+        with open(index_path, 'rb') as f:
+            index = pickle.load(f)
+        if index.get('version') == INDEX_VERSION:
+            return index
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    return {'version': INDEX_VERSION, 'documents': {}, 'order': []}
+
+
+def save_search_index(index, index_path=DEFAULT_INDEX_PATH):
+    """
+    Write the index to disk. The file is replaced in one step, so an interrupted write never leaves a
+    broken index behind.
+
+    Parameters:
+    index (dict): The index.
+    index_path (str): Path of the index file.
+    """
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+
+
+def update_search_index(index, data_folder_path='HospitalData', excluded_files=('blood_test.xlsx',),
+                        progress=None, cancel_event=None):
+    """
+    Bring the index up to date with the Excel files in the patient folders.
+
+    Only files that are new or changed (size or modification time) are read; entries of removed files
+    are dropped.
+
+    Parameters:
+    index (dict): The index, as returned by load_search_index.
+    data_folder_path (str): The path to the data folder containing patient subdirectories.
+    excluded_files (tuple): File names that are not indexed.
+    progress (callable, optional): Called as progress(files_done, files_total) after every file.
+    cancel_event (threading.Event, optional): When set, the update stops after the current file. The files
+                                              indexed so far are kept and the files not reached yet keep
+                                              their previous entries; removed files are dropped either way.
+
+    Returns:
+    bool: True if the index was changed.
+    """
+    documents = index['documents']
+    changed = False
+
+    # Collect the files first, so the progress can be reported against the total
+    files = []
+    patient_dirs = [dir_name for dir_name in os.listdir(data_folder_path) if
+                    os.path.isdir(os.path.join(data_folder_path, dir_name))]
+    for patient_id in patient_dirs:
+        patient_directory = os.path.join(data_folder_path, patient_id)
+        excel_files = [f for f in os.listdir(patient_directory) if f.endswith('.xlsx') and f not in excluded_files]
+        files.extend((patient_id, file) for file in excel_files)
+
+    order = []
+    for files_done, (patient_id, file) in enumerate(files, start=1):
+        if cancel_event is not None and cancel_event.is_set():
+            # Keep the previous entries of the files that were not reached
+            for remaining_id, remaining_file in files[files_done - 1:]:
+                if f"{remaining_id}_{remaining_file}" in documents:
+                    order.append(f"{remaining_id}_{remaining_file}")
+            break
+
+        filepath = os.path.join(data_folder_path, patient_id, file)
+        doc_key = f"{patient_id}_{file}"
+        stat = os.stat(filepath)
+
+        document = documents.get(doc_key)
+        if document is None or document['size'] != stat.st_size or document['mtime_ns'] != stat.st_mtime_ns:
+            try:
+                document = _build_document(filepath)
+                document.update({'patient_id': patient_id, 'file': file,
+                                 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+                documents[doc_key] = document
+                changed = True
+            except Exception as e:
+                print(f"Failed to index the file {filepath}: {e}")
+                document = None
+        if document is not None:
+            order.append(doc_key)
+
+        if progress is not None:
+            progress(files_done, len(files))
+
+    # Drop the files that no longer exist
+    for doc_key in set(documents) - set(order):
+        del documents[doc_key]
+        changed = True
+
+    if order != index['order']:
+        index['order'] = order
+        changed = True
+
+    return changed
+
+
+def iter_search_index(index, keyword, progress=None, cancel_event=None):
+    """
+    Look up a keyword in the index (case-sensitive substring match, like str.contains(keyword, regex=False)),
+    yielding the matches file by file. Only the matching rows are built for display.
+
+    Parameters:
+    index (dict): The index.
+    keyword (str): The keyword to search for.
+    progress (callable, optional): Called as progress(files_done, files_total) after every file.
+    cancel_event (threading.Event, optional): When set, the search stops after the current file.
+
+    Yields:
+    tuple: (doc_key, rows) for every file with matches, in folder order. 'doc_key' is
+           '<patient_id>_<filename>' and 'rows' is a DataFrame with the matching rows (cell values as strings).
+    """
+    grams = [keyword[i:i + GRAM_SIZE] for i in range(len(keyword) - GRAM_SIZE + 1)]
+    order = [doc_key for doc_key in index['order'] if doc_key in index['documents']]
+
+    for files_done, doc_key in enumerate(order, start=1):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+
+        document = index['documents'][doc_key]
+        texts = document['texts']
+
+        if grams:
+            # Cells containing every n-gram of the keyword are candidates
+            candidates = None
+            for gram in grams:
+                cells = document['grams'].get(gram)
+                if cells is None:
+                    candidates = ()
+                    break
+                candidates = set(cells) if candidates is None else candidates.intersection(cells)
+                if not candidates:
+                    break
+        else:
+            # Keywords shorter than an n-gram are matched against all cells
+            candidates = range(len(texts))
+
+        n_columns = len(document['columns'])
+        matching_rows = sorted({cell_number // n_columns for cell_number in candidates
+                                if texts[cell_number] is not None and keyword in texts[cell_number]})
+        if matching_rows:
+            rows = pd.DataFrame([[float('nan') if text is None else text
+                                  for text in texts[row * n_columns:(row + 1) * n_columns]]
+                                 for row in matching_rows],
+                                index=matching_rows, columns=document['columns'])
+            yield doc_key, rows
+
+        if progress is not None:
+            progress(files_done, len(order))
+
+
+def search_index(index, keyword):
+    """
+    Look up a keyword in the index (case-sensitive substring match, like str.contains(keyword, regex=False)).
+
+    Parameters:
+    index (dict): The index.
+    keyword (str): The keyword to search for.
+
+    Returns:
+    list: One (doc_key, rows) tuple per file with matches, in folder order (see iter_search_index).
+    """
+    return list(iter_search_index(index, keyword))
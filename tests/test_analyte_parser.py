@@ -0,0 +1,74 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from renal_cancer_porject.utils.analyte_parser import BLADDER_ANALYTES, match_analyte, parse_analytes
+
+
+def _parse_analytes_rows(content, analytes=BLADDER_ANALYTES):
+    # The previous per-row parsing of bladder_infectNN01: an apply with any() over the analytes and a re.search per row
+    def extract_numerical_value(value):
+        match = re.search(r'([<>]?\s?[\d,\.]+)', value)
+        return match.group(1) if match else None
+
+    rows = content[content.apply(lambda text: any(analyte in str(text).lower() for analyte in analytes))]
+    rows = rows.to_frame('content')
+    rows[['content_name', 'content_value']] = rows['content'].str.split(';', n=1, expand=True)
+    rows['numerical_value'] = rows['content_value'].apply(extract_numerical_value)
+    return rows
+
+
+def test_parse_analytes_without_separator():
+    parsed = parse_analytes(pd.Series(['Hæmoglobin 7,9', 'CRP']))
+
+    assert parsed['name'].tolist() == ['Hæmoglobin 7,9', 'CRP']
+    assert parsed['value_text'].isna().all()
+    assert parsed['analyte'].tolist() == ['hæmoglobin', 'crp']
+    assert parsed['comparator'].isna().all()
+    assert parsed['value'].isna().all()
+
+
+def test_parse_analytes_empty():
+    parsed = parse_analytes(pd.Series([], dtype=object))
+
+    assert parsed.empty
+    assert parsed.columns.tolist() == ['name', 'value_text', 'analyte', 'comparator', 'value']
+
+
+def test_parse_analytes_values():
+    content = pd.Series(['Hæmoglobin;B;7,9', 'P-CRP;<2,9', 'Albumin;P;40', 'Kalium;P;Negativ'], index=[3, 5, 7, 9])
+    parsed = parse_analytes(content, value_dtype=np.float64)
+
+    assert parsed.index.tolist() == [3, 5, 7, 9]
+    assert parsed['name'].tolist() == ['Hæmoglobin', 'P-CRP', 'Albumin', 'Kalium']
+    assert parsed['analyte'].astype(object).fillna('').tolist() == ['hæmoglobin', 'crp', '', 'kalium']
+    assert parsed['comparator'].astype(object).fillna('').tolist() == ['', '<', '', '']
+    assert parsed['value'].tolist()[:3] == [7.9, 2.9, 40.0]
+    assert np.isnan(parsed['value'].iloc[3])
+
+
+def test_match_analyte():
+    assert match_analyte('Leukocytter;B;12', ['crp', 'Leukocytter']) == 'Leukocytter'
+    assert match_analyte('Albumin;P;40', ['crp']) is None
+    assert match_analyte('P-CRP;5', []) is None
+
+
+def test_parse_analytes_matches_the_row_parsing():
+    rng = np.random.default_rng(0)
+    names = np.array(['Hæmoglobin;B', 'Leukocytter;B', 'P-CRP', 'Kreatinin;P', 'Natrium;P', 'Kalium;P',
+                      'Trombocytter;B', 'LDH;P', 'Albumin;P', 'Glukose;P', 'Urat;P'], dtype=object)
+    numbers = np.array(['7,9', '<2,9', '>90', '135', '4,1', '0.5', 'Negativ', '12 mmol/l'], dtype=object)
+    content = pd.Series(rng.choice(names, size=2000) + ';' + rng.choice(numbers, size=2000), dtype=object)
+
+    expected = _parse_analytes_rows(content)
+    parsed = parse_analytes(content)
+    kept = parsed[parsed['analyte'].notna()]
+
+    # Same rows and names; the numbers are the previous strings with the comparator split off
+    assert kept.index.equals(expected.index)
+    assert kept['name'].tolist() == expected['content_name'].tolist()
+    expected_numbers = expected['numerical_value'].str.replace(r'^[<>]\s?', '', regex=True).str.replace(',', '.')
+    assert np.allclose(kept['value'], pd.to_numeric(expected_numbers).astype(np.float32), equal_nan=True)
+    assert (kept['comparator'].astype(object).fillna('') ==
+            expected['numerical_value'].str.extract(r'^([<>]?)', expand=False).fillna('')).all()
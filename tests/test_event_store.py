@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from event_store import explode_events, implode_events
+
+
+def _frame():
+    return pd.DataFrame({'cpr': ['a', 'b', 'c'],
+                         'code': [['T74000', 'T56000', 'T75000'], ['T56000'], float('nan')],
+                         'date': [['01.01.2020', '02.01.2020'], ['03.01.2020'], ['04.01.2020']]})
+
+
+def test_tails_of_ragged_rows_are_kept():
+    frame = _frame()
+    events = explode_events(frame, ['code', 'date'])
+    kept = implode_events(events[events['code'] != 'T56000'], frame, ['code', 'date'])
+
+    # 'a' has events for its two parallel positions; the third code is put back untouched
+    assert kept['code'].tolist()[:2] == [['T74000', 'T75000'], []]
+    assert kept['date'].tolist()[:2] == [['01.01.2020'], []]
+
+
+def test_rows_with_a_non_list_cell_are_left_as_they_are():
+    frame = _frame()
+    events = explode_events(frame, ['code', 'date'])
+    kept = implode_events(events.iloc[:0], frame, ['code', 'date'])
+
+    assert 'c' not in set(events['cpr'])
+    assert pd.isna(kept['code'].iloc[2])
+    assert kept['date'].iloc[2] == ['04.01.2020']
+
+
+def test_key_column_requires_lists_in_its_rows():
+    frame = _frame()
+    with pytest.raises(ValueError):
+        explode_events(frame.assign(date=[['01.01.2020'], float('nan'), ['04.01.2020']]), ['code', 'date'],
+                       key_col='code')
+
+    # Rows without a key list have no events, whatever their other cells hold
+    events = explode_events(frame, ['code', 'date'], key_col='code')
+    assert sorted(set(events['cpr'])) == ['a', 'b']
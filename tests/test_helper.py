@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+
+from renal_cancer_porject.utils.excel_cache import excel_cache_stats, reset_excel_cache_stats
+from renal_cancer_porject.utils.helper import read_process_and_combine_excel_data
+
+
+def test_single_file_with_workers_is_counted_once(tmp_path):
+    patient_directory = tmp_path / 'data' / 'patient_a'
+    os.makedirs(patient_directory)
+    pd.DataFrame({'value': [1]}).to_excel(patient_directory / 'blood_test.xlsx', index=False)
+
+    # One file is read in this process even with workers > 1
+    reset_excel_cache_stats()
+    data = read_process_and_combine_excel_data('blood_test.xlsx', str(tmp_path / 'data'),
+                                               cache_dir=str(tmp_path / 'cache'), workers=4)
+
+    assert data['cpr'].tolist() == ['patient_a']
+    assert excel_cache_stats()['misses'] == 1
+    assert excel_cache_stats()['writes'] == 1
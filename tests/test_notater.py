@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'renal_cancer_porject', 'app', 'pipelines',
+                                '01_extract_right_data'))
+
+from notater import search_terms_in_pdf
+from renal_cancer_porject.utils.pdf_text_cache import pdf_cache_stats, read_pdf_pages_cached
+
+
+def _write_pdf(path, page_texts):
+    # A minimal PDF with one line of text per page
+    count = len(page_texts)
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               '<< /Type /Pages /Kids [' + ' '.join(f'{4 + 2 * i} 0 R' for i in range(count)) + f'] /Count {count} >>',
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for i, text in enumerate(page_texts):
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> '
+                       f'/Contents {5 + 2 * i} 0 R >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(data)
+    data += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    data += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    data += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_search_stops_extracting_once_every_category_is_filled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_pdf('notater.pdf', ['Rygning: Tidligere', 'Rygning: Aldrig', 'Charlson score 2', 'Side fire'])
+    cache_dir = '.pdf_text_cache'
+
+    # On a cold cache only the first page is extracted, and cached
+    assert search_terms_in_pdf('notater.pdf', {'Rygning': ['Aktuelt', 'Tidligere', 'Aldrig']}) == {
+        'Rygning': 'Tidligere'}
+    entry_name, = os.listdir(cache_dir)
+    with open(os.path.join(cache_dir, entry_name), encoding='utf-8') as f:
+        entry = json.load(f)
+    assert entry['complete'] is False
+    assert entry['pages'] == ['Rygning: Tidligere']
+
+    # A later search continues after the cached page
+    assert search_terms_in_pdf('notater.pdf', {'Rygning': ['Aldrig'], 'Charlson score': ['2']}) == {
+        'Rygning': 'Aldrig', 'Charlson score': '2'}
+    with open(os.path.join(cache_dir, entry_name), encoding='utf-8') as f:
+        assert len(json.load(f)['pages']) == 3
+
+    # Reading every page completes the entry, and the next read is a hit
+    assert read_pdf_pages_cached('notater.pdf') == ['Rygning: Tidligere', 'Rygning: Aldrig', 'Charlson score 2',
+                                                    'Side fire']
+    hits = pdf_cache_stats()['hits']
+    assert len(read_pdf_pages_cached('notater.pdf')) == 4
+    assert pdf_cache_stats()['hits'] == hits + 1
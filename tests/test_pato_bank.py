@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'renal_cancer_porject', 'app', 'pipelines',
+                                '01_extract_right_data'))
+
+from pato_bank import consolidate_patient_data, mappings, merge_based_on_date_preference
+
+
+def _write_patient(data_directory, patient_id, received_dates):
+    patient_directory = os.path.join(data_directory, patient_id)
+    os.makedirs(patient_directory)
+    pd.DataFrame({'Modtaget': received_dates,
+                  'Diagnoser': ['[1]\nT71000 Nyre\nM83103 clear cell adenokarcinom'] * len(received_dates)}
+                 ).to_excel(os.path.join(patient_directory, 'pato_bank.xlsx'), index=False)
+
+
+def test_patient_with_unparseable_date_is_skipped(tmp_path, capsys):
+    data_directory = str(tmp_path)
+    _write_patient(data_directory, 'patient_a', ['24.02.2023'])
+    _write_patient(data_directory, 'patient_b', ['2019-05-17'])
+    _write_patient(data_directory, 'patient_c', ['ukendt'])
+
+    initial_diagnoses, recurrences = consolidate_patient_data('pato_bank.xlsx', data_directory, mappings,
+                                                              merge_based_on_date_preference)
+
+    # The bad patient is reported and skipped, the other patients (with their own date format) are kept
+    assert sorted(initial_diagnoses['PatientID']) == ['patient_a', 'patient_b']
+    dates = dict(zip(initial_diagnoses['PatientID'], initial_diagnoses['EarliestDiagnosisDate']))
+    assert dates == {'patient_a': pd.Timestamp('2023-02-24'), 'patient_b': pd.Timestamp('2019-05-17')}
+    assert recurrences.empty
+    assert 'patient_c' in capsys.readouterr().out
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pato_miba_records import DIAGNOSE_CODE_COLUMNS, MIBA_COLUMNS, collect_diagnose_codes_in_columns, \
+    filter_dataframes
+
+
+def _collect_diagnose_codes_in_columns_rows(patients_data):
+    # The previous version, appending every record with data_frame.loc[len(data_frame)]
+    data_frame = pd.DataFrame(columns=DIAGNOSE_CODE_COLUMNS)
+    for _, row in patients_data.iterrows():
+        lines = row['diagnoser'].split('\n')
+        if len(lines) < 3:
+            continue
+        column_name = lines[1].strip()
+        if column_name in DIAGNOSE_CODE_COLUMNS:
+            data_frame.loc[len(data_frame)] = {'cpr': row['cpr'], 'first_pato_date': row['first_pato_date'],
+                                               column_name: '\n'.join(lines[2:]).strip()}
+    return data_frame
+
+
+def _filter_dataframes_rows(miba_excels, earliest_records_df):
+    # The previous version, scanning all file names and concatenating once per record
+    filtered_data = pd.DataFrame(columns=MIBA_COLUMNS)
+    for _, row in earliest_records_df.iterrows():
+        min_date = datetime.strptime(row['first_pato_date'], '%d.%m.%Y')
+        for filename, df in miba_excels.items():
+            if filename.startswith(row['cpr']):
+                df['Taget d.'] = pd.to_datetime(df['Taget d.'], format='%d.%m.%Y')
+                filtered_rows = df[(df['Taget d.'] < min_date) &
+                                   (df['Prøvens art'].str.startswith('Blod') |
+                                    df['Prøvens art'].str.startswith('Urin'))][['Prøvens art', 'Taget d.', 'Kvantitet']]
+                filtered_rows['cpr'] = row['cpr']
+                filtered_rows['Kvantitet'] = filtered_rows['Kvantitet'].fillna('Negative')
+                if not filtered_rows.empty:
+                    filtered_data = pd.concat([filtered_data, filtered_rows], ignore_index=True)
+    filtered_data['Taget d.'] = pd.to_datetime(filtered_data['Taget d.']).dt.strftime('%d.%m.%Y')
+    return filtered_data.rename(columns={'Taget d.': 'miba_date'})
+
+
+def _synthetic_patients(patients, seed=0):
+    # Pato samples (one or more per cpr) and miba files shaped like the NN01 inputs
+    rng = np.random.default_rng(seed)
+    codes = DIAGNOSE_CODE_COLUMNS[2:] + ['T74940 Urinblære']
+    sample_types = np.array(['Blod', 'Urin - midtstråle', 'Sputum', 'Blod (bloddyrkningskolbe)'], dtype=object)
+    days = pd.date_range('2015-01-01', '2020-12-31').strftime('%d.%m.%Y').to_numpy()
+
+    samples = []
+    miba_excels = {}
+    for patient in range(patients):
+        cpr = f'{patient:010d}'
+        for _ in range(rng.integers(1, 4)):
+            samples.append({'cpr': cpr, 'first_pato_date': rng.choice(days),
+                            'diagnoser': f"\n{rng.choice(codes)}\n tekst {patient}\n mere tekst"})
+        size = rng.integers(0, 15)
+        miba_excels[f'{cpr}_miba.xlsx'] = pd.DataFrame({
+            'Prøvens art': rng.choice(sample_types, size=size), 'Taget d.': rng.choice(days, size=size),
+            'Kvantitet': rng.choice(np.array(['10^5', 'Vækst', None], dtype=object), size=size)})
+    return pd.DataFrame(samples), miba_excels
+
+
+def test_record_builders_match_the_appending_versions():
+    samples, miba_excels = _synthetic_patients(40)
+
+    diagnose_codes = collect_diagnose_codes_in_columns(samples)
+    pd.testing.assert_frame_equal(diagnose_codes, _collect_diagnose_codes_in_columns_rows(samples).astype(object),
+                                  check_index_type=False)
+
+    miba = filter_dataframes(miba_excels, diagnose_codes)
+    expected_miba = _filter_dataframes_rows(miba_excels, diagnose_codes)
+    assert len(miba) > 0
+    pd.testing.assert_frame_equal(miba, expected_miba.astype(object), check_dtype=False)
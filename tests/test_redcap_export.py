@@ -0,0 +1,38 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from redcap_export import combine_sources, process_cell, serialise_redcap_frame
+
+
+def _synthetic_sources(patients, seed=0):
+    # Per-cpr aggregates shaped like those of combine_data.py; every source covers a random part of the patients
+    rng = np.random.default_rng(seed)
+    words = np.array(['Blod', 'Urin', 'Negativ', 'E. coli', '2019-03-04 10:12:00', 'nan', "Patient's"], dtype=object)
+    sources = []
+    for prefix, list_columns in [('miba', 4), ('medicin', 3), ('diagnoses', 2), ('pato', 5), ('vitale', 4)]:
+        cprs = [f'{patient:010d}' for patient in range(patients) if rng.random() < 0.8]
+        source = {'cpr': cprs}
+        for k in range(list_columns):
+            source[f'{prefix}_{k}'] = [rng.choice(words, size=rng.integers(1, 30)).tolist() for _ in cprs]
+        sources.append(pd.DataFrame(source))
+
+    cprs = [f'{patient:010d}' for patient in range(patients) if rng.random() < 0.6]
+    blood = {'cpr': cprs}
+    for column in ['blood_date', 'blood_content']:
+        for k in range(1, 6):
+            chunks = np.array(["x', 'y', ", "Hæmoglobin;B', '7,9', "], dtype=object)[rng.integers(0, 2, size=len(cprs))]
+            chunks[rng.random(len(cprs)) < 1 - 0.7 ** k] = np.nan
+            blood[f'{column}_{k}'] = chunks
+    sources.append(pd.DataFrame(blood))
+    return sources
+
+
+def test_one_shot_combine_matches_the_chained_merges():
+    sources = _synthetic_sources(200)
+
+    # The previous combine stage: one outer merge per source, then a cell-by-cell map
+    expected = reduce(lambda left, right: pd.merge(left, right, on='cpr', how='outer'), sources).map(process_cell)
+
+    pd.testing.assert_frame_equal(serialise_redcap_frame(combine_sources(sources)), expected.astype(object))
@@ -0,0 +1,33 @@
+import os
+import threading
+
+import pandas as pd
+
+from search_index import load_search_index, search_index, update_search_index
+
+
+def _write_file(data_directory, patient_id, text):
+    patient_directory = os.path.join(data_directory, patient_id)
+    os.makedirs(patient_directory, exist_ok=True)
+    pd.DataFrame({'Analyser': [text]}).to_excel(os.path.join(patient_directory, 'miba.xlsx'), index=False)
+
+
+def test_cancelled_update_keeps_the_index_consistent(tmp_path):
+    data_directory = str(tmp_path / 'HospitalData')
+    _write_file(data_directory, 'patient_a', 'Dyrkning E. coli')
+    _write_file(data_directory, 'patient_b', 'Dyrkning E. coli')
+    index = load_search_index(str(tmp_path / 'missing.pkl'))
+    update_search_index(index, data_directory)
+
+    # patient_b's file is removed and patient_c's is new; the update is cancelled after the first file
+    os.remove(os.path.join(data_directory, 'patient_b', 'miba.xlsx'))
+    _write_file(data_directory, 'patient_c', 'Dyrkning E. coli')
+    cancel_event = threading.Event()
+    update_search_index(index, data_directory, progress=lambda files_done, files_total: cancel_event.set(),
+                        cancel_event=cancel_event)
+
+    # The removed file is dropped, and every stored file (indexed before the cancel or kept) can be found
+    assert 'patient_b_miba.xlsx' not in index['documents']
+    assert 'patient_a_miba.xlsx' in index['order']
+    assert sorted(index['order']) == sorted(index['documents'])
+    assert sorted(doc_key for doc_key, _ in search_index(index, 'E. coli')) == sorted(index['order'])
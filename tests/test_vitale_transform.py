@@ -0,0 +1,68 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from vitale_transform import DATE_PATTERN, DATE_TIME_PATTERN, MEASUREMENT_TO_COLUMN, transform_vitale_data
+
+
+def _transform_vitale_data_rows(original_data):
+    # The previous row-by-row loop
+    tidy_data_dict = defaultdict(dict)
+    date_pattern = re.compile(DATE_PATTERN)
+    date_time_pattern = re.compile(DATE_TIME_PATTERN)
+
+    for _, row in original_data.iterrows():
+        measurement_type = str(row['værdier']).replace(':', '').strip()
+        if measurement_type not in MEASUREMENT_TO_COLUMN:
+            continue
+        for column in original_data.columns[2:]:
+            raw_value = str(row[column]).replace('\xa0', ' ').replace('_x000D_', '').strip()
+            match = date_time_pattern.search(column)
+            measurement_date = match.group() if match else None
+            if not measurement_date:
+                match = date_pattern.search(raw_value)
+                measurement_date = match.group() if match else None
+                raw_value_array = (date_pattern.sub('', raw_value) if measurement_date else raw_value).split()
+                if 'pr.' in raw_value_array:
+                    raw_value_array.remove('pr.')
+                if len(raw_value_array) > 1 and not date_pattern.match(raw_value_array[1]):
+                    raw_value = raw_value_array[0] + ' ' + raw_value_array[1]
+                else:
+                    raw_value = raw_value_array[0] if raw_value_array else ''
+            if raw_value not in ('nan', ''):
+                tidy_data_dict[(row['cpr'], measurement_date)][MEASUREMENT_TO_COLUMN[measurement_type]] = raw_value
+
+    return pd.DataFrame([{'cpr': cpr, 'vitale_measurement_date': date, **measurements}
+                         for (cpr, date), measurements in tidy_data_dict.items()])
+
+
+def _synthetic_vitale_data(patients, seed=0):
+    # Vitale sheets shaped like read_excel_data_into_dataframe('vitale.xlsx')
+    rng = np.random.default_rng(seed)
+    measurement_types = list(MEASUREMENT_TO_COLUMN) + ['Smerte', 'Bevidsthed']
+    columns = ['cpr', 'værdier', '12-03-2020 08:00', '12-03-2020 14:30', 'Unnamed: 4', '13-03-2020 09:15', 'Unnamed: 6']
+    cell_values = np.array(['120/80', '72 pr. min', 'pr. min 72', '37,5 °C', '98 %', '80 kg 14-03-2020',
+                            '14-03-2020 76 kg 15-03-2020', '182 cm', '\xa024,1_x000D_', '', 'Aksil', 'nan'], dtype=object)
+
+    rows = []
+    for patient in range(patients):
+        cpr = f'{patient:010d}'
+        for measurement_type in rng.choice(measurement_types, size=rng.integers(3, 9), replace=False):
+            values = rng.choice(cell_values, size=len(columns) - 2)
+            values[rng.random(len(values)) < 0.3] = np.nan
+            rows.append([cpr, measurement_type + (':' if rng.random() < 0.5 else '')] + list(values))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_transform_vitale_data_matches_the_row_loop():
+    vitale_data = _synthetic_vitale_data(50)
+
+    pd.testing.assert_frame_equal(transform_vitale_data(vitale_data), _transform_vitale_data_rows(vitale_data))
+
+
+def test_transform_vitale_data_without_known_measurements():
+    vitale_data = pd.DataFrame({'cpr': ['0000000001'], 'værdier': ['Smerte'], '12-03-2020 08:00': ['3']})
+
+    assert transform_vitale_data(vitale_data).empty
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Mapping from measurement type (the 'værdier' column of vitale.xlsx) to column name
+MEASUREMENT_TO_COLUMN = {
+    'Blodtryk': 'vitale_blodtryk',
+    'Puls': 'vitale_puls',
+    'Resp.frekv.': 'vitale_respfrekv',
+    'Temperatur': 'vitale_temperatur',
+    'Temp.kilde': 'vitale_tempkilde',
+    'Saturation': 'vitale_saturation',
+    'Hovedomfang (cm)': 'vitale_hovedomfang',
+    'Vægt': 'vitale_vaegt',
+    'Højde': 'vitale_hoejde',
+    'Body Mass Index': 'vitale_bodymassindex'
+}
+
+# Date in a cell, and date and time in a column header
+DATE_PATTERN = r'\d{2}-\d{2}-\d{4}'
+DATE_TIME_PATTERN = r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}'
+
+
+def transform_vitale_data(original_data):
+    """
+    Turns the wide vitale sheets (one row per measurement type, one column per date) into tidy data with one row
+    per (cpr, measurement date) and one 'vitale_*' column per measurement type.
+
+    The sheet is melted to one row per cell and the distinct cell texts are cleaned at once with vectorised string
+    operations:
+    - If the column header has a date and time, it is the measurement date and the whole cell is the value.
+    - Otherwise the first date in the cell is the measurement date; the dates are removed from the cell, a 'pr.'
+      token is dropped and the value is the first token, joined with the second one if that is not a date.
+    Empty cells are skipped; if a (cpr, date) has several values for the same measurement, the last one is kept.
+    Gives the same output as the previous row-by-row loop (see tests/test_vitale_transform.py).
+
+    Parameters:
+    original_data (pd.DataFrame): The vitale sheets of all patients: 'cpr', 'værdier' and then the value columns.
+
+    Returns:
+    pd.DataFrame: The tidy data with 'cpr', 'vitale_measurement_date' and the 'vitale_*' columns.
+    """
+    value_columns = list(original_data.columns[2:])
+
+    # Keep the rows of a known measurement type
+    measurement_types = original_data['værdier'].map(str).str.replace(':', '', regex=False).str.strip()
+    measurement_columns = measurement_types.map(MEASUREMENT_TO_COLUMN)
+    rows = original_data[measurement_columns.notna().to_numpy()]
+    if rows.empty or not value_columns:
+        return pd.DataFrame([])
+
+    # Melt to one row per cell, in row-major order (later cells overwrite earlier ones)
+    cells = pd.DataFrame({column: rows[column].map(str) for column in value_columns})
+    cell_count = len(rows) * len(value_columns)
+    row_positions = np.repeat(np.arange(len(rows)), len(value_columns))
+    column_positions = np.tile(np.arange(len(value_columns)), len(rows))
+
+    # The string operations run once per distinct cell text
+    codes, texts = pd.factorize(pd.Series(cells.to_numpy(dtype=object).ravel(), dtype=object))
+    texts = pd.Series(texts, dtype=object)
+    texts = texts.str.replace('\xa0', ' ', regex=False).str.replace('_x000D_', '', regex=False).str.strip()
+
+    # Otherwise the first date in the cell, and the value without the dates and the 'pr.' token
+    text_dates = texts.str.extract('(' + DATE_PATTERN + ')', expand=False)
+    without_dates = texts.str.replace(DATE_PATTERN, '', regex=True)
+    tokens = without_dates.str.extract(r'^\s*(\S+)?(?:\s+(\S+))?(?:\s+(\S+))?')
+    first, second, third = (tokens[i].to_numpy(dtype=object) for i in range(3))
+    first_is_pr = first == 'pr.'
+    second_is_pr = ~first_is_pr & (second == 'pr.')
+    value_first = pd.Series(np.where(first_is_pr, second, first), dtype=object)
+    value_second = pd.Series(np.where(first_is_pr | second_is_pr, third, second), dtype=object)
+    join_second = (value_second.notna() & ~value_second.str.match(DATE_PATTERN).fillna(False).astype(bool)).to_numpy()
+    text_values = value_first.where(value_first.notna(), '').where(~join_second, value_first + ' ' + value_second)
+
+    # Date and time from the column header: the measurement date, and the whole cell is the value
+    header_dates = pd.Series(value_columns, dtype=object).str.extract('(' + DATE_TIME_PATTERN + ')', expand=False)
+    measurement_dates = header_dates.to_numpy(dtype=object)[column_positions]
+    has_header_date = pd.notna(measurement_dates)
+
+    values = np.where(has_header_date, texts.to_numpy(dtype=object)[codes], text_values.to_numpy(dtype=object)[codes])
+    measurement_dates = np.where(has_header_date, measurement_dates, text_dates.to_numpy(dtype=object)[codes])
+    measurement_dates[pd.isna(measurement_dates)] = None
+
+    # Skip the empty cells
+    keep = (values != 'nan') & (values != '')
+    long_data = pd.DataFrame({
+        'cpr': rows['cpr'].to_numpy(dtype=object)[row_positions][keep],
+        'vitale_measurement_date': measurement_dates[keep],
+        'measurement': measurement_columns[measurement_columns.notna()].to_numpy(dtype=object)[row_positions][keep],
+        'value': values[keep],
+        'cell': np.arange(cell_count)[keep]
+    })
+    if long_data.empty:
+        return pd.DataFrame([])
+
+    # One row per (cpr, date), in order of their first value
+    long_data['key'] = long_data.groupby(['cpr', 'vitale_measurement_date'], sort=False, dropna=False).ngroup()
+    keys = long_data.drop_duplicates('key').sort_values('key')
+
+    # Measurement columns in order of their first value per (cpr, date), the last value wins
+    first_values = long_data.drop_duplicates(['key', 'measurement'], keep='first').sort_values(['key', 'cell'])
+    measurement_order = list(pd.unique(first_values['measurement']))
+    last_values = long_data.drop_duplicates(['key', 'measurement'], keep='last')
+
+    # Pivot back to one 'vitale_*' column per measurement type
+    table = np.full((len(keys), len(measurement_order)), np.nan, dtype=object)
+    column_of = {measurement: i for i, measurement in enumerate(measurement_order)}
+    table[last_values['key'].to_numpy(), last_values['measurement'].map(column_of).to_numpy()] = \
+        last_values['value'].to_numpy(dtype=object)
+
+    tidy_data = {'cpr': keys['cpr'].tolist(), 'vitale_measurement_date': keys['vitale_measurement_date'].tolist()}
+    tidy_data.update({measurement: table[:, i].tolist() for i, measurement in enumerate(measurement_order)})
+    return pd.DataFrame(tidy_data)